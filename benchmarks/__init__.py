@@ -0,0 +1 @@
+""" Benchmarks of the subword embedding pipeline on synthetic MLFs """
@@ -0,0 +1,124 @@
+import argparse
+import random
+import sys
+
+
+POSITIONS = 'IMF'
+APOSTROPHE_TOKEN = 'A'
+SILENCE = 'sil'
+# HTK times are in units of 100ns
+ARC_DURATION = 100000
+
+
+def random_subword(rng, num_units, position_markers, apostrophe_rate):
+    """ A random grapheme label such as G12^MD1 (or G12 without position markers), sometimes with an apostrophe """
+    subword = 'G{}'.format(rng.randint(1, num_units))
+    if position_markers:
+        subword += '^{}D{}'.format(rng.choice(POSITIONS), rng.randint(1, 2))
+    if rng.random() < apostrophe_rate:
+        subword += APOSTROPHE_TOKEN
+    return subword
+
+
+def utterance_lines(rng, utterance_id, num_arcs, num_units, triphones, position_markers, apostrophe_rate):
+    """ The lines of one synthetic MLF utterance, excluding the '.' terminator """
+    subwords = [random_subword(rng, num_units, position_markers, apostrophe_rate) for _ in range(num_arcs)]
+    lines = ['"*/utt{:08d}.lab"'.format(utterance_id)]
+    for arc_idx, subword in enumerate(subwords):
+        if triphones:
+            left = subwords[arc_idx - 1] if arc_idx > 0 else SILENCE
+            right = subwords[arc_idx + 1] if arc_idx + 1 < num_arcs else SILENCE
+            subword = '{}-{}+{}'.format(left, subword, right)
+        start_time = arc_idx * ARC_DURATION
+        lines.append('{} {} {} {:.4f}'.format(start_time, start_time + ARC_DURATION, subword, -10 * rng.random()))
+    return lines
+
+
+def generate_mlf(target_file, num_utterances, min_arcs=3, max_arcs=12, triphones=True, position_markers=True,
+                 apostrophe_rate=0.1, num_units=30, seed=0):
+    """ Write a synthetic HTK MLF with random grapheme labels
+
+        Arguments:
+            target_file: The path name of the MLF to write
+            num_utterances: The number of utterances
+            min_arcs: The minimum number of arcs per utterance
+            max_arcs: The maximum number of arcs per utterance
+            triphones: Boolean for whether to write triphone (left-centre+right) rather than monophone labels
+            position_markers: Boolean for whether the labels carry word position markers (e.g. ^MD1)
+            apostrophe_rate: The fraction of subword units which end in an apostrophe
+            num_units: The number of distinct graphemes
+            seed: The random seed, so that the same arguments always give the same MLF
+
+        Returns:
+            The total number of arcs written
+    """
+    rng = random.Random(seed)
+    num_arcs_written = 0
+    with open(target_file, 'w') as mlf_file:
+        mlf_file.write('#!MLF!#\n')
+        for utterance_id in range(num_utterances):
+            num_arcs = rng.randint(min_arcs, max_arcs)
+            lines = utterance_lines(
+                rng, utterance_id, num_arcs, num_units, triphones, position_markers, apostrophe_rate
+            )
+            mlf_file.write('\n'.join(lines))
+            mlf_file.write('\n.\n')
+            num_arcs_written += num_arcs
+    return num_arcs_written
+
+
+def parse_arguments(args_to_parse):
+    """ Parse the command line arguments.
+
+        Arguments:
+            args_to_parse: CLI arguments to parse
+    """
+    parser = argparse.ArgumentParser(description="Generate a synthetic HTK MLF for benchmarking")
+    parser.add_argument(
+        '-o', '--output', type=str, required=True,
+        help='The path name of the MLF to write.'
+    )
+    parser.add_argument(
+        '-n', '--num-utterances', type=int, default=10000,
+        help='The number of utterances.'
+    )
+    parser.add_argument(
+        '--min-arcs', type=int, default=3,
+        help='The minimum number of arcs per utterance.'
+    )
+    parser.add_argument(
+        '--max-arcs', type=int, default=12,
+        help='The maximum number of arcs per utterance.'
+    )
+    parser.add_argument(
+        '--monophones', dest='triphones', action='store_false',
+        help='Write monophone rather than triphone labels.'
+    )
+    parser.set_defaults(triphones=True)
+    parser.add_argument(
+        '--no-position-markers', dest='position_markers', action='store_false',
+        help='Write labels without word position markers.'
+    )
+    parser.set_defaults(position_markers=True)
+    parser.add_argument(
+        '--apostrophe-rate', type=float, default=0.1,
+        help='The fraction of subword units which end in an apostrophe.'
+    )
+    parser.add_argument(
+        '--num-units', type=int, default=30,
+        help='The number of distinct graphemes.'
+    )
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='The random seed.'
+    )
+    return parser.parse_args(args_to_parse)
+
+
+if __name__ == '__main__':
+    args = parse_arguments(sys.argv[1:])
+    num_arcs = generate_mlf(
+        args.output, args.num_utterances, args.min_arcs, args.max_arcs, args.triphones, args.position_markers,
+        args.apostrophe_rate, args.num_units, args.seed
+    )
+    print('Wrote {} utterances with {} arcs to {}'.format(args.num_utterances, num_arcs, args.output))
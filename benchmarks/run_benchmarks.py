@@ -0,0 +1,351 @@
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from subword_embedding.profiling import max_rss_mb
+
+from .generate_mlf import generate_mlf
+
+
+DEFAULT_SIZES = [1000, 10000, 50000]
+LABEL_SETS = ('tri', 'mono')
+DEFAULT_TOLERANCE = 0.25
+# t-SNE works on the vocabulary rather than the corpus, so it only needs timing once per label set
+SIZE_INDEPENDENT_STAGES = ('visualise',)
+
+
+def build_corpus(mlf_path, work_dir, options):
+    """ Write the text corpus and unique subword list used as the input of the later stages """
+    from subword_embedding.subword_corpus import MLFDataset
+    dataset = MLFDataset(mlf_path, streaming=True, **options)
+    corpus_path = os.path.join(work_dir, 'corpus.dat')
+    unique_subwords_path = os.path.join(work_dir, 'unique-subwords.json')
+    dataset.write_corpus(target_file=corpus_path)
+    dataset.save_unique_subwords(target_file=unique_subwords_path)
+    return corpus_path, unique_subwords_path
+
+
+def benchmark_parse(mlf_path, work_dir, options):
+    from subword_embedding.subword_corpus import MLFDataset
+    start_time = time.perf_counter()
+    MLFDataset(mlf_path, **options)
+    return {'seconds': time.perf_counter() - start_time}
+
+
+def benchmark_parse_compact(mlf_path, work_dir, options):
+    from subword_embedding.subword_corpus import MLFDataset
+    start_time = time.perf_counter()
+    MLFDataset(mlf_path, compact=True, **options)
+    return {'seconds': time.perf_counter() - start_time}
+
+
+def benchmark_corpus(mlf_path, work_dir, options):
+    start_time = time.perf_counter()
+    build_corpus(mlf_path, work_dir, options)
+    return {'seconds': time.perf_counter() - start_time}
+
+
+def benchmark_corpus_pipeline(mlf_path, work_dir, options):
+    from subword_embedding.pipeline import CorpusPipeline
+    from subword_embedding.subword_corpus import MLFDataset
+    start_time = time.perf_counter()
+    dataset = MLFDataset(mlf_path, streaming=True, **options)
+    corpus_pipeline = CorpusPipeline(os.path.join(work_dir, 'corpus.dat'))
+    dataset.subwords = corpus_pipeline.run(dataset.iter_sentence_batches())
+    dataset.save_unique_subwords(target_file=os.path.join(work_dir, 'unique-subwords.json'))
+    return {'seconds': time.perf_counter() - start_time}
+
+
+def benchmark_fasttext_export(mlf_path, work_dir, options):
+    """ Time looking up and saving the fastText vectors of the vocabulary, after training for one epoch """
+    import fasttext
+    from subword_embedding.embedding_io import write_word2vec_text
+    from subword_embedding.training import fasttext_word_vectors
+
+    corpus_path, unique_subwords_path = build_corpus(mlf_path, work_dir, options)
+    model = fasttext.train_unsupervised(corpus_path, dim=16, epoch=1, minCount=1, thread=1, verbose=0)
+    with open(unique_subwords_path) as unique_subwords_file:
+        subwords = ['</s>'] + json.load(unique_subwords_file)
+
+    start_time = time.perf_counter()
+    vectors = fasttext_word_vectors(model, subwords)
+    write_word2vec_text(os.path.join(work_dir, 'embedding.txt'), subwords, vectors)
+    return {'seconds': time.perf_counter() - start_time, 'num_vectors': len(subwords)}
+
+
+def benchmark_visualise(mlf_path, work_dir, options):
+    """ Time the fast t-SNE visualisation of a random embedding of the vocabulary """
+    import numpy as np
+    from subword_embedding.embedding_store import EmbeddingStore
+    from subword_embedding.visualise import visualise_embedding
+
+    _, unique_subwords_path = build_corpus(mlf_path, work_dir, options)
+    with open(unique_subwords_path) as unique_subwords_file:
+        subwords = json.load(unique_subwords_file)
+    vectors = np.random.RandomState(0).standard_normal((len(subwords), 16)).astype(np.float32)
+
+    start_time = time.perf_counter()
+    visualise_embedding(
+        EmbeddingStore(subwords, vectors), perplexity=5, learning_rate=200,
+        image_path_name=os.path.join(work_dir, 'visualisation.png'), label_mapping={}, fast=True
+    )
+    return {'seconds': time.perf_counter() - start_time, 'num_vectors': len(subwords)}
+
+
+STAGES = OrderedDict([
+    ('parse', benchmark_parse),
+    ('parse-compact', benchmark_parse_compact),
+    ('corpus', benchmark_corpus),
+    ('corpus-pipeline', benchmark_corpus_pipeline),
+    ('fasttext-export', benchmark_fasttext_export),
+    ('visualise', benchmark_visualise),
+])
+
+
+def run_stage(stage, mlf_path, options):
+    """ Run one repeat of a benchmark. This is called in a fresh process so that caches and peak RSS start clean.
+
+        Returns:
+            The result dictionary of the stage with the peak RSS of the process added
+    """
+    work_dir = tempfile.mkdtemp(prefix='benchmark-')
+    try:
+        result = STAGES[stage](mlf_path, work_dir, options)
+    finally:
+        shutil.rmtree(work_dir)
+    result['peak_rss_mb'] = max_rss_mb()
+    return result
+
+
+def run_benchmark(stage, mlf_path, options, repeats):
+    """ Run a benchmark several times, each in a new process, keeping the fastest time and the largest peak RSS
+
+        Returns:
+            The merged result dictionary, or None if the stage's dependencies are not installed
+    """
+    spawn_context = multiprocessing.get_context('spawn')
+    results = []
+    for _ in range(repeats):
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn_context) as executor:
+            try:
+                results.append(executor.submit(run_stage, stage, mlf_path, options).result())
+            except ImportError as error:
+                print('Skipping {}: {}'.format(stage, error))
+                return None
+    merged = dict(results[0])
+    merged['seconds'] = min(result['seconds'] for result in results)
+    merged['peak_rss_mb'] = max(result['peak_rss_mb'] for result in results)
+    return merged
+
+
+def machine_info():
+    import numpy as np
+    return {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run_benchmarks(args):
+    """ Generate the synthetic MLFs and run every selected stage on them
+
+        Returns:
+            The list of benchmark results
+    """
+    options = {
+        'subword_context_width': args.subword_context,
+        'incl_posn_info': args.subword_loc_info,
+        'separate_apostrophe_embedding': args.apostrophe_embedding,
+    }
+    data_dir = tempfile.mkdtemp(prefix='benchmark-mlf-')
+    results = []
+    try:
+        for labels in args.labels:
+            for size_idx, num_utterances in enumerate(sorted(args.sizes)):
+                mlf_path = os.path.join(data_dir, '{}-{}.mlf'.format(labels, num_utterances))
+                num_arcs = generate_mlf(
+                    mlf_path, num_utterances, args.min_arcs, args.max_arcs, triphones=labels == 'tri',
+                    position_markers=args.position_markers, apostrophe_rate=args.apostrophe_rate
+                )
+                for stage in args.stages:
+                    if stage in SIZE_INDEPENDENT_STAGES and size_idx > 0:
+                        continue
+                    name = '{}-{}-{}'.format(stage, labels, num_utterances)
+                    result = run_benchmark(stage, mlf_path, options, args.repeats)
+                    if result is None:
+                        continue
+                    result.update({
+                        'name': name, 'stage': stage, 'labels': labels,
+                        'num_utterances': num_utterances, 'num_arcs': num_arcs,
+                        'arcs_per_second': None if 'num_vectors' in result else num_arcs / result['seconds'],
+                    })
+                    results.append(result)
+                    print('{:<36} {:>9.3f}s {:>12} arcs/s {:>9.1f} MB'.format(
+                        name, result['seconds'],
+                        '-' if result['arcs_per_second'] is None else '{:.0f}'.format(result['arcs_per_second']),
+                        result['peak_rss_mb']
+                    ))
+    finally:
+        shutil.rmtree(data_dir)
+    return results
+
+
+def compare_results(results, baseline_results, tolerance):
+    """ Compare the wall time and peak RSS of each benchmark against a baseline
+
+        Arguments:
+            results: The list of benchmark results
+            baseline_results: The list of benchmark results of the baseline
+            tolerance: The relative slow-down or memory growth above which a benchmark counts as a regression
+
+        Returns:
+            A list of (name, time ratio, RSS ratio, status) tuples, where the ratios are None for new benchmarks
+    """
+    baseline = {result['name']: result for result in baseline_results}
+    comparison = []
+    for result in results:
+        baseline_result = baseline.get(result['name'])
+        if baseline_result is None:
+            comparison.append((result['name'], None, None, 'new'))
+            continue
+        time_ratio = result['seconds'] / baseline_result['seconds']
+        rss_ratio = result['peak_rss_mb'] / baseline_result['peak_rss_mb']
+        if time_ratio > 1 + tolerance or rss_ratio > 1 + tolerance:
+            status = 'regression'
+        elif time_ratio < 1 - tolerance:
+            status = 'faster'
+        else:
+            status = 'ok'
+        comparison.append((result['name'], time_ratio, rss_ratio, status))
+    return comparison
+
+
+def print_comparison(comparison):
+    print('{:<36} {:>8} {:>8}  {}'.format('name', 'time', 'rss', 'status'))
+    for name, time_ratio, rss_ratio, status in comparison:
+        print('{:<36} {:>8} {:>8}  {}'.format(
+            name,
+            '-' if time_ratio is None else '{:.2f}x'.format(time_ratio),
+            '-' if rss_ratio is None else '{:.2f}x'.format(rss_ratio),
+            status
+        ))
+
+
+def parse_arguments(args_to_parse):
+    """ Parse the command line arguments.
+
+        Arguments:
+            args_to_parse: CLI arguments to parse
+    """
+    description = "Benchmark MLF parsing, corpus generation, fastText export and visualisation on synthetic MLFs"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+        help='The numbers of utterances in the synthetic MLFs.'
+    )
+    parser.add_argument(
+        '--stages', type=str, nargs='+', default=list(STAGES), choices=list(STAGES),
+        help='The stages to benchmark.'
+    )
+    parser.add_argument(
+        '--labels', type=str, nargs='+', default=list(LABEL_SETS), choices=LABEL_SETS,
+        help='Benchmark MLFs with triphone and/or monophone labels.'
+    )
+    parser.add_argument(
+        '--min-arcs', type=int, default=3,
+        help='The minimum number of arcs per utterance.'
+    )
+    parser.add_argument(
+        '--max-arcs', type=int, default=12,
+        help='The maximum number of arcs per utterance.'
+    )
+    parser.add_argument(
+        '--no-position-markers', dest='position_markers', action='store_false',
+        help='Generate labels without word position markers.'
+    )
+    parser.set_defaults(position_markers=True)
+    parser.add_argument(
+        '--apostrophe-rate', type=float, default=0.1,
+        help='The fraction of generated subword units which end in an apostrophe.'
+    )
+    parser.add_argument(
+        '-c', '--subword-context', type=int, default=1,
+        help='The subword context width used to parse the MLFs.'
+    )
+    parser.add_argument(
+        '--loc-info', dest='subword_loc_info', action='store_true',
+        help='Keep the position information when parsing the MLFs.'
+    )
+    parser.set_defaults(subword_loc_info=False)
+    parser.add_argument(
+        '--apostrophe-embedding', dest='apostrophe_embedding', action='store_true',
+        help='Treat apostrophes as separate subword units when parsing the MLFs.'
+    )
+    parser.set_defaults(apostrophe_embedding=False)
+    parser.add_argument(
+        '-r', '--repeats', type=int, default=3,
+        help='The number of times each benchmark is run. The fastest time is reported.'
+    )
+    parser.add_argument(
+        '-o', '--output', type=str, default='benchmark-results.json',
+        help='The path name of the JSON results.'
+    )
+    parser.add_argument(
+        '-b', '--baseline', type=str, default=None,
+        help='The JSON results of a previous run to compare against.'
+    )
+    parser.add_argument(
+        '--tolerance', type=float, default=DEFAULT_TOLERANCE,
+        help='The relative slow-down or peak RSS growth reported as a regression.'
+    )
+    return parser.parse_args(args_to_parse)
+
+
+def main(args):
+    """ Run the benchmarks, save the results and compare them against the baseline
+
+        Returns:
+            The exit status, which is 1 if any benchmark regressed against the baseline
+    """
+    results = run_benchmarks(args)
+    report = {
+        'machine': machine_info(),
+        'options': {
+            'min_arcs': args.min_arcs,
+            'max_arcs': args.max_arcs,
+            'position_markers': args.position_markers,
+            'apostrophe_rate': args.apostrophe_rate,
+            'subword_context': args.subword_context,
+            'loc_info': args.subword_loc_info,
+            'apostrophe_embedding': args.apostrophe_embedding,
+            'repeats': args.repeats,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as results_file:
+        json.dump(report, results_file, indent=2)
+    print('Saved the results to {}'.format(args.output))
+
+    if args.baseline:
+        with open(args.baseline, 'r') as baseline_file:
+            baseline_report = json.load(baseline_file)
+        comparison = compare_results(results, baseline_report['results'], args.tolerance)
+        print_comparison(comparison)
+        if any(status == 'regression' for _, _, _, status in comparison):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    args = parse_arguments(sys.argv[1:])
+    sys.exit(main(args))
@@ -0,0 +1 @@
+""" Sub-word (phone or grapheme) level embeddings from HTK-style MLF and lattice ASR corpora """
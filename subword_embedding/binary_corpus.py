@@ -0,0 +1,174 @@
+import json
+import os
+
+import numpy as np
+
+
+TOKEN_DTYPE = np.uint32
+OFFSET_DTYPE = np.int64
+TOKENS_FILE = 'tokens.bin'
+OFFSETS_FILE = 'offsets.bin'
+VOCABULARY_FILE = 'vocabulary.json'
+HEADER_FILE = 'header.json'
+FORMAT_VERSION = 1
+
+
+class BinaryCorpusWriter(object):
+    """ Incrementally write a binary subword corpus.
+
+        A binary corpus is a directory containing:
+            tokens.bin: The token IDs of every utterance back to back as raw uint32
+            offsets.bin: Raw int64 offsets such that utterance i is tokens[offsets[i]:offsets[i + 1]]
+            vocabulary.json: The list of tokens, indexed by token ID
+            header.json: The format version, dtypes and array lengths
+        All of the arrays can be memory-mapped with np.memmap, so the corpus is loaded without any copying
+        or re-tokenisation.
+    """
+    def __init__(self, corpus_dir):
+        """ Initialise the BinaryCorpusWriter object
+
+            Arguments:
+                corpus_dir: The path of the directory to write the binary corpus to
+        """
+        if not os.path.exists(corpus_dir):
+            os.makedirs(corpus_dir)
+        self.corpus_dir = corpus_dir
+        self.num_tokens = 0
+        self.offsets = [0]
+        self.tokens_file = open(os.path.join(corpus_dir, TOKENS_FILE), 'wb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tokens_file.close()
+
+    def append_utterance(self, token_ids):
+        """ Append the token IDs of a single utterance
+
+            Arguments:
+                token_ids: A sequence or array of token IDs
+        """
+        token_ids = np.asarray(token_ids, dtype=TOKEN_DTYPE)
+        self.tokens_file.write(token_ids.tobytes())
+        self.num_tokens += len(token_ids)
+        self.offsets.append(self.num_tokens)
+
+    def append_utterances(self, token_ids, offsets):
+        """ Append many utterances stored back to back in a single token ID array
+
+            Arguments:
+                token_ids: An array of the token IDs of all utterances
+                offsets: The utterance boundaries into token_ids (of length number of utterances + 1)
+        """
+        token_ids = np.asarray(token_ids, dtype=TOKEN_DTYPE)
+        offsets = np.asarray(offsets, dtype=OFFSET_DTYPE)
+        self.tokens_file.write(token_ids[offsets[0]:offsets[-1]].tobytes())
+        self.offsets.extend((offsets[1:] - offsets[0] + self.num_tokens).tolist())
+        self.num_tokens += int(offsets[-1] - offsets[0])
+
+    def close(self, tokens):
+        """ Finish writing the corpus
+
+            Arguments:
+                tokens: The vocabulary as a list of tokens indexed by token ID
+        """
+        self.tokens_file.close()
+        np.asarray(self.offsets, dtype=OFFSET_DTYPE).tofile(os.path.join(self.corpus_dir, OFFSETS_FILE))
+        with open(os.path.join(self.corpus_dir, VOCABULARY_FILE), 'w') as vocabulary_file:
+            json.dump(list(tokens), vocabulary_file)
+        header = {
+            'version': FORMAT_VERSION,
+            'token_dtype': np.dtype(TOKEN_DTYPE).str,
+            'offset_dtype': np.dtype(OFFSET_DTYPE).str,
+            'num_tokens': self.num_tokens,
+            'num_utterances': len(self.offsets) - 1,
+            'vocabulary_size': len(tokens),
+        }
+        with open(os.path.join(self.corpus_dir, HEADER_FILE), 'w') as header_file:
+            json.dump(header, header_file)
+
+
+def write_binary_corpus(corpus_dir, token_ids, offsets, tokens):
+    """ Write a complete binary corpus from in-memory arrays (e.g. those of a CompactMLF)
+
+        Arguments:
+            corpus_dir: The path of the directory to write the binary corpus to
+            token_ids: An array of the token IDs of all utterances
+            offsets: The utterance boundaries into token_ids (of length number of utterances + 1)
+            tokens: The vocabulary as a list of tokens indexed by token ID
+    """
+    with BinaryCorpusWriter(corpus_dir) as writer:
+        writer.append_utterances(token_ids, offsets)
+        writer.close(tokens)
+
+
+class BinaryCorpus(object):
+    """ A memory-mapped, read-only view of a binary subword corpus (see BinaryCorpusWriter) """
+    def __init__(self, corpus_dir):
+        """ Initialise the BinaryCorpus object
+
+            Arguments:
+                corpus_dir: The path of the binary corpus directory
+        """
+        with open(os.path.join(corpus_dir, HEADER_FILE), 'r') as header_file:
+            header = json.load(header_file)
+        if header['version'] != FORMAT_VERSION:
+            raise ValueError('Unsupported binary corpus version {}'.format(header['version']))
+        with open(os.path.join(corpus_dir, VOCABULARY_FILE), 'r') as vocabulary_file:
+            self.tokens = json.load(vocabulary_file)
+
+        self.corpus_dir = corpus_dir
+        self.token_ids = self._memmap(TOKENS_FILE, header['token_dtype'], header['num_tokens'])
+        self.offsets = self._memmap(OFFSETS_FILE, header['offset_dtype'], header['num_utterances'] + 1)
+
+    def _memmap(self, file_name, dtype, length):
+        # np.memmap cannot map empty files
+        if length == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self.corpus_dir, file_name), dtype=dtype, mode='r', shape=(length,))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, utterance_idx):
+        """ The token ID array of a single utterance """
+        return self.token_ids[self.offsets[utterance_idx]:self.offsets[utterance_idx + 1]]
+
+    @property
+    def num_tokens(self):
+        return len(self.token_ids)
+
+    def token_array(self):
+        """ The vocabulary as a NumPy object array so that ID arrays can be mapped back to tokens by indexing """
+        token_array = np.empty(len(self.tokens), dtype=object)
+        token_array[:] = self.tokens
+        return token_array
+
+    def sentences(self):
+        """ Generator over the text sentence of every utterance """
+        token_array = self.token_array()
+        for start, end in zip(self.offsets[:-1], self.offsets[1:]):
+            yield ' '.join(token_array[self.token_ids[start:end]])
+
+    def to_text(self, target_file):
+        """ Write the corpus in the whitespace separated text form expected by word2vec and fastText
+
+            Arguments:
+                target_file: The path name of the text corpus to write
+        """
+        with open(target_file, 'w', encoding='utf-8') as corpus_file:
+            for i, sentence in enumerate(self.sentences()):
+                if i > 0:
+                    corpus_file.write('\n')
+                corpus_file.write(sentence)
+
+
+def binary_to_text(corpus_dir, target_file):
+    """ Convert a binary corpus to the text corpus format
+
+        Arguments:
+            corpus_dir: The path of the binary corpus directory
+            target_file: The path name of the text corpus to write
+    """
+    BinaryCorpus(corpus_dir).to_text(target_file)
@@ -0,0 +1,1018 @@
+import argparse
+import json
+import logging
+import os
+
+from .pipeline import DEFAULT_QUEUE_SIZE, GZIP_SUFFIX
+from .stage_cache import DEFAULT_CACHE_SIZE_MB
+
+# Only the argument parser is built at import time. The modules behind each subcommand (and numpy, fastText,
+# scikit-learn and matplotlib behind them) are imported when the subcommand runs, so that --help and corpus
+# generation start quickly and do not need the training or plotting dependencies.
+
+RES_DIR = 'results'
+MODELS = ('word2vec', 'fastText', 'word2vec-numpy')
+PROFILE_STAGES = ('corpus', 'train', 'export', 'visualise')
+# scikit-learn refuses to run t-SNE for fewer iterations
+MIN_TSNE_ITERATIONS = 250
+
+
+def add_corpus_file_arguments(parser):
+    """ Add the path names of the corpus files, which are written by the corpus subcommand and read by the others """
+    corpus_files = parser.add_argument_group('Corpus files')
+    corpus_files.add_argument(
+        '--subword-corpus', type=str,
+        default='{}/subword-corpus.dat'.format(RES_DIR),
+        help='The path name of the subword corpus.'
+    )
+    corpus_files.add_argument(
+        '--binary-corpus', type=str, default=None,
+        help='Optional directory in which the corpus is also saved as memory-mappable token ID arrays.'
+    )
+    corpus_files.add_argument(
+        '-u', '--unique-subwords', type=str,
+        default='{}/unique-subword-list.json'.format(RES_DIR),
+        help='Path name of the file where the the unique subword unit list is saved.'
+    )
+
+def add_subword_unit_arguments(parser):
+    """ Add the options which define the subword units, which are needed to build the corpus and the label map """
+    units = parser.add_argument_group('Subword unit options')
+    units.add_argument(
+        '--apostrophe-embedding', dest='apostrophe_embedding', action='store_true'
+    )
+    units.set_defaults(apostrophe_embedding=False)
+
+def add_corpus_arguments(parser):
+    """ Add the options used to generate the subword corpus from an MLF or lattices """
+    general = parser.add_argument_group('Corpus options')
+    general.add_argument(
+        '-i', '--mlf-file', type=str, default=None,
+        help="Input MLF file from which to generate the corpus."
+    )
+    general.add_argument(
+        '--lattices', type=str, default=None,
+        help='Generate the corpus from the paths of HTK lattices (optionally gzipped) rather than an MLF: either '
+             'a directory of lattices or a file listing one lattice path per line.'
+    )
+    general.add_argument(
+        '--lattice-paths', type=str, default='sample', choices=['sample', 'nbest'],
+        help='Sample the paths of each lattice by their posterior probabilities or take the N best paths.'
+    )
+    general.add_argument(
+        '--num-paths', type=int, default=5,
+        help='The number of paths taken from each lattice.'
+    )
+    general.add_argument(
+        '-c', '--subword-context', type=int,
+        default=1, help='The subword context: monophone (1), biphone (2), triphone (3), etc'
+    )
+    general.add_argument(
+        '--loc-info', dest='subword_loc_info', action='store_true'
+    )
+    general.add_argument(
+        '--no-loc-info', dest='subword_loc_info', action='store_false'
+    )
+    general.set_defaults(subword_loc_info=False)
+    general.add_argument(
+        '--context-direction', type=str, default=None, choices=['left', 'right', 'both'],
+        help='Derive the subword context from the monophone sequence of each utterance rather than from the '
+             'HTK labels, which allows any --subword-context width. Left or right context takes all other units '
+             'from that side; both splits them evenly. The units are written as with HTK context, except that '
+             'there is none beyond the ends of an utterance. Implies --compact.'
+    )
+    general.add_argument(
+        '--streaming', dest='streaming', action='store_true',
+        help='Parse the MLF and write the corpus one utterance at a time to keep memory usage flat.'
+    )
+    general.set_defaults(streaming=False)
+    general.add_argument(
+        '--workers', type=int, default=1,
+        help='The number of processes used to parse the MLF file. More than one implies --streaming.'
+    )
+    general.add_argument(
+        '--compact', dest='compact', action='store_true',
+        help='Hold the parsed MLF as token ID arrays rather than per-arc Python objects.'
+    )
+    general.set_defaults(compact=False)
+    general.add_argument(
+        '--incremental', dest='incremental', action='store_true',
+        help='Only add utterances which are not yet in the corpus, as recorded in the corpus manifest.'
+    )
+    general.set_defaults(incremental=False)
+    general.add_argument(
+        '--corpus-manifest', type=str, default=None,
+        help='Path name of the manifest used by --incremental (defaults to <subword-corpus>.manifest.json).'
+    )
+    general.add_argument(
+        '--vocab-min-count', type=int, default=1,
+        help='Replace subword units seen fewer times than this with <unk> in the corpus. Implies --compact.'
+    )
+    general.add_argument(
+        '--subsample-threshold', type=float, default=None,
+        help='Randomly drop frequent subword units from the corpus as word2vec does (e.g. 1e-3). Implies --compact.'
+    )
+    general.add_argument(
+        '--subword-counts', type=str, default=None,
+        help='Path name of the subword unit counts saved with MLF corpora '
+             '(defaults to subword-counts.json next to the unique subword list).'
+    )
+    general.add_argument(
+        '--count-ngrams', type=int, default=1,
+        help='Also save the counts of n-grams of consecutive subword units up to this order. Implies --compact.'
+    )
+    general.add_argument(
+        '--pipeline', dest='pipeline', action='store_true',
+        help='Overlap parsing, writing the corpus and collecting the vocabulary using bounded queues, and '
+             'report the throughput of each stage. A corpus path ending in .gz is written gzip compressed.'
+    )
+    general.set_defaults(pipeline=False)
+    general.add_argument(
+        '--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+        help='The maximum number of sentence batches waiting for each stage of --pipeline.'
+    )
+    general.add_argument(
+        '--norm-cache-size', type=int, default=None,
+        help='Bound on the number of cached subword label normalisations (unbounded by default).'
+    )
+
+def add_embedding_dir_argument(parser):
+    parser.add_argument(
+        '-e', '--embedding', type=str,
+        default='{}/embedding/'.format(RES_DIR),
+        help='Path name of the embedding directory'
+    )
+
+def add_training_arguments(parser):
+    """ Add the options of the embedding models """
+    embedding = parser.add_argument_group('Embedding options')
+    embedding.add_argument(
+        '-m', '--model', type=str, default='word2vec', choices=MODELS,
+        help='The model to use: word2vec, fastText or the in-process NumPy implementation of word2vec'
+    )
+    embedding.add_argument(
+        '-w2v', '--word2vec-dir', type=str,
+        default='/home/dawna/ar527/word2vec/word2vec',
+        help='The word2vec binary, or the directory in which it was built'
+    )
+    embedding.add_argument(
+        '-l', '--vec-length', type=int, default=4,
+        help='The length of the vector representing each embedded subword unit.'
+    )
+    embedding.add_argument(
+        '--binary-embedding', dest='binary_embedding', action='store_true',
+        help='Also save the embedding in the word2vec binary format as embedding.bin (fastText). '
+             'Not compatible with --apostrophe-embedding, whose units can contain spaces.'
+    )
+    embedding.set_defaults(binary_embedding=False)
+    embedding.add_argument(
+        '--maxn', type=int, default=None,
+        help='The maximum length of character n-grams (fastText). With 0 the embedding is read straight '
+             'from the input matrix.'
+    )
+    embedding.add_argument(
+        '--skip-gram', dest='cbow', action='store_false',
+        help='Train a skip-gram rather than a CBOW model (word2vec, word2vec-numpy).'
+    )
+    embedding.set_defaults(cbow=True)
+    embedding.add_argument(
+        '--window', type=int, default=5,
+        help='The maximum context window width (word2vec, word2vec-numpy).'
+    )
+    embedding.add_argument(
+        '--negative', type=int, default=5,
+        help='The number of negative samples (word2vec, word2vec-numpy).'
+    )
+    embedding.add_argument(
+        '--sample', type=float, default=None,
+        help='The threshold above which frequent subword units are randomly discarded (word2vec, word2vec-numpy). '
+             'Defaults to the word2vec default of 1e-3, and to no subsampling for word2vec-numpy.'
+    )
+    embedding.add_argument(
+        '--epochs', type=int, default=None,
+        help='The number of training epochs (all models). Defaults to 5.'
+    )
+    embedding.add_argument(
+        '--min-count', type=int, default=None,
+        help='Discard subword units which occur fewer times than this (all models). '
+             'Defaults to 1 for word2vec-numpy and to the word2vec and fastText default of 5.'
+    )
+    embedding.add_argument(
+        '--threads', type=int, default=None,
+        help='The number of training processes or threads (all models). '
+             'Defaults to 1 for word2vec-numpy and to the word2vec and fastText defaults.'
+    )
+    embedding.add_argument(
+        '--train-timeout', type=float, default=None,
+        help='Kill the word2vec binary and fail if training takes longer than this many seconds (word2vec).'
+    )
+
+def tsne_iterations(value):
+    """ Parse the number of t-SNE iterations, which must be at least MIN_TSNE_ITERATIONS """
+    iterations = int(value)
+    if iterations < MIN_TSNE_ITERATIONS:
+        raise argparse.ArgumentTypeError(
+            't-SNE needs at least {} iterations, but found {}'.format(MIN_TSNE_ITERATIONS, iterations)
+        )
+    return iterations
+
+def add_visualisation_arguments(parser):
+    """ Add the options of the t-SNE visualisation """
+    visuals = parser.add_argument_group('Visualisation options')
+    # Map the phone / grapheme names
+    visuals.add_argument(
+        '--no-map', dest='map_label', action='store_const', const=0
+    )
+    visuals.add_argument(
+        '--map-to-en', dest='map_label', action='store_const', const=1
+    )
+    visuals.add_argument(
+        '--map-to-native', dest='map_label', action='store_const', const=2
+    )
+    visuals.set_defaults(
+        map_label=0
+    )
+    visuals.add_argument(
+        '-v', '--emb-visual', type=str,
+        default='{}/embedding/visualisation.png'.format(RES_DIR),
+        help='The path name to the visualisation image of the subword embeddings'
+    )
+    visuals.add_argument(
+        '-s', '--summary-file', type=str,
+        default='data/summary.txt',
+        help='The path name to the summary file or saved map'
+    )
+    visuals.add_argument(
+        '--fast-viz', dest='fast_viz', action='store_true',
+        help='Use PCA initialisation and early stopping for t-SNE, with 1000 iterations by default.'
+    )
+    visuals.set_defaults(fast_viz=False)
+    visuals.add_argument(
+        '--tsne-iter', type=tsne_iterations, default=None,
+        help='The maximum number of t-SNE iterations, at least {} (20000 by default, 1000 with --fast-viz).'.format(
+            MIN_TSNE_ITERATIONS
+        )
+    )
+    visuals.add_argument(
+        '--tsne-cache', type=str, default=None,
+        help='Directory in which t-SNE projections are cached (defaults to tsne-cache in the embedding directory).'
+    )
+    visuals.add_argument(
+        '--no-tsne-cache', dest='use_tsne_cache', action='store_false',
+        help='Always recompute the t-SNE projection.'
+    )
+    visuals.set_defaults(use_tsne_cache=True)
+    # t-SNE representation
+    visuals.add_argument(
+        '-p', '--perplexity', type=float,
+        default=5,
+        help='The perplexity for t-SNE'
+    )
+    visuals.add_argument(
+        '-lr', '--learning-rate', type=int,
+        default=200,
+        help='The t-SNE learning rate.'
+    )
+
+def add_export_arguments(parser):
+    """ Add the options of the export subcommand """
+    export = parser.add_argument_group('Export options')
+    export.add_argument(
+        '-f', '--format', type=str, default='npy', choices=['npy', 'bin', 'float16', 'int8', 'pq'],
+        help='Save the embedding as a memory-mappable EmbeddingStore (embedding-store.npy and '
+             'embedding-store.tokens.json), '
+             'in the word2vec binary format (embedding.bin), or as a QuantizedEmbeddingStore '
+             '(embedding.quantized.npz and embedding.quantized.json) with float16, per-row scaled int8 or '
+             'product quantized vectors.'
+    )
+    export.add_argument(
+        '-o', '--output', type=str, default=None,
+        help='The path name prefix of the exported embedding (defaults to embedding-store for npy, and embedding '
+             'otherwise, in the embedding directory).'
+    )
+    export.add_argument(
+        '--pq-subvectors', type=int, default=None,
+        help='The number of sub-vectors of product quantization, which must divide the vector length '
+             '(defaults to sub-vectors of two dimensions).'
+    )
+    export.add_argument(
+        '--pq-centroids', type=int, default=None,
+        help='The number of centroids of each product quantization codebook (at most 256, and fewer than the '
+             'number of subword units). Defaults to 256, or one fewer than the number of subword units.'
+    )
+    export.add_argument(
+        '--pq-iterations', type=int, default=25,
+        help='The number of k-means iterations used to learn the product quantization codebooks.'
+    )
+
+def add_profiling_arguments(parser):
+    """ Add the options of the per-stage profiling """
+    profiling = parser.add_argument_group('Profiling options')
+    profiling.add_argument(
+        '--profile', type=str, default=None,
+        help='Save a JSON report of the wall time, CPU time, peak memory and counters (sentences, arcs, unique '
+             'subwords, corpus bytes, normalisation cache hits, ...) of each stage to this path. Stages which '
+             'otherwise overlap (exporting and visualising) are run one after the other.'
+    )
+    profiling.add_argument(
+        '--trace-memory', dest='trace_memory', action='store_true',
+        help='Also record the peak Python heap allocation of each stage with tracemalloc (which is slow).'
+    )
+    profiling.set_defaults(trace_memory=False)
+    profiling.add_argument(
+        '--cprofile-stage', type=str, default=None, choices=PROFILE_STAGES,
+        help='Run this stage under cProfile and save the stats (for pstats or snakeviz).'
+    )
+    profiling.add_argument(
+        '--cprofile-output', type=str, default=None,
+        help='The path name of the cProfile stats (defaults to <profile>.<stage>.prof).'
+    )
+
+def add_cache_arguments(parser):
+    """ Add the options of the stage artifact cache """
+    cache = parser.add_argument_group('Stage cache options')
+    cache.add_argument(
+        '--stage-cache', type=str, default=None,
+        help='Directory of a content-addressed cache of the corpus, embedding and visualisation. A stage whose '
+             'inputs (e.g. the MLF or summary file content) and options are unchanged is restored from the cache '
+             'rather than run.'
+    )
+    cache.add_argument(
+        '--stage-cache-size', type=float, default=DEFAULT_CACHE_SIZE_MB,
+        help='The bound on the size of the stage cache in MB, beyond which the least recently used entries are '
+             'evicted.'
+    )
+
+def add_query_arguments(parser):
+    """ Add the options of the query subcommand """
+    query = parser.add_argument_group('Query options')
+    query.add_argument(
+        '-o', '--output', type=str, required=True,
+        help='The path name of the neighbour table to write.'
+    )
+    query.add_argument(
+        '-k', '--num-neighbours', type=int, default=10,
+        help='The number of nearest neighbours to list for each subword unit.'
+    )
+    query.add_argument(
+        '-q', '--query', type=str, nargs='+', default=None,
+        help='Only list the neighbours of these subword units rather than the whole vocabulary (units which are '
+             'not in the embedding are skipped with a warning).'
+    )
+
+def add_sweep_arguments(parser):
+    """ Add the options of the sweep subcommand """
+    sweep = parser.add_argument_group('Sweep options')
+    sweep.add_argument(
+        '-g', '--grid', type=str, required=True,
+        help='JSON file with the grid to train: an object mapping option names (e.g. "model", "vec_length", '
+             '"window") to lists of values, whose cartesian product is trained, or a list of such objects.'
+    )
+    sweep.add_argument(
+        '--sweep-dir', type=str, default='{}/sweep'.format(RES_DIR),
+        help='The directory holding one embedding directory per grid point and the summary table.'
+    )
+    sweep.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='The number of grid points trained at the same time.'
+    )
+    sweep.add_argument(
+        '--cpu-budget', type=int, default=os.cpu_count(),
+        help='The number of CPUs shared between the jobs. Each job trains with cpu-budget / jobs threads '
+             'unless --threads or the grid sets "threads", and jobs wait until their threads fit in the budget.'
+    )
+    sweep.add_argument(
+        '--skip-corpus', dest='skip_corpus', action='store_true',
+        help='Reuse the subword corpus and unique subword list from a previous run.'
+    )
+    sweep.set_defaults(skip_corpus=False)
+
+def build_parser():
+    """ Build the command line argument parser with one subparser per subcommand """
+    parser = argparse.ArgumentParser(
+        description="Generate sub-word (phone or grapheme) level embeddings from an MLF or lattice corpus"
+    )
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.required = True
+    # The subcommands without profiling or cache options run with a disabled profiler and no cache
+    parser.set_defaults(profile=None, trace_memory=False, cprofile_stage=None, cprofile_output=None)
+    parser.set_defaults(stage_cache=None)
+
+    corpus = subparsers.add_parser('corpus', help='Generate the subword corpus and the unique subword list.')
+    add_corpus_arguments(corpus)
+    add_corpus_file_arguments(corpus)
+    add_subword_unit_arguments(corpus)
+    add_cache_arguments(corpus)
+    add_profiling_arguments(corpus)
+    corpus.set_defaults(run_command=corpus_command)
+
+    train = subparsers.add_parser('train', help='Train an embedding on an existing subword corpus.')
+    add_corpus_file_arguments(train)
+    add_embedding_dir_argument(train)
+    add_training_arguments(train)
+    add_cache_arguments(train)
+    add_profiling_arguments(train)
+    train.set_defaults(run_command=train_command)
+
+    visualise = subparsers.add_parser('visualise', help='Plot the t-SNE projection of an embedding.')
+    add_embedding_dir_argument(visualise)
+    add_subword_unit_arguments(visualise)
+    add_visualisation_arguments(visualise)
+    add_cache_arguments(visualise)
+    add_profiling_arguments(visualise)
+    visualise.set_defaults(run_command=visualise_command)
+
+    export = subparsers.add_parser('export', help='Convert embedding.txt to another format.')
+    add_embedding_dir_argument(export)
+    add_export_arguments(export)
+    add_profiling_arguments(export)
+    export.set_defaults(run_command=export_command)
+
+    index = subparsers.add_parser(
+        'index', help='Index the utterances of an MLF file for random access by label name.'
+    )
+    index.add_argument(
+        '-i', '--mlf-file', type=str, required=True,
+        help='The MLF file to index.'
+    )
+    index.add_argument(
+        '-o', '--index', type=str, default=None,
+        help='The path name of the index (defaults to the MLF path with .index.npz appended).'
+    )
+    index.set_defaults(run_command=index_command)
+
+    query = subparsers.add_parser('query', help='Dump the nearest neighbour table of an embedding.')
+    query.add_argument(
+        '-e', '--embedding', type=str, required=True,
+        help='The EmbeddingStore path prefix, the embedding.txt/embedding.bin file or the legacy embedding.npy '
+             'to query.'
+    )
+    add_query_arguments(query)
+    query.set_defaults(run_command=query_command)
+
+    run = subparsers.add_parser(
+        'run', help='Generate the corpus, train the embedding and visualise it (optionally exporting it).'
+    )
+    add_corpus_arguments(run)
+    add_corpus_file_arguments(run)
+    add_subword_unit_arguments(run)
+    add_embedding_dir_argument(run)
+    add_training_arguments(run)
+    add_visualisation_arguments(run)
+    run.add_argument(
+        '--save-to-npy', dest='embed_to_npy', action='store_true',
+        help='Save the embedding to embedding.npy in the embedding directory as a pickled dictionary of subword '
+             'unit to vector, which is read with np.load(path, allow_pickle=True).item().'
+    )
+    run.add_argument(
+        '--save-store', dest='embed_to_store', action='store_true',
+        help='Save the embedding as a memory-mappable EmbeddingStore (embedding-store.npy and '
+             'embedding-store.tokens.json) in the embedding directory.'
+    )
+    run.add_argument(
+        '--only-viz', dest='only_viz', action='store_true',
+        help='Skip the corpus and training stages and only visualise (and export) the embedding already in the '
+             'embedding directory.'
+    )
+    add_cache_arguments(run)
+    add_profiling_arguments(run)
+    run.set_defaults(embed_to_npy=False, embed_to_store=False, only_viz=False, run_command=run_command)
+
+    sweep = subparsers.add_parser(
+        'sweep', help='Build the subword corpus once and train a grid of subword embeddings on it concurrently.'
+    )
+    add_corpus_arguments(sweep)
+    add_corpus_file_arguments(sweep)
+    add_subword_unit_arguments(sweep)
+    add_training_arguments(sweep)
+    add_sweep_arguments(sweep)
+    sweep.set_defaults(run_command=sweep_command)
+
+    return parser
+
+def check_corpus_arguments(parser, args):
+    """ Reject combinations of corpus options which cannot be used together """
+    if (args.mlf_file is None) == (args.lattices is None):
+        parser.error('Exactly one of --mlf-file and --lattices is required')
+    if args.pipeline and (args.binary_corpus or args.incremental or args.compact or args.context_direction or
+                          args.vocab_min_count > 1 or args.subsample_threshold or args.count_ngrams > 1):
+        parser.error('--pipeline streams the text corpus and only supports --workers and --lattices')
+    if args.subword_corpus.endswith(GZIP_SUFFIX) and not args.pipeline:
+        parser.error('A gzip compressed corpus can only be written with --pipeline')
+    if args.lattices and (args.binary_corpus or args.incremental or args.compact or args.context_direction or
+                          args.vocab_min_count > 1 or args.subsample_threshold or args.count_ngrams > 1):
+        parser.error('Lattice corpora are streamed as text and only support --workers of the corpus options')
+    if args.incremental and args.stage_cache:
+        parser.error('--incremental appends to the existing corpus and cannot be combined with --stage-cache')
+    if args.incremental and args.binary_corpus:
+        parser.error('--incremental only maintains the text corpus and cannot be combined with --binary-corpus')
+    if (args.compact or args.context_direction or args.vocab_min_count > 1 or args.subsample_threshold or
+            args.count_ngrams > 1) and (args.streaming or args.workers > 1 or args.incremental):
+        parser.error(
+            '--compact, --context-direction, --vocab-min-count, --subsample-threshold and --count-ngrams cannot be '
+            'combined with --streaming, --workers or --incremental'
+        )
+
+def check_training_arguments(parser, args):
+    """ Reject training options which do not fit the corpus """
+    if args.subword_corpus.endswith(GZIP_SUFFIX) and args.model != 'word2vec-numpy':
+        parser.error('A gzip compressed corpus can only be read by the word2vec-numpy model')
+
+def check_arguments(parser, args):
+    """ Check the options of the subcommand being run """
+    if args.command == 'run' and args.only_viz:
+        return
+    if args.command in ('corpus', 'run') or (args.command == 'sweep' and not args.skip_corpus):
+        check_corpus_arguments(parser, args)
+    if args.command in ('train', 'run', 'sweep'):
+        check_training_arguments(parser, args)
+
+def parse_arguments(args_to_parse):
+    """ Parse the command line arguments.
+
+        Options given without a subcommand (e.g. -i data/train.mlf, as before the subcommands were added) are
+        parsed as options of the run subcommand.
+
+        Arguments:
+            args_to_parse: CLI arguments to parse
+    """
+    parser = build_parser()
+    args_to_parse = list(args_to_parse)
+    if args_to_parse and args_to_parse[0].startswith('-') and args_to_parse[0] not in ('-h', '--help'):
+        args_to_parse = ['run'] + args_to_parse
+    args = parser.parse_args(args_to_parse)
+    check_arguments(parser, args)
+    return args
+
+def make_parent_dirs(*path_names):
+    """ Create the missing parent directories of the given files """
+    for path_name in path_names:
+        target_dir = os.path.dirname(path_name)
+        if target_dir and not os.path.exists(target_dir):
+            os.makedirs(target_dir)
+
+def generate_corpus(args, normaliser):
+    """ Parse the MLF or lattices and write the subword corpus and the unique subword list
+
+        Returns:
+            A dictionary of the counters of the corpus recorded while it was written
+    """
+    if args.pipeline:
+        return generate_corpus_pipeline(args, normaliser)
+
+    if args.lattices:
+        from .lattice_corpus import LatticeDataset
+        lattice_dataset = LatticeDataset(
+            lattice_source=args.lattices,
+            subword_context_width=args.subword_context,
+            incl_posn_info=args.subword_loc_info,
+            separate_apostrophe_embedding=args.apostrophe_embedding,
+            path_mode=args.lattice_paths,
+            num_paths=args.num_paths,
+            workers=args.workers,
+            normaliser=normaliser
+        )
+        lattice_dataset.write_corpus(target_file=args.subword_corpus)
+        lattice_dataset.save_unique_subwords(target_file=args.unique_subwords)
+        return {'sentences': lattice_dataset.num_sentences, 'tokens': lattice_dataset.num_tokens}
+
+    if args.incremental:
+        from .incremental_corpus import update_corpus
+        num_appended = update_corpus(
+            path_to_mlf=args.mlf_file,
+            corpus_path=args.subword_corpus,
+            unique_subwords_path=args.unique_subwords,
+            manifest_path=args.corpus_manifest or '{}.manifest.json'.format(args.subword_corpus),
+            subword_context_width=args.subword_context,
+            incl_posn_info=args.subword_loc_info,
+            separate_apostrophe_embedding=args.apostrophe_embedding,
+            normaliser=normaliser,
+            subword_counts_path=subword_counts_path(args)
+        )
+        print('Added {} new utterances to the corpus'.format(num_appended))
+        return {'appended_sentences': num_appended}
+
+    from .binary_corpus import binary_to_text
+    from .subword_corpus import MLFDataset
+    subword_dataset = MLFDataset(
+        path_to_mlf=args.mlf_file,
+        subword_context_width=args.subword_context,
+        incl_posn_info=args.subword_loc_info,
+        separate_apostrophe_embedding=args.apostrophe_embedding,
+        streaming=args.streaming,
+        workers=args.workers,
+        compact=args.compact or args.count_ngrams > 1,
+        normaliser=normaliser,
+        context_direction=args.context_direction,
+        min_count=args.vocab_min_count,
+        subsample_threshold=args.subsample_threshold
+    )
+    # The corpus is written first since the unique subwords are collected while streaming
+    if args.binary_corpus:
+        # Parse once into the binary format and derive the text corpus for the external trainers from it
+        subword_dataset.save_binary_corpus(corpus_dir=args.binary_corpus)
+        binary_to_text(corpus_dir=args.binary_corpus, target_file=args.subword_corpus)
+    else:
+        subword_dataset.write_corpus(target_file=args.subword_corpus)
+    subword_dataset.save_unique_subwords(target_file=args.unique_subwords)
+    subword_dataset.save_subword_counts(target_file=subword_counts_path(args), max_ngram_order=args.count_ngrams)
+    return {'sentences': subword_dataset.num_sentences, 'tokens': subword_dataset.num_tokens}
+
+def generate_corpus_pipeline(args, normaliser):
+    """ Generate the corpus with parsing, writing and vocabulary collection overlapped (see CorpusPipeline) """
+    from .pipeline import CorpusPipeline
+    if args.lattices:
+        from .lattice_corpus import LatticeDataset
+        dataset = LatticeDataset(
+            lattice_source=args.lattices,
+            subword_context_width=args.subword_context,
+            incl_posn_info=args.subword_loc_info,
+            separate_apostrophe_embedding=args.apostrophe_embedding,
+            path_mode=args.lattice_paths,
+            num_paths=args.num_paths,
+            workers=args.workers,
+            normaliser=normaliser
+        )
+    else:
+        from .subword_corpus import MLFDataset
+        dataset = MLFDataset(
+            path_to_mlf=args.mlf_file,
+            subword_context_width=args.subword_context,
+            incl_posn_info=args.subword_loc_info,
+            separate_apostrophe_embedding=args.apostrophe_embedding,
+            streaming=True,
+            workers=args.workers,
+            normaliser=normaliser
+        )
+
+    corpus_pipeline = CorpusPipeline(args.subword_corpus, queue_size=args.queue_size)
+    dataset.subwords = corpus_pipeline.run(dataset.iter_sentence_batches())
+    dataset.save_unique_subwords(target_file=args.unique_subwords)
+    if not args.lattices:
+        dataset.save_subword_counts(target_file=subword_counts_path(args))
+    corpus_pipeline.report()
+    return {'sentences': dataset.num_sentences, 'tokens': dataset.num_tokens}
+
+def count_corpus(args, normaliser, profiler, corpus_counters, cached):
+    """ Record the size of the generated corpus and the label normalisation counts with the profiler
+
+        Arguments:
+            args: The parsed command line arguments
+            normaliser: The LabelNormaliser used to generate the corpus
+            profiler: The Profiler recording the stages
+            corpus_counters: The counters returned by generate_corpus()
+            cached: Whether the corpus was restored from the stage cache, in which case nothing was parsed and
+                    only the size of the restored files is recorded
+    """
+    with open(args.unique_subwords, 'r') as unique_subwords_file:
+        profiler.count('unique_subwords', len(json.load(unique_subwords_file)))
+    profiler.count('corpus_bytes', os.path.getsize(args.subword_corpus))
+    if cached:
+        return
+
+    for name, value in corpus_counters.items():
+        profiler.count(name, value)
+    cache_stats = normaliser.stats()
+    # Every parsed arc has its label normalised once, whether or not the result is cached
+    profiler.count('arcs', cache_stats['hits'] + cache_stats['misses'])
+    profiler.count('norm_cache_hits', cache_stats['hits'])
+    profiler.count('norm_cache_misses', cache_stats['misses'])
+    profiler.count('norm_cache_evictions', cache_stats['evictions'])
+
+def subword_counts_path(args):
+    """ The path name of the subword counts, which are saved for MLF corpora """
+    if args.lattices:
+        return None
+    return args.subword_counts or os.path.join(os.path.dirname(args.unique_subwords), 'subword-counts.json')
+
+def run_cached(stage_cache, stage, key, artifacts, run_stage):
+    """ Run a stage, unless its artifacts can be restored from the stage cache
+
+        Arguments:
+            stage_cache: The StageCache, or None to always run the stage
+            stage: The name of the stage
+            key: The cache key of the stage
+            artifacts: A dictionary mapping the names of the artifacts of the stage to their path names
+            run_stage: A function which runs the stage
+
+        Returns:
+            Whether the artifacts were restored from the cache
+    """
+    if stage_cache is not None and stage_cache.restore(stage, key, artifacts):
+        print('Restored the {} stage from the cache'.format(stage))
+        return True
+    snapshot = stage_cache.snapshot(artifacts) if stage_cache is not None else None
+    run_stage()
+    if stage_cache is not None:
+        stage_cache.store(stage, key, artifacts, snapshot)
+    return False
+
+def corpus_command(args, profiler, stage_cache=None):
+    """ Generate the subword corpus and report the label normalisation cache statistics
+
+        Returns:
+            The stage cache key of the corpus (None without a cache)
+    """
+    from .subword_corpus import LabelNormaliser
+    make_parent_dirs(args.subword_corpus, args.unique_subwords)
+
+    cache_key = None
+    if stage_cache is not None:
+        if args.lattices:
+            from .lattice_corpus import iter_lattice_files
+            input_files = list(iter_lattice_files(args.lattices))
+        else:
+            input_files = [args.mlf_file]
+        # Parsing options which do not change the corpus (e.g. --workers) are left out
+        cache_key = stage_cache.key('corpus', input_files, options={
+            'subword_context': args.subword_context,
+            'loc_info': args.subword_loc_info,
+            'apostrophe_embedding': args.apostrophe_embedding,
+            'context_direction': args.context_direction,
+            'vocab_min_count': args.vocab_min_count,
+            'subsample_threshold': args.subsample_threshold,
+            'count_ngrams': args.count_ngrams,
+            'lattice_paths': args.lattice_paths if args.lattices else None,
+            'num_paths': args.num_paths if args.lattices else None,
+            'compressed': args.subword_corpus.endswith(GZIP_SUFFIX),
+        })
+    artifacts = {
+        'subword_corpus': args.subword_corpus,
+        'unique_subwords': args.unique_subwords,
+        'binary_corpus': args.binary_corpus,
+        'subword_counts': subword_counts_path(args),
+    }
+
+    print('Generating corpus...')
+    normaliser = LabelNormaliser(max_size=args.norm_cache_size)
+    corpus_counters = {}
+    with profiler.stage('corpus'):
+        cached = run_cached(
+            stage_cache, 'corpus', cache_key, artifacts,
+            lambda: corpus_counters.update(generate_corpus(args, normaliser))
+        )
+    if not cached:
+        cache_stats = normaliser.stats()
+        print('Label normalisation cache: {} hits, {} misses ({:.1%} hit rate)'.format(
+            cache_stats['hits'], cache_stats['misses'], cache_stats['hit_rate']
+        ))
+    if profiler.enabled:
+        profiler.count('cached', int(cached))
+        count_corpus(args, normaliser, profiler, corpus_counters, cached)
+    return cache_key
+
+def train_command(args, profiler, stage_cache=None, upstream_key=None):
+    """ Train the embedding on the corpus
+
+        Arguments:
+            args: The parsed command line arguments
+            profiler: The Profiler recording the stages
+            stage_cache: An optional StageCache
+            upstream_key: The stage cache key of the corpus, if it was generated in the same run
+
+        Returns:
+            The stage cache key of the embedding (None without a cache)
+    """
+    from .training import train_embedding
+
+    embedding_file_name = os.path.join(args.embedding, 'embedding.txt')
+    cache_key = None
+    if stage_cache is not None:
+        from .word2vec_runner import word2vec_binary
+        input_files = []
+        if upstream_key is None:
+            input_files += [args.subword_corpus, args.unique_subwords]
+            if args.model == 'word2vec-numpy' and args.binary_corpus:
+                input_files += sorted(
+                    os.path.join(args.binary_corpus, file_name) for file_name in os.listdir(args.binary_corpus)
+                )
+        word2vec_path = os.path.abspath(word2vec_binary(args.word2vec_dir)) if args.model == 'word2vec' else None
+        if word2vec_path is not None and os.path.isfile(word2vec_path):
+            # A rebuilt word2vec binary invalidates the embedding as well as a different one
+            input_files.append(word2vec_path)
+        # The external trainers' threads only change the result through thread scheduling, so they are left out.
+        # The word2vec-numpy chunks are partitioned across its worker processes, which changes the embedding.
+        cache_key = stage_cache.key(
+            'train',
+            input_files=input_files,
+            options={
+                'model': args.model,
+                'word2vec': word2vec_path,
+                'binary_corpus': args.model == 'word2vec-numpy' and bool(args.binary_corpus),
+                'vec_length': args.vec_length,
+                'cbow': args.cbow,
+                'window': args.window,
+                'negative': args.negative,
+                'sample': args.sample,
+                'epochs': args.epochs,
+                'min_count': args.min_count,
+                'maxn': args.maxn,
+                'binary_embedding': args.binary_embedding,
+                'threads': args.threads if args.model == 'word2vec-numpy' else None,
+            },
+            upstream_key=upstream_key
+        )
+    artifacts = {
+        'embedding': embedding_file_name,
+        'binary_embedding': os.path.join(args.embedding, 'embedding.bin')
+        if args.binary_embedding and args.model == 'fastText' else None,
+    }
+
+    print('Using {} to generate embeddings...'.format(args.model))
+    with profiler.stage('train'):
+        cached = run_cached(stage_cache, 'train', cache_key, artifacts, lambda: train_embedding(args))
+
+    if profiler.enabled and os.path.exists(embedding_file_name):
+        profiler.count('cached', int(cached))
+        with open(embedding_file_name, 'r') as embedding_file:
+            profiler.count('vectors', int(embedding_file.readline().split()[0]))
+    return cache_key
+
+def visualise_command(args, profiler, stage_cache=None, upstream_key=None, export=None):
+    """ Save the t-SNE visualisation of the embedding
+
+        Arguments:
+            args: The parsed command line arguments
+            profiler: The Profiler recording the stages
+            stage_cache: An optional StageCache
+            upstream_key: The stage cache key of the embedding, if it was trained in the same run
+            export: An optional function called with the EmbeddingStore while the visualisation is computed
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from .embedding_store import EmbeddingStore
+    from .visualise import visualise_embedding, label_maps_from_file
+
+    embedding_file_name = os.path.join(args.embedding, 'embedding.txt')
+    cache_key = None
+    if stage_cache is not None:
+        cache_key = stage_cache.key(
+            'visualise',
+            input_files=[args.summary_file] + ([embedding_file_name] if upstream_key is None else []),
+            options={
+                'map_label': args.map_label,
+                'apostrophe_embedding': args.apostrophe_embedding,
+                'perplexity': args.perplexity,
+                'learning_rate': args.learning_rate,
+                'fast_viz': args.fast_viz,
+                'tsne_iter': args.tsne_iter,
+                'image_format': os.path.splitext(args.emb_visual)[1],
+            },
+            upstream_key=upstream_key
+        )
+        if stage_cache.restore('visualise', cache_key, {'visualisation': args.emb_visual}):
+            print('Restored the visualise stage from the cache')
+            if export is not None:
+                with profiler.stage('export'):
+                    export(EmbeddingStore.from_embedding_file(embedding_file_name))
+            return
+
+    print('Creating visualisation using t-SNE...')
+    label_map = label_maps_from_file(
+        path_to_summary=args.summary_file,
+        label_mapping_code=args.map_label,
+        separate_apostrophe_embedding=args.apostrophe_embedding,
+        saved_dict=False
+    )
+
+    embedding_store = EmbeddingStore.from_embedding_file(embedding_file_name)
+    if args.use_tsne_cache:
+        tsne_cache_dir = args.tsne_cache or os.path.join(args.embedding, 'tsne-cache')
+    else:
+        tsne_cache_dir = None
+    make_parent_dirs(args.emb_visual)
+    if export is not None and profiler.enabled:
+        # Profiled stages run one after the other, so that their time and memory can be told apart
+        with profiler.stage('export'):
+            export(embedding_store)
+        export = None
+
+    visualise = lambda: visualise_embedding(
+        embedding_store=embedding_store,
+        perplexity=args.perplexity,
+        learning_rate=args.learning_rate,
+        image_path_name=args.emb_visual,
+        label_mapping=label_map,
+        fast=args.fast_viz,
+        max_iter=args.tsne_iter,
+        cache_dir=tsne_cache_dir
+    )
+    with profiler.stage('visualise'):
+        if export is None:
+            visualise()
+        else:
+            # Only the export has to wait for the embedding, so it is written while t-SNE runs in another thread
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                visualisation = executor.submit(visualise)
+                export(embedding_store)
+                visualisation.result()
+    profiler.count('vectors', len(embedding_store))
+    if stage_cache is not None:
+        stage_cache.store('visualise', cache_key, {'visualisation': args.emb_visual})
+
+def export_command(args, profiler, stage_cache=None):
+    """ Convert embedding.txt in the embedding directory to an EmbeddingStore, a QuantizedEmbeddingStore or the
+        word2vec binary format
+    """
+    from .embedding_io import write_word2vec_binary
+    from .embedding_store import EmbeddingStore, STORE_NAME
+
+    target_prefix = args.output or os.path.join(args.embedding, STORE_NAME if args.format == 'npy' else 'embedding')
+    make_parent_dirs(target_prefix)
+    with profiler.stage('export'):
+        embedding_store = EmbeddingStore.from_embedding_file(os.path.join(args.embedding, 'embedding.txt'))
+        if args.format == 'npy':
+            embedding_store.save(target_prefix)
+        elif args.format == 'bin':
+            write_word2vec_binary('{}.bin'.format(target_prefix), embedding_store.tokens, embedding_store.vectors)
+        else:
+            from .quantization import QuantizedEmbeddingStore
+            quantized_store = QuantizedEmbeddingStore.from_store(
+                embedding_store, args.format, num_subvectors=args.pq_subvectors, num_centroids=args.pq_centroids,
+                iterations=args.pq_iterations
+            )
+            quantized_store.save(target_prefix)
+            print('Reconstruction error of {} quantization: {}'.format(args.format, ', '.join(
+                '{} {:.4g}'.format(measure, value) for measure, value in quantized_store.error.items()
+            )))
+    profiler.count('vectors', len(embedding_store))
+    print('Exported {} subword units to {}'.format(len(embedding_store), target_prefix))
+
+def index_command(args, profiler, stage_cache=None):
+    from .mlf_index import build_mlf_index
+    build_mlf_index(args.mlf_file, args.index)
+
+def query_command(args, profiler, stage_cache=None):
+    """ Write the nearest neighbour table of an embedding """
+    from .embedding_store import load_embedding_store
+    from .similarity import NeighbourIndex, write_neighbour_table
+
+    neighbour_index = NeighbourIndex(load_embedding_store(args.embedding))
+    query_tokens = args.query
+    if query_tokens is not None:
+        unknown_tokens = neighbour_index.unknown_tokens(query_tokens)
+        if unknown_tokens:
+            print('Skipping the subword units which are not in the embedding: {}'.format(', '.join(unknown_tokens)))
+            query_tokens = [token for token in query_tokens if token in neighbour_index.store]
+    write_neighbour_table(neighbour_index, args.output, args.num_neighbours, tokens=query_tokens)
+
+def run_command(args, profiler, stage_cache=None):
+    """ Generate the corpus, train the embedding and visualise it in one go
+
+        With a stage cache the key of each stage is chained to the key of the stage before it, so that a rerun
+        restores every stage up to the first one whose inputs or options changed and runs the rest.
+    """
+    if not os.path.exists(RES_DIR):
+        os.makedirs(RES_DIR)
+    if args.only_viz:
+        embedding_key = None
+    else:
+        corpus_key = corpus_command(args, profiler, stage_cache)
+        embedding_key = train_command(args, profiler, stage_cache, upstream_key=corpus_key)
+    export = None
+    if args.embed_to_npy or args.embed_to_store:
+        from .embedding_store import STORE_NAME
+
+        def export(embedding_store):
+            if args.embed_to_npy:
+                embedding_store.save_legacy_npy(os.path.join(args.embedding, 'embedding.npy'))
+            if args.embed_to_store:
+                embedding_store.save(os.path.join(args.embedding, STORE_NAME))
+    visualise_command(args, profiler, stage_cache, upstream_key=embedding_key, export=export)
+
+def sweep_command(args, profiler, stage_cache=None):
+    from .sweep import run_sweep
+    run_sweep(args)
+
+def make_profiler(args):
+    """ The Profiler requested by the profiling options (disabled without --profile or --cprofile-stage) """
+    from .profiling import Profiler
+    cprofile_path = args.cprofile_output
+    if args.cprofile_stage and cprofile_path is None:
+        report_prefix = os.path.splitext(args.profile)[0] if args.profile else RES_DIR + '/profile'
+        cprofile_path = '{}.{}.prof'.format(report_prefix, args.cprofile_stage)
+    if cprofile_path:
+        make_parent_dirs(cprofile_path)
+    return Profiler(
+        enabled=bool(args.profile or args.cprofile_stage),
+        trace_memory=args.trace_memory,
+        cprofile_stage=args.cprofile_stage,
+        cprofile_path=cprofile_path
+    )
+
+def main(args):
+    """ Primary point of entry for generating sub-word (phone or grapheme) level embeddings
+    """
+    # The word2vec runner logs the progress of the binary
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    profiler = make_profiler(args)
+    if args.stage_cache:
+        from .stage_cache import StageCache
+        stage_cache = StageCache(args.stage_cache, args.stage_cache_size)
+    else:
+        stage_cache = None
+    args.run_command(args, profiler, stage_cache)
+    if args.profile:
+        profiler.save(args.profile)
+        profiler.print_summary()
+        print('Saved the profile to {}'.format(args.profile))
+    print('Complete')
@@ -0,0 +1,109 @@
+import json
+
+import numpy as np
+
+from .ngram_context import hash_ngrams, ngram_id_matrix, ngram_tokens, MISSING_CONTEXT_ID
+
+
+UNK_TOKEN = '<unk>'
+NGRAM_COUNT_SEPARATOR = '-'
+SUBSAMPLE_SEED = 1
+
+
+def token_counts(token_ids, vocabulary_size):
+    """ Count the occurrences of every token ID with a single bincount
+
+        Arguments:
+            token_ids: An array of token IDs
+            vocabulary_size: The number of tokens in the vocabulary (so that unused tokens get a zero count)
+    """
+    return np.bincount(np.asarray(token_ids, dtype=np.int64), minlength=vocabulary_size)
+
+def ngram_counts(token_ids, offsets, tokens, order):
+    """ Count the n-grams of consecutive units within each utterance
+
+        Arguments:
+            token_ids: The token IDs of all utterances back to back
+            offsets: The utterance boundaries of token_ids
+            tokens: The tokens indexed by the IDs
+            order: The number of units in each n-gram
+
+        Returns:
+            A dictionary mapping each n-gram (as an 'a-b-c' string) to its count
+    """
+    ngrams = ngram_id_matrix(token_ids, offsets, order, direction='left')
+    # Only count complete n-grams, not those cut short by the start of an utterance
+    ngrams = ngrams[(ngrams != MISSING_CONTEXT_ID).all(axis=1)]
+    ngram_ids, unique_ngrams = hash_ngrams(ngrams, len(tokens))
+    counts = np.bincount(ngram_ids, minlength=len(unique_ngrams))
+    return dict(zip(ngram_tokens(unique_ngrams, tokens, NGRAM_COUNT_SEPARATOR), counts.tolist()))
+
+def min_count_mapping(counts, min_count):
+    """ Map the token IDs onto a pruned vocabulary in which tokens seen fewer than min_count times share one ID
+
+        Arguments:
+            counts: The count of every token ID
+            min_count: The minimum count of a token to keep it
+
+        Returns:
+            A tuple of the array mapping old IDs to new IDs, the old IDs of the kept tokens (in the new ID order)
+            and the new ID of the unknown token (None if no token was pruned)
+    """
+    kept = np.flatnonzero(counts >= min_count)
+    pruned = np.flatnonzero((counts < min_count) & (counts > 0))
+    unk_id = len(kept) if len(pruned) else None
+    id_map = np.full(len(counts), len(kept), dtype=np.int64)
+    id_map[kept] = np.arange(len(kept))
+    return id_map, kept, unk_id
+
+def keep_probabilities(counts, threshold):
+    """ The probability of keeping each occurrence of a token when subsampling frequent tokens
+
+        This is the word2vec formula: a token with relative frequency f is kept with probability
+        (sqrt(f / threshold) + 1) * threshold / f, capped at 1.
+
+        Arguments:
+            counts: The count of every token ID
+            threshold: The subsampling threshold (word2vec's -sample, typically 1e-3 to 1e-5)
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    frequencies = counts / max(counts.sum(), 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        probabilities = (np.sqrt(frequencies / threshold) + 1) * threshold / frequencies
+    probabilities[counts == 0] = 1.0
+    return np.minimum(probabilities, 1.0)
+
+def subsample_mask(token_ids, counts, threshold, seed=SUBSAMPLE_SEED):
+    """ Draw which arcs to keep when subsampling frequent tokens (see keep_probabilities())
+
+        Arguments:
+            token_ids: The token IDs of all arcs
+            counts: The count of every token ID
+            threshold: The subsampling threshold
+            seed: The seed of the random draws, so that repeated writes of a corpus are identical
+    """
+    rng = np.random.RandomState(seed)
+    return rng.random_sample(len(token_ids)) < keep_probabilities(counts, threshold)[token_ids]
+
+def save_subword_counts(target_file, tokens, counts, ngram_counts_by_order=None):
+    """ Save the token counts (and optionally n-gram counts) as JSON
+
+        Arguments:
+            target_file: The path name of the counts file
+            tokens: The tokens indexed by the IDs
+            counts: The count of every token ID
+            ngram_counts_by_order: An optional dictionary mapping an n-gram order to its n-gram counts
+    """
+    subword_counts = {
+        'num_tokens': int(np.sum(counts)),
+        'counts': {token: count for token, count in zip(tokens, np.asarray(counts).tolist()) if count > 0},
+    }
+    if ngram_counts_by_order:
+        subword_counts['ngram_counts'] = {str(order): counts for order, counts in ngram_counts_by_order.items()}
+    with open(target_file, 'w') as counts_file:
+        json.dump(subword_counts, counts_file)
+
+def load_subword_counts(counts_file_path):
+    """ Load the token counts saved by save_subword_counts() as a dictionary mapping each token to its count """
+    with open(counts_file_path, 'r') as counts_file:
+        return json.load(counts_file)['counts']
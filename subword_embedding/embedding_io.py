@@ -0,0 +1,116 @@
+import numpy as np
+
+
+# word2vec and fastText write the words as UTF-8 bytes, whatever the locale
+EMBEDDING_ENCODING = 'utf-8'
+TEXT_FLOAT_FORMAT = '%.9g'
+ROWS_PER_WRITE = 4096
+
+
+def write_word2vec_text(target_file, words, vectors, float_format=TEXT_FLOAT_FORMAT):
+    """ Save embeddings in the word2vec text format: a 'count dim' header and then one 'word v1 v2 ...' line per word
+
+        Blocks of rows are formatted with a single %-format call rather than converting each element
+        separately.
+
+        Arguments:
+            target_file: The path name of the embedding file
+            words: The list of words
+            vectors: The (number of words, vector length) embedding matrix
+            float_format: The %-format used for each element
+    """
+    vectors = np.asarray(vectors)
+    num_words, vector_length = vectors.shape
+    line_format = '%s ' + ' '.join([float_format] * vector_length)
+
+    with open(target_file, 'w', encoding=EMBEDDING_ENCODING) as embedding_file:
+        embedding_file.write('{} {}'.format(num_words, vector_length))
+        for start in range(0, num_words, ROWS_PER_WRITE):
+            end = min(start + ROWS_PER_WRITE, num_words)
+            # Interleave the words and values so that a whole block is formatted at once
+            block = np.empty((end - start, vector_length + 1), dtype=object)
+            block[:, 0] = words[start:end]
+            block[:, 1:] = vectors[start:end].tolist()
+            embedding_file.write('\n' + '\n'.join([line_format] * (end - start)) % tuple(block.ravel()))
+
+
+def write_word2vec_binary(target_file, words, vectors):
+    """ Save embeddings in the word2vec binary format: a 'count dim' header line and then, for every word,
+        the word, a space and the vector as raw little-endian float32
+
+        Arguments:
+            target_file: The path name of the embedding file
+            words: The list of words, none of which may contain spaces (the format delimits words by a space)
+            vectors: The (number of words, vector length) embedding matrix
+    """
+    for word in words:
+        if ' ' in word:
+            raise ValueError('Cannot save "{}" in the word2vec binary format since it contains a space'.format(word))
+    vectors = np.asarray(vectors, dtype='<f4')
+    with open(target_file, 'wb') as embedding_file:
+        embedding_file.write('{} {}\n'.format(vectors.shape[0], vectors.shape[1]).encode(EMBEDDING_ENCODING))
+        for word, vector in zip(words, vectors):
+            embedding_file.write(word.encode(EMBEDDING_ENCODING) + b' ' + vector.tobytes() + b'\n')
+
+
+def read_word2vec_text(embedding_file_path):
+    """ Read embeddings in the word2vec text format
+
+        The vector length is taken from the header and the values of each line are taken from its end,
+        so words which themselves contain spaces (e.g. 'G1 A' with a separate apostrophe embedding) are kept
+        intact. All values are converted to floats in a single NumPy call.
+
+        Arguments:
+            embedding_file_path: The path name of the embedding file
+
+        Returns:
+            A tuple of the list of words and the (number of words, vector length) float32 matrix
+    """
+    with open(embedding_file_path, 'r', encoding=EMBEDDING_ENCODING) as embedding_file:
+        header = embedding_file.readline().split()
+        vector_length = int(header[1])
+        words = []
+        values = []
+        for line in embedding_file:
+            line = line.rstrip()
+            if not line:
+                continue
+            split_line = line.rsplit(' ', vector_length)
+            words.append(split_line[0])
+            values.extend(split_line[1:])
+
+    vectors = np.array(values, dtype=np.float32).reshape(len(words), vector_length)
+    return words, vectors
+
+
+def read_word2vec_binary(embedding_file_path):
+    """ Read embeddings in the word2vec binary format (see write_word2vec_binary())
+
+        Arguments:
+            embedding_file_path: The path name of the embedding file
+
+        Returns:
+            A tuple of the list of words and the (number of words, vector length) float32 matrix
+    """
+    with open(embedding_file_path, 'rb') as embedding_file:
+        header = embedding_file.readline()
+        contents = embedding_file.read()
+    num_words, vector_length = [int(dim) for dim in header.split()]
+
+    words = []
+    vectors = np.empty((num_words, vector_length), dtype=np.float32)
+    position = 0
+    for row in range(num_words):
+        word_end = contents.index(b' ', position)
+        # Strip the newline which ends the previous vector
+        words.append(contents[position:word_end].lstrip(b'\n').decode(EMBEDDING_ENCODING))
+        vectors[row] = np.frombuffer(contents, dtype='<f4', count=vector_length, offset=word_end + 1)
+        position = word_end + 1 + 4 * vector_length
+    return words, vectors
+
+
+def read_embedding_file(embedding_file_path):
+    """ Read a word2vec/fastText embedding file, choosing the format from the extension (.bin is binary) """
+    if embedding_file_path.endswith('.bin'):
+        return read_word2vec_binary(embedding_file_path)
+    return read_word2vec_text(embedding_file_path)
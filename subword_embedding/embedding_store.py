@@ -0,0 +1,165 @@
+import json
+import os
+
+import numpy as np
+
+from .embedding_io import read_embedding_file
+
+
+VECTORS_SUFFIX = '.npy'
+TOKENS_SUFFIX = '.tokens.json'
+# The file name prefix of a store in the embedding directory. embedding.npy itself is kept for the pickled
+# token to vector dictionary written by --save-to-npy (see save_legacy_npy())
+STORE_NAME = 'embedding-store'
+SENTENCE_END_TOKEN = '</s>'
+
+
+class EmbeddingStore(object):
+    """ Subword embeddings held as one contiguous float matrix plus a token to row index.
+
+        On disk a store is a pair of files sharing a path prefix: <prefix>.npy holds the matrix and
+        <prefix>.tokens.json the list of tokens in row order. The matrix is memory-mapped on load, so
+        loading takes the same time whatever the size of the embedding, and lookups of many tokens are
+        served with a single fancy-indexing gather.
+    """
+    def __init__(self, tokens, vectors):
+        """ Initialise the EmbeddingStore object
+
+            Arguments:
+                tokens: The list of tokens in row order
+                vectors: The (number of tokens, vector length) embedding matrix
+        """
+        if len(tokens) != len(vectors):
+            raise ValueError('Found {} tokens but {} embedding vectors'.format(len(tokens), len(vectors)))
+        self.tokens = list(tokens)
+        self.vectors = vectors
+        self.token_to_row = {token: row for row, token in enumerate(self.tokens)}
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __contains__(self, token):
+        return token in self.token_to_row
+
+    def __getitem__(self, token):
+        return self.vectors[self.token_to_row[token]]
+
+    @property
+    def vector_length(self):
+        return self.vectors.shape[1]
+
+    @classmethod
+    def load(cls, path_prefix, mmap=True):
+        """ Load a store saved by save()
+
+            Arguments:
+                path_prefix: The path prefix of the store files
+                mmap: Boolean for whether to memory-map the matrix rather than reading it into memory
+        """
+        with open(path_prefix + TOKENS_SUFFIX, 'r') as tokens_file:
+            tokens = json.load(tokens_file)
+        vectors = np.load(path_prefix + VECTORS_SUFFIX, mmap_mode='r' if mmap else None)
+        return cls(tokens, vectors)
+
+    @classmethod
+    def from_legacy_npy(cls, npy_file_path):
+        """ Load the pickled token to vector dictionary written by save_legacy_npy()
+
+            Arguments:
+                npy_file_path: The path name of the .npy file
+        """
+        embedding_dict = np.load(npy_file_path, allow_pickle=True).item()
+        tokens = list(embedding_dict)
+        vectors = np.array([embedding_dict[token] for token in tokens], dtype=np.float32)
+        return cls(tokens, vectors.reshape(len(tokens), -1))
+
+    @classmethod
+    def from_embedding_file(cls, embedding_file_path, drop_sentence_end=True):
+        """ Build a store from the word2vec/fastText output (embedding.txt, or embedding.bin in binary)
+
+            Arguments:
+                embedding_file_path: The path name of the embedding file
+                drop_sentence_end: Boolean for whether to drop the </s> entry the trainers emit
+        """
+        tokens, vectors = read_embedding_file(embedding_file_path)
+        if drop_sentence_end and SENTENCE_END_TOKEN in tokens:
+            keep = np.array([token != SENTENCE_END_TOKEN for token in tokens])
+            tokens = [token for token in tokens if token != SENTENCE_END_TOKEN]
+            vectors = vectors[keep]
+        return cls(tokens, vectors)
+
+    def save(self, path_prefix):
+        """ Save the store as <path_prefix>.npy and <path_prefix>.tokens.json
+
+            Arguments:
+                path_prefix: The path prefix of the store files
+        """
+        target_dir = os.path.dirname(path_prefix)
+        if target_dir and not os.path.exists(target_dir):
+            os.makedirs(target_dir)
+        np.save(path_prefix + VECTORS_SUFFIX, np.ascontiguousarray(self.vectors, dtype=np.float32))
+        with open(path_prefix + TOKENS_SUFFIX, 'w') as tokens_file:
+            json.dump(self.tokens, tokens_file)
+
+    def save_legacy_npy(self, npy_file_path):
+        """ Save the embedding as a pickled dictionary of token to float64 vector, the embedding.npy format of
+            --save-to-npy which is read back with np.load(npy_file_path, allow_pickle=True).item()
+
+            Arguments:
+                npy_file_path: The path name of the .npy file
+        """
+        np.save(npy_file_path, {
+            token: np.array(self.vectors[row], dtype=np.float64) for row, token in enumerate(self.tokens)
+        })
+
+    def rows(self, tokens, missing_row=-1):
+        """ Map tokens to row indices
+
+            Arguments:
+                tokens: An iterable of tokens
+                missing_row: The row given to unknown tokens, or None to raise a KeyError for them
+        """
+        if missing_row is None:
+            return np.array([self.token_to_row[token] for token in tokens], dtype=np.int64)
+        return np.array([self.token_to_row.get(token, missing_row) for token in tokens], dtype=np.int64)
+
+    def lookup(self, tokens, missing='raise'):
+        """ Look up the embeddings of many tokens at once
+
+            Arguments:
+                tokens: An iterable of tokens
+                missing: What to do with unknown tokens: 'raise' a KeyError or return a 'zero' vector
+
+            Returns:
+                A (number of tokens, vector length) array
+        """
+        if missing == 'raise':
+            return self.vectors[self.rows(tokens, missing_row=None)]
+        elif missing == 'zero':
+            rows = self.rows(tokens)
+            vectors = np.zeros((len(rows), self.vector_length), dtype=self.vectors.dtype)
+            known = rows >= 0
+            vectors[known] = self.vectors[rows[known]]
+            return vectors
+        else:
+            raise ValueError('Unknown missing token option: {}'.format(missing))
+
+    def as_dict(self):
+        """ A dictionary mapping each token to its embedding vector """
+        return {token: np.array(self.vectors[row]) for row, token in enumerate(self.tokens)}
+
+
+def load_embedding_store(embedding_path):
+    """ Load an EmbeddingStore or QuantizedEmbeddingStore from its path prefix, or convert it from a
+        word2vec/fastText embedding file or the legacy embedding.npy dictionary
+    """
+    if embedding_path.endswith(VECTORS_SUFFIX):
+        embedding_path = embedding_path[:-len(VECTORS_SUFFIX)]
+    if os.path.exists(embedding_path + VECTORS_SUFFIX):
+        if os.path.exists(embedding_path + TOKENS_SUFFIX):
+            return EmbeddingStore.load(embedding_path)
+        return EmbeddingStore.from_legacy_npy(embedding_path + VECTORS_SUFFIX)
+    from .quantization import QuantizedEmbeddingStore, QUANTIZED_INFO_SUFFIX
+    if os.path.exists(embedding_path + QUANTIZED_INFO_SUFFIX):
+        return QuantizedEmbeddingStore.load(embedding_path)
+    return EmbeddingStore.from_embedding_file(embedding_path)
@@ -0,0 +1,181 @@
+from collections import Counter
+import json
+import os
+
+from .corpus_statistics import save_subword_counts
+from .subword_corpus import MLF_ENCODING, MLFDataset
+
+
+class CorpusManifest(object):
+    """ A record of what a text corpus already contains, so that new MLF data can be appended to it.
+
+        The manifest stores the corpus options (which must not change between updates), the size and
+        modification time of every MLF file added so far, the label names of all utterances in the corpus,
+        the number of sentences and bytes in the corpus, and the subword unit counts of the corpus.
+    """
+    def __init__(self, options, mlf_files=None, label_names=None, num_sentences=0, corpus_bytes=0,
+                 subword_counts=None):
+        """ Initialise the CorpusManifest object
+
+            Arguments:
+                options: A dictionary of the options the corpus was built with
+                mlf_files: A dictionary mapping MLF paths to their recorded size and modification time
+                label_names: The label names of the utterances in the corpus
+                num_sentences: The number of sentences in the corpus
+                corpus_bytes: The size of the corpus file when the manifest was saved
+                subword_counts: A dictionary mapping each subword unit to its count in the corpus, or None for
+                                manifests saved before the counts were recorded
+        """
+        self.options = options
+        self.mlf_files = mlf_files if mlf_files is not None else {}
+        self.label_names = set(label_names) if label_names is not None else set()
+        self.num_sentences = num_sentences
+        self.corpus_bytes = corpus_bytes
+        self.subword_counts = Counter(subword_counts) if subword_counts is not None else None
+
+    @classmethod
+    def load(cls, manifest_path):
+        with open(manifest_path, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+        return cls(
+            manifest['options'], manifest['mlf_files'], manifest['label_names'],
+            manifest['num_sentences'], manifest['corpus_bytes'], manifest.get('subword_counts')
+        )
+
+    def save(self, manifest_path):
+        """ Save the manifest, replacing the previous one atomically """
+        manifest = {
+            'options': self.options,
+            'mlf_files': self.mlf_files,
+            'label_names': sorted(self.label_names),
+            'num_sentences': self.num_sentences,
+            'corpus_bytes': self.corpus_bytes,
+            'subword_counts': dict(self.subword_counts) if self.subword_counts is not None else None,
+        }
+        temp_path = manifest_path + '.tmp'
+        with open(temp_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temp_path, manifest_path)
+
+    @staticmethod
+    def file_signature(path_to_mlf):
+        file_stat = os.stat(path_to_mlf)
+        return {'size': file_stat.st_size, 'mtime': file_stat.st_mtime}
+
+    def contains_file(self, path_to_mlf):
+        """ Whether the MLF file has already been added and has not changed since """
+        recorded = self.mlf_files.get(os.path.abspath(path_to_mlf))
+        return recorded is not None and recorded == self.file_signature(path_to_mlf)
+
+    def record_file(self, path_to_mlf):
+        self.mlf_files[os.path.abspath(path_to_mlf)] = self.file_signature(path_to_mlf)
+
+
+def update_corpus(path_to_mlf, corpus_path, unique_subwords_path, manifest_path, subword_context_width,
+                  incl_posn_info, separate_apostrophe_embedding, normaliser=None, subword_counts_path=None):
+    """ Add the utterances of an MLF file which are not yet in the corpus, rather than rebuilding it.
+
+        Without a manifest the corpus and unique subword list are built from scratch. Otherwise only
+        utterances whose label names are not in the manifest are parsed; they are appended to the corpus and
+        their subwords merged into the saved unique subword list. An MLF file that is unchanged since it
+        was added is skipped without being read. If a previous update was interrupted, the corpus is first
+        truncated back to the size recorded in the manifest.
+
+        As in a full build, every utterance of the MLF file is added, even if its label name repeats within
+        the file; only the label names already in the corpus are skipped. The subword unit counts are kept in
+        the manifest, which is saved last, so that the counts file written from them always matches the corpus.
+
+        Arguments:
+            path_to_mlf: The path to the MLF file as a string
+            corpus_path: The path name of the text corpus
+            unique_subwords_path: The path name of the unique subword list
+            manifest_path: The path name of the corpus manifest
+            subword_context_width: Integer indicator of whether to use monophones, biphones, triphones, etc
+            incl_posn_info: Boolean indicator for whether the position information should be included.
+            separate_apostrophe_embedding: boolean indicator of whether the apostrophe should be viewed
+                                           a distinct subword unit or included within the pronunciation
+            normaliser: An optional LabelNormaliser
+            subword_counts_path: An optional path name to save the subword unit counts of the whole corpus to
+
+        Returns:
+            The number of sentences appended to the corpus
+    """
+    options = {
+        'subword_context_width': subword_context_width,
+        'incl_posn_info': incl_posn_info,
+        'separate_apostrophe_embedding': separate_apostrophe_embedding,
+    }
+
+    if os.path.exists(manifest_path):
+        manifest = CorpusManifest.load(manifest_path)
+        if manifest.options != options:
+            raise ValueError(
+                'The corpus was built with {} but {} was requested. Rebuild the corpus without the '
+                'incremental option.'.format(manifest.options, options)
+            )
+        if not os.path.exists(corpus_path) or os.path.getsize(corpus_path) < manifest.corpus_bytes:
+            raise ValueError('The corpus {} does not match its manifest {}'.format(corpus_path, manifest_path))
+        if manifest.contains_file(path_to_mlf):
+            print('{} is already in the corpus'.format(path_to_mlf))
+            write_subword_counts(manifest, subword_counts_path)
+            return 0
+        with open(unique_subwords_path, 'r') as subword_file:
+            subwords = set(json.load(subword_file))
+        # Drop anything written by an interrupted update which the manifest does not account for
+        with open(corpus_path, 'a', encoding=MLF_ENCODING) as corpus_file:
+            corpus_file.truncate(manifest.corpus_bytes)
+    else:
+        manifest = CorpusManifest(options, subword_counts={})
+        subwords = set()
+        open(corpus_path, 'w').close()
+
+    subword_dataset = MLFDataset(
+        path_to_mlf=path_to_mlf,
+        subword_context_width=subword_context_width,
+        incl_posn_info=incl_posn_info,
+        separate_apostrophe_embedding=separate_apostrophe_embedding,
+        streaming=True,
+        normaliser=normaliser
+    )
+
+    num_appended = 0
+    # Only the utterances already in the corpus are skipped, not those repeated within this MLF file
+    skip_label_names = frozenset(manifest.label_names)
+    with open(corpus_path, 'a', encoding=MLF_ENCODING) as corpus_file:
+        for sentence_labels in subword_dataset.iter_sentences(skip_label_names=skip_label_names):
+            if manifest.num_sentences > 0:
+                corpus_file.write('\n')
+            corpus_file.write(sentence_labels.sentence())
+            subwords.update(sentence_labels.get_unique_tokens())
+            if manifest.subword_counts is not None:
+                manifest.subword_counts.update(arc.token for arc in sentence_labels.arc_list)
+            manifest.label_names.add(sentence_labels.label_name)
+            manifest.num_sentences += 1
+            num_appended += 1
+
+    with open(unique_subwords_path, 'w') as subword_file:
+        json.dump(list(subwords), subword_file)
+    manifest.corpus_bytes = os.path.getsize(corpus_path)
+    manifest.record_file(path_to_mlf)
+    manifest.save(manifest_path)
+    write_subword_counts(manifest, subword_counts_path)
+    return num_appended
+
+def write_subword_counts(manifest, subword_counts_path):
+    """ Save the subword unit counts recorded in the manifest, or remove the counts file if the manifest has none
+
+        Arguments:
+            manifest: The CorpusManifest of the corpus
+            subword_counts_path: The path name of the counts file, or None not to save the counts
+    """
+    if subword_counts_path is None:
+        return
+    if manifest.subword_counts is None:
+        # The counts of a corpus started before they were recorded are unknown, so none are better than stale ones
+        if os.path.exists(subword_counts_path):
+            os.remove(subword_counts_path)
+        print('The manifest does not record the subword counts, so {} was removed. Rebuild the corpus without '
+              'the incremental option to count them.'.format(subword_counts_path))
+        return
+    tokens = sorted(manifest.subword_counts)
+    save_subword_counts(subword_counts_path, tokens, [manifest.subword_counts[token] for token in tokens])
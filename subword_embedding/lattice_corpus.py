@@ -0,0 +1,416 @@
+import gzip
+import heapq
+import json
+from multiprocessing import Pool
+import os
+import zlib
+
+import numpy as np
+
+from .subword_corpus import DEFAULT_NORMALISER, worker_normaliser
+
+
+LATTICE_ENCODING = 'utf-8'
+LATTICE_EXTENSIONS = ('.lat', '.lat.gz', '.slf', '.slf.gz')
+# Word labels which mark the lattice boundaries or null arcs rather than subword units
+NULL_LABELS = frozenset(['!NULL', '<s>', '</s>', '!SENT_START', '!SENT_END'])
+PATH_MODES = ('sample', 'nbest')
+DEFAULT_NUM_PATHS = 5
+SAMPLE_SEED = 1
+LATTICES_PER_WORKER = 8
+
+
+def open_lattice(lattice_path):
+    """ Open an HTK lattice file as text, decompressing it on the fly if it is gzipped """
+    if lattice_path.endswith('.gz'):
+        return gzip.open(lattice_path, 'rt', encoding=LATTICE_ENCODING)
+    return open(lattice_path, 'r', encoding=LATTICE_ENCODING)
+
+def parse_slf_fields(line):
+    """ Split an SLF line of space separated 'name=value' fields into a dictionary """
+    fields = {}
+    for field in line.split():
+        name, _, value = field.partition('=')
+        fields[name] = value
+    return fields
+
+def alignment_labels(alignment):
+    """ The subword labels of an SLF arc alignment field ('d=:label,duration[,score]:label,duration:...') """
+    return [segment.split(',')[0] for segment in alignment.split(':') if segment]
+
+def iter_lattice_files(lattice_source):
+    """ Generator over the lattice files to read
+
+        Arguments:
+            lattice_source: A directory which is searched for lattices (see LATTICE_EXTENSIONS), a file
+                            listing one lattice path per line, or a list of lattice paths
+    """
+    if isinstance(lattice_source, (list, tuple)):
+        for lattice_path in lattice_source:
+            yield lattice_path
+    elif os.path.isdir(lattice_source):
+        for dir_path, dir_names, file_names in os.walk(lattice_source):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                if file_name.endswith(LATTICE_EXTENSIONS):
+                    yield os.path.join(dir_path, file_name)
+    else:
+        with open(lattice_source, 'r') as list_file:
+            for line in list_file:
+                if line.strip():
+                    yield line.strip()
+
+
+class Lattice(object):
+    """ An HTK standard lattice (SLF) held as arrays of arc start nodes, end nodes and log scores.
+
+        The subword units of an arc are taken from its alignment field (d=) if there is one, and otherwise
+        from the arc or end node word label. Each raw label is normalised in the same way as the arcs of an
+        MLF (see subword_corpus.strip_subword()), so that lattice and MLF corpora share their subword units.
+    """
+    __slots__ = ('name', 'num_nodes', 'start_node', 'end_node', 'arc_starts', 'arc_ends', 'arc_scores', 'arc_tokens')
+
+    def __init__(self, lattice_path, subword_context_width, incl_posn_info, separate_apostrophe_embedding,
+                 normaliser=None):
+        """ Initialise the Lattice object by reading an SLF file
+
+            Arguments:
+                lattice_path: The path to the (optionally gzipped) SLF file
+                subword_context_width: The subword unit context width as an integer
+                incl_posn_info: Boolean indicator for whether the position information should be included.
+                separate_apostrophe_embedding: boolean indicator of whether the apostrophe should be viewed
+                                               a distinct subword unit or included within the pronunciation
+                normaliser: The LabelNormaliser used to memoize the subword label normalisation
+        """
+        normaliser = normaliser if normaliser is not None else DEFAULT_NORMALISER
+        header = {}
+        node_words = {}
+        arc_starts, arc_ends, arc_scores, arc_labels = [], [], [], []
+        with open_lattice(lattice_path) as lattice_file:
+            for line in lattice_file:
+                if line.startswith('#') or not line.strip():
+                    continue
+                fields = parse_slf_fields(line)
+                if 'J' in fields:
+                    arc_starts.append(int(fields['S']))
+                    arc_ends.append(int(fields['E']))
+                    arc_scores.append((float(fields.get('a', 0.0)), float(fields.get('l', 0.0))))
+                    if 'd' in fields:
+                        arc_labels.append(alignment_labels(fields['d']))
+                    else:
+                        arc_labels.append(fields.get('W'))
+                elif 'I' in fields:
+                    if 'W' in fields:
+                        node_words[int(fields['I'])] = fields['W']
+                else:
+                    header.update(fields)
+
+        self.name = header.get('UTTERANCE', os.path.basename(lattice_path))
+        self.num_nodes = int(header['N']) if 'N' in header else max(arc_starts + arc_ends) + 1
+        self.arc_starts = np.array(arc_starts, dtype=np.int64)
+        self.arc_ends = np.array(arc_ends, dtype=np.int64)
+
+        scores = np.array(arc_scores, dtype=np.float64).reshape(-1, 2)
+        self.arc_scores = (
+            float(header.get('acscale', 1.0)) * scores[:, 0] + float(header.get('lmscale', 1.0)) * scores[:, 1] +
+            float(header.get('wdpenalty', 0.0))
+        )
+
+        self.arc_tokens = []
+        for arc_end, labels in zip(arc_ends, arc_labels):
+            if labels is None:
+                labels = node_words.get(arc_end)
+            if labels is None or isinstance(labels, str):
+                labels = [] if labels is None or labels in NULL_LABELS else [labels]
+            self.arc_tokens.append([
+                normaliser.normalise(label, subword_context_width, incl_posn_info, separate_apostrophe_embedding)
+                for label in labels if label not in NULL_LABELS
+            ])
+
+        has_incoming = np.zeros(self.num_nodes, dtype=bool)
+        has_incoming[self.arc_ends] = True
+        has_outgoing = np.zeros(self.num_nodes, dtype=bool)
+        has_outgoing[self.arc_starts] = True
+        self.start_node = int(header['start']) if 'start' in header else int(np.flatnonzero(~has_incoming)[0])
+        self.end_node = int(header['end']) if 'end' in header else int(np.flatnonzero(~has_outgoing)[0])
+
+    def topological_order(self):
+        """ The nodes ordered so that every arc goes from an earlier node to a later one """
+        in_degree = np.bincount(self.arc_ends, minlength=self.num_nodes)
+        outgoing = self.outgoing_arcs()
+        order = []
+        ready = [node for node in range(self.num_nodes) if in_degree[node] == 0]
+        while ready:
+            node = ready.pop()
+            order.append(node)
+            for arc in outgoing[node]:
+                end = self.arc_ends[arc]
+                in_degree[end] -= 1
+                if in_degree[end] == 0:
+                    ready.append(end)
+        if len(order) != self.num_nodes:
+            raise ValueError('The lattice {} contains a cycle'.format(self.name))
+        return order
+
+    def outgoing_arcs(self):
+        """ For every node, the array of arcs leaving it """
+        arc_order = np.argsort(self.arc_starts, kind='mergesort')
+        boundaries = np.searchsorted(self.arc_starts[arc_order], np.arange(self.num_nodes + 1))
+        return [arc_order[boundaries[node]:boundaries[node + 1]] for node in range(self.num_nodes)]
+
+    def backward_scores(self, order):
+        """ The log sum of the scores of all paths from every node to the end node
+
+            Arguments:
+                order: The topological order of the nodes
+        """
+        outgoing = self.outgoing_arcs()
+        beta = np.full(self.num_nodes, -np.inf)
+        beta[self.end_node] = 0.0
+        for node in reversed(order):
+            arcs = outgoing[node]
+            if len(arcs) and node != self.end_node:
+                beta[node] = np.logaddexp.reduce(self.arc_scores[arcs] + beta[self.arc_ends[arcs]])
+        return beta
+
+    def sample_paths(self, num_paths, rng):
+        """ Sample paths through the lattice according to their posterior probabilities
+
+            Starting from the start node, each step takes an outgoing arc with its probability given the
+            node, exp(score + beta(arc end) - beta(node)), which samples whole paths by their posteriors.
+
+            Arguments:
+                num_paths: The number of paths to sample
+                rng: A NumPy RandomState
+
+            Returns:
+                A list of paths, each a list of arc indices
+        """
+        order = self.topological_order()
+        beta = self.backward_scores(order)
+        if not np.isfinite(beta[self.start_node]):
+            return []
+        outgoing = self.outgoing_arcs()
+        transition = self.arc_scores + beta[self.arc_ends] - beta[self.arc_starts]
+        # The cumulative transition probabilities out of each node, computed once for all samples
+        cumulative = {}
+
+        paths = []
+        for _ in range(num_paths):
+            node = self.start_node
+            path = []
+            while node != self.end_node:
+                if node not in cumulative:
+                    cumulative[node] = np.cumsum(np.exp(transition[outgoing[node]]))
+                choice = np.searchsorted(cumulative[node], rng.random_sample() * cumulative[node][-1], side='right')
+                arc = outgoing[node][min(choice, len(outgoing[node]) - 1)]
+                path.append(int(arc))
+                node = int(self.arc_ends[arc])
+            paths.append(path)
+        return paths
+
+    def nbest_paths(self, num_paths):
+        """ Find the highest scoring paths through the lattice
+
+            Every node keeps its num_paths best partial paths (score, arc, rank of the partial path at the
+            arc start), which are extended along the outgoing arcs in topological order.
+
+            Arguments:
+                num_paths: The maximum number of paths to return
+
+            Returns:
+                A list of paths, each a list of arc indices, best first
+        """
+        order = self.topological_order()
+        incoming = [[] for _ in range(self.num_nodes)]
+        for arc, end in enumerate(self.arc_ends.tolist()):
+            incoming[end].append(arc)
+        arc_starts = self.arc_starts.tolist()
+        arc_scores = self.arc_scores.tolist()
+
+        best = [[] for _ in range(self.num_nodes)]
+        best[self.start_node] = [(0.0, None, None)]
+        for node in order:
+            if node == self.start_node:
+                continue
+            candidates = (
+                (score + arc_scores[arc], arc, rank)
+                for arc in incoming[node]
+                for rank, (score, _, _) in enumerate(best[arc_starts[arc]])
+            )
+            best[node] = heapq.nlargest(num_paths, candidates, key=lambda candidate: candidate[0])
+
+        paths = []
+        for rank in range(len(best[self.end_node])):
+            path = []
+            node = self.end_node
+            while node != self.start_node:
+                _, arc, rank = best[node][rank]
+                path.append(arc)
+                node = arc_starts[arc]
+            paths.append(path[::-1])
+        return paths
+
+    def path_sentence(self, path):
+        """ The corpus sentence of a path: the subword units of its arcs separated by spaces """
+        return ' '.join(token for arc in path for token in self.arc_tokens[arc])
+
+
+def lattice_path_sentences(lattice_info, normaliser):
+    """ Read one lattice and generate the corpus sentences of its paths
+
+        Arguments:
+            lattice_info: A tuple of (lattice_path, subword_context_width, incl_posn_info,
+                          separate_apostrophe_embedding, path_mode, num_paths, seed)
+            normaliser: The LabelNormaliser used to memoize the subword label normalisation
+
+        Returns:
+            A tuple of the list of sentences and the set of unique subwords of the lattice
+    """
+    (lattice_path, subword_context_width, incl_posn_info, separate_apostrophe_embedding,
+     path_mode, num_paths, seed) = lattice_info
+
+    lattice = Lattice(lattice_path, subword_context_width, incl_posn_info, separate_apostrophe_embedding, normaliser)
+    if path_mode == 'sample':
+        # Seed from the lattice path so the samples do not depend on how the lattices are split between workers
+        rng = np.random.RandomState((seed + zlib.crc32(lattice_path.encode(LATTICE_ENCODING))) % 2 ** 32)
+        paths = lattice.sample_paths(num_paths, rng)
+    else:
+        paths = lattice.nbest_paths(num_paths)
+
+    sentences = [lattice.path_sentence(path) for path in paths]
+    subwords = set(token for arc_tokens in lattice.arc_tokens for token in arc_tokens)
+    return sentences, subwords
+
+
+def read_lattice_worker(worker_info):
+    """ The process pool worker used by LatticeDataset (see lattice_path_sentences())
+
+        Arguments:
+            worker_info: A tuple of the lattice_info of lattice_path_sentences() and the normalisation cache size
+
+        Returns:
+            A tuple of the list of sentences, the set of unique subwords and the (hits, misses, evictions) of
+            the worker's label normalisation cache while reading the lattice
+    """
+    lattice_info, norm_cache_size = worker_info
+    normaliser = worker_normaliser(norm_cache_size)
+    initial_stats = (normaliser.hits, normaliser.misses, normaliser.evictions)
+    sentences, subwords = lattice_path_sentences(lattice_info, normaliser)
+    cache_stats = (
+        normaliser.hits - initial_stats[0], normaliser.misses - initial_stats[1],
+        normaliser.evictions - initial_stats[2]
+    )
+    return sentences, subwords, cache_stats
+
+
+class LatticeDataset(object):
+    """ A corpus of subword sequences drawn from the paths of HTK lattices.
+
+        Lattices are read one file at a time and only the sentences of a bounded batch of lattices are held in
+        memory, so the corpus can be built from lattice sets far larger than the memory. With several workers,
+        batches of lattices are read in a process pool and written in their original order.
+    """
+    def __init__(self, lattice_source, subword_context_width, incl_posn_info, separate_apostrophe_embedding,
+                 path_mode='sample', num_paths=DEFAULT_NUM_PATHS, workers=1, seed=SAMPLE_SEED, normaliser=None):
+        """ Initialises the LatticeDataset object
+
+            Arguments:
+                lattice_source: A directory of lattices, a file listing one lattice path per line or a list of
+                                lattice paths (see iter_lattice_files())
+                subword_context_width: Integer indicator of whether to use monophones, biphones, triphones, etc
+                incl_posn_info: Boolean indicator for whether the position information should be included.
+                separate_apostrophe_embedding: boolean indicator of whether the apostrophe should be viewed
+                                               a distinct subword unit or included within the pronunciation
+                path_mode: 'sample' to sample paths by their posterior probabilities or 'nbest' for the
+                           highest scoring paths
+                num_paths: The number of paths taken from each lattice
+                workers: The number of processes used to read the lattices
+                seed: The seed of the path sampling
+                normaliser: The LabelNormaliser used to memoize the subword label normalisation when reading
+                            the lattices in this process (workers use their own and report their statistics to it)
+        """
+        if path_mode not in PATH_MODES:
+            raise ValueError('The path mode should be one of {}, but found {}'.format(PATH_MODES, path_mode))
+        self.lattice_source = lattice_source
+        self.subword_context_width = subword_context_width
+        self.incl_posn_info = incl_posn_info
+        self.separate_apostrophe_embedding = separate_apostrophe_embedding
+        self.path_mode = path_mode
+        self.num_paths = num_paths
+        self.workers = workers
+        self.seed = seed
+        self.normaliser = normaliser if normaliser is not None else DEFAULT_NORMALISER
+        # Populated as the corpus is written
+        self.subwords = set()
+        self.num_sentences = 0
+        self.num_tokens = 0
+
+    def lattice_info(self, lattice_path):
+        return (
+            lattice_path, self.subword_context_width, self.incl_posn_info, self.separate_apostrophe_embedding,
+            self.path_mode, self.num_paths, self.seed
+        )
+
+    def iter_lattice_batches(self, batch_size):
+        """ Generator over lists of at most batch_size lattice worker tasks """
+        batch = []
+        for lattice_path in iter_lattice_files(self.lattice_source):
+            batch.append(self.lattice_info(lattice_path))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def iter_lattice_results(self):
+        """ Generator over the (sentences, subwords, cache statistics) of every lattice, in order """
+        if self.workers <= 1:
+            for lattice_path in iter_lattice_files(self.lattice_source):
+                # The normaliser is used directly, so it already holds the statistics
+                sentences, subwords = lattice_path_sentences(self.lattice_info(lattice_path), self.normaliser)
+                yield sentences, subwords, (0, 0, 0)
+            return
+
+        with Pool(processes=self.workers) as pool:
+            # Only one batch of lattices is in flight at a time, which bounds the memory held by the results
+            for batch in self.iter_lattice_batches(self.workers * LATTICES_PER_WORKER):
+                worker_info = [(lattice_info, self.normaliser.max_size) for lattice_info in batch]
+                for result in pool.imap(read_lattice_worker, worker_info):
+                    yield result
+
+    def iter_sentence_batches(self):
+        """ Generator over the non-empty path sentences and the unique subwords of every lattice, as consumed
+            by pipeline.CorpusPipeline, which collects the unique subword set
+        """
+        self.num_sentences = 0
+        self.num_tokens = 0
+        for sentences, subwords, cache_stats in self.iter_lattice_results():
+            self.normaliser.add_stats(*cache_stats)
+            sentences = [sentence for sentence in sentences if sentence]
+            self.num_sentences += len(sentences)
+            self.num_tokens += sum(sentence.count(' ') + 1 for sentence in sentences)
+            yield sentences, subwords
+
+    def iter_sentences(self):
+        """ Generator over the sentences of the lattice paths, updating the unique subword set """
+        for sentences, subwords in self.iter_sentence_batches():
+            self.subwords.update(subwords)
+            for sentence in sentences:
+                yield sentence
+
+    def write_corpus(self, target_file):
+        """ Write the text corpus to file one sentence at a time
+
+            Arguments:
+                target_file: The path name of the corpus file to write
+        """
+        with open(target_file, 'w', encoding=LATTICE_ENCODING) as corpus_file:
+            for i, sentence in enumerate(self.iter_sentences()):
+                if i > 0:
+                    corpus_file.write('\n')
+                corpus_file.write(sentence)
+
+    def save_unique_subwords(self, target_file):
+        with open(target_file, 'w') as subword_file:
+            json.dump(list(self.subwords), subword_file)
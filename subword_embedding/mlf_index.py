@@ -0,0 +1,198 @@
+import mmap
+import os
+
+import numpy as np
+
+from .subword_corpus import MLF_ENCODING, SentenceLabels
+
+
+INDEX_SUFFIX = '.index.npz'
+
+
+def default_index_path(path_to_mlf):
+    return path_to_mlf + INDEX_SUFFIX
+
+
+def mlf_signature(path_to_mlf):
+    """ The size and modification time of an MLF file, used to detect a stale index """
+    file_stat = os.stat(path_to_mlf)
+    return np.array([file_stat.st_size, file_stat.st_mtime_ns], dtype=np.int64)
+
+
+def scan_mlf(path_to_mlf):
+    """ Find the label name and byte range of every utterance in an MLF file in one pass
+
+        An utterance spans the lines between two '.' lines (including any comment lines), as in
+        iter_mlf_utterances(). Utterances without a label name (e.g. a trailing empty chunk) are left out.
+
+        Arguments:
+            path_to_mlf: The path to the MLF file as a string
+
+        Returns:
+            A tuple of the list of label names, and the byte offsets and lengths of the utterances
+    """
+    label_names = []
+    offsets = []
+    lengths = []
+    with open(path_to_mlf, 'rb') as mlf_file:
+        start = 0
+        label_name = None
+        position = 0
+        for line in iter(mlf_file.readline, b''):
+            stripped_line = line.rstrip(b'\r\n')
+            if stripped_line == b'.':
+                if label_name is not None:
+                    label_names.append(label_name)
+                    offsets.append(start)
+                    lengths.append(position - start)
+                start = position + len(line)
+                label_name = None
+            elif label_name is None and stripped_line and not stripped_line.startswith(b'#'):
+                label_name = stripped_line.decode(MLF_ENCODING)
+            position += len(line)
+        if label_name is not None:
+            label_names.append(label_name)
+            offsets.append(start)
+            lengths.append(position - start)
+    return label_names, offsets, lengths
+
+
+def build_mlf_index(path_to_mlf, index_path=None):
+    """ Scan an MLF file and save the label name, byte offset and length of each utterance to a sidecar file
+
+        The label names are stored as a single UTF-8 byte array so that the index stays compact.
+
+        Arguments:
+            path_to_mlf: The path to the MLF file as a string
+            index_path: The path name of the index (defaults to the MLF path with .index.npz appended)
+
+        Returns:
+            The path name of the index
+    """
+    index_path = index_path or default_index_path(path_to_mlf)
+    signature = mlf_signature(path_to_mlf)
+    label_names, offsets, lengths = scan_mlf(path_to_mlf)
+
+    encoded_names = [label_name.encode(MLF_ENCODING) for label_name in label_names]
+    name_offsets = np.zeros(len(encoded_names) + 1, dtype=np.int64)
+    np.cumsum([len(encoded_name) for encoded_name in encoded_names], out=name_offsets[1:])
+    # Write to a temporary file first, so that an interrupted build never leaves a truncated index behind
+    temp_path = index_path + '.tmp.npz'
+    np.savez(
+        temp_path,
+        names=np.frombuffer(b''.join(encoded_names), dtype=np.uint8),
+        name_offsets=name_offsets,
+        offsets=np.array(offsets, dtype=np.int64),
+        lengths=np.array(lengths, dtype=np.int64),
+        signature=signature
+    )
+    os.replace(temp_path, index_path)
+    print('Indexed {} utterances of {} in {}'.format(len(label_names), path_to_mlf, index_path))
+    return index_path
+
+
+class MLFIndex(object):
+    """ Random access to the utterances of an MLF file by label name.
+
+        The MLF file is memory-mapped, and the label names of the index are held in a dictionary mapping
+        them to their byte ranges, so that looking up an utterance only parses that utterance.
+    """
+    def __init__(self, path_to_mlf, subword_context_width, incl_posn_info, separate_apostrophe_embedding,
+                 index_path=None, normaliser=None):
+        """ Initialise the MLFIndex object, building the index if it is missing or older than the MLF file
+
+            Arguments:
+                path_to_mlf: The path to the MLF file as a string
+                subword_context_width: The subword unit context width as an integer
+                incl_posn_info: Boolean indicator for whether the position information should be included.
+                separate_apostrophe_embedding: boolean indicator of whether the apostrophe should be viewed
+                                               a distinct subword unit or included within the pronunciation
+                index_path: The path name of the index (defaults to the MLF path with .index.npz appended)
+                normaliser: An optional LabelNormaliser used to memoize the subword label normalisation
+        """
+        self.path_to_mlf = path_to_mlf
+        self.subword_context_width = subword_context_width
+        self.incl_posn_info = incl_posn_info
+        self.separate_apostrophe_embedding = separate_apostrophe_embedding
+        self.normaliser = normaliser
+        self.index_path = index_path or default_index_path(path_to_mlf)
+
+        if not self.is_current(path_to_mlf, self.index_path):
+            build_mlf_index(path_to_mlf, self.index_path)
+        with np.load(self.index_path) as index:
+            names = index['names'].tobytes()
+            name_offsets = index['name_offsets']
+            self.offsets = index['offsets']
+            self.lengths = index['lengths']
+        self.row_ids = {
+            names[start:end].decode(MLF_ENCODING): row_id
+            for row_id, (start, end) in enumerate(zip(name_offsets[:-1].tolist(), name_offsets[1:].tolist()))
+        }
+
+        self.mlf_file = open(path_to_mlf, 'rb')
+        # An empty file cannot be memory-mapped, but then it has no utterances to look up either
+        self.mlf_map = mmap.mmap(self.mlf_file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets.size else None
+
+    @staticmethod
+    def is_current(path_to_mlf, index_path):
+        """ Whether the index exists and was built from the MLF file as it is now """
+        if not os.path.exists(index_path):
+            return False
+        with np.load(index_path) as index:
+            return np.array_equal(index['signature'], mlf_signature(path_to_mlf))
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    def __contains__(self, label_name):
+        return label_name in self.row_ids
+
+    def __getitem__(self, label_name):
+        return self.sentence_labels(label_name)
+
+    def label_names(self):
+        """ The label names of the indexed utterances in the order they appear in the MLF file """
+        return sorted(self.row_ids, key=self.row_ids.get)
+
+    def raw_utterance(self, label_name):
+        """ The raw form of an utterance as a string, as produced by iter_mlf_utterances()
+
+            Arguments:
+                label_name: The label name of the utterance, as in the MLF (e.g. '"*/utt000000.lab"')
+        """
+        row_id = self.row_ids[label_name]
+        start = int(self.offsets[row_id])
+        string_mlf = self.mlf_map[start:start + int(self.lengths[row_id])].decode(MLF_ENCODING)
+        string_mlf = string_mlf.replace('\r\n', '\n')
+        return string_mlf[:-1] if string_mlf.endswith('\n') else string_mlf
+
+    def sentence_labels(self, label_name):
+        """ Parse the utterance with the given label name
+
+            Arguments:
+                label_name: The label name of the utterance, as in the MLF (e.g. '"*/utt000000.lab"')
+
+            Returns:
+                The SentenceLabels of the utterance
+        """
+        return SentenceLabels(
+            self.raw_utterance(label_name), self.subword_context_width, self.incl_posn_info,
+            self.separate_apostrophe_embedding, self.normaliser
+        )
+
+    def iter_sentence_labels(self, label_names):
+        """ Generator over the SentenceLabels of many utterances, read in file order to make the most of read-ahead
+
+            Arguments:
+                label_names: An iterable over the label names to look up
+
+            Returns:
+                Tuples of the label name and its SentenceLabels, in the order of the utterances in the MLF file
+        """
+        for label_name in sorted(set(label_names), key=self.row_ids.__getitem__):
+            yield label_name, self.sentence_labels(label_name)
+
+    def close(self):
+        if self.mlf_map is not None:
+            self.mlf_map.close()
+        self.mlf_file.close()
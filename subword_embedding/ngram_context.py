@@ -0,0 +1,135 @@
+import numpy as np
+
+
+CONTEXT_DIRECTIONS = ('left', 'right', 'both')
+# The units of an n-gram are rendered as in the HTK context labels (see subword_corpus.strip_subword()): run
+# together while they carry position information, and separated by spaces once it is removed
+POSITION_CONTEXT_SEPARATOR = ''
+PLAIN_CONTEXT_SEPARATOR = ' '
+MISSING_CONTEXT_ID = -1
+
+
+def context_extent(subword_context_width, direction='both'):
+    """ The number of units of left and right context in a subword n-gram
+
+        Left and right context take all but the centre unit from one side. Both sides split it evenly,
+        giving any odd unit to the left, so that widths 2 and 3 take the same units as the biphones and
+        triphones of the HTK labels.
+
+        Arguments:
+            subword_context_width: The number of units in the n-gram, including the centre unit
+            direction: 'left', 'right' or 'both'
+
+        Returns:
+            A tuple of the number of left and right context units
+    """
+    if subword_context_width < 1:
+        raise ValueError('The subword context width must be at least 1, but found {}'.format(subword_context_width))
+    if direction == 'left':
+        return subword_context_width - 1, 0
+    elif direction == 'right':
+        return 0, subword_context_width - 1
+    elif direction == 'both':
+        return subword_context_width // 2, (subword_context_width - 1) // 2
+    else:
+        raise ValueError('The context direction should be one of {}, but found {}'.format(CONTEXT_DIRECTIONS, direction))
+
+def ngram_id_matrix(token_ids, offsets, subword_context_width, direction='both'):
+    """ Gather the n-gram of token IDs around every arc using one shifted copy of the ID array per context unit
+
+        As in the HTK labels, context does not cross utterance boundaries: positions before the start or after
+        the end of an utterance hold MISSING_CONTEXT_ID.
+
+        Arguments:
+            token_ids: The monophone token IDs of all utterances back to back
+            offsets: The utterance boundaries, where the arcs of utterance i are [offsets[i], offsets[i + 1])
+            subword_context_width: The number of units in each n-gram
+            direction: 'left', 'right' or 'both' (see context_extent())
+
+        Returns:
+            A (number of arcs, subword_context_width) int64 array of token IDs, left context first
+    """
+    num_left, num_right = context_extent(subword_context_width, direction)
+    token_ids = np.asarray(token_ids, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    num_arcs = len(token_ids)
+    utterance_idx = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    positions = np.arange(num_arcs)
+
+    ngrams = np.full((num_arcs, subword_context_width), MISSING_CONTEXT_ID, dtype=np.int64)
+    for column, shift in enumerate(range(-num_left, num_right + 1)):
+        source = positions + shift
+        in_range = np.flatnonzero((source >= 0) & (source < num_arcs))
+        same_utterance = in_range[utterance_idx[source[in_range]] == utterance_idx[in_range]]
+        ngrams[same_utterance, column] = token_ids[source[same_utterance]]
+    return ngrams
+
+def hash_ngrams(ngrams, vocabulary_size):
+    """ Map the rows of an n-gram matrix onto a compact vocabulary of the n-grams which occur
+
+        Each row is packed into a single int64 key (in base vocabulary_size + 1, leaving room for the missing
+        context ID), so that the n-grams are deduplicated by one np.unique over a flat array. Should the keys
+        not fit in 63 bits, the rows themselves are deduplicated instead.
+
+        Arguments:
+            ngrams: A (number of arcs, width) int64 array from ngram_id_matrix()
+            vocabulary_size: The number of monophone tokens
+
+        Returns:
+            A tuple of the uint32 n-gram ID of every arc and the (number of n-grams, width) array of
+            unique n-grams which the IDs index
+    """
+    radix = vocabulary_size + 1
+    if ngrams.shape[1] * np.log2(max(radix, 2)) < 63:
+        keys = np.zeros(len(ngrams), dtype=np.int64)
+        for column in range(ngrams.shape[1]):
+            keys = keys * radix + (ngrams[:, column] + 1)
+        _, first_idx, ngram_ids = np.unique(keys, return_index=True, return_inverse=True)
+        unique_ngrams = ngrams[first_idx]
+    else:
+        unique_ngrams, ngram_ids = np.unique(ngrams, axis=0, return_inverse=True)
+    return ngram_ids.ravel().astype(np.uint32), unique_ngrams
+
+def ngram_tokens(unique_ngrams, tokens, separator=POSITION_CONTEXT_SEPARATOR):
+    """ Render n-grams of token IDs as strings of their units, left context first
+
+        Context outside the utterance is left out, so the first and last n-grams of an utterance differ from
+        the HTK labels, whose context names the unit beyond the utterance (e.g. the 'sil' of 'sil-a+b').
+
+        Arguments:
+            unique_ngrams: A (number of n-grams, width) array of token IDs
+            tokens: The monophone tokens indexed by the IDs
+            separator: The string placed between the units
+    """
+    return [
+        separator.join(tokens[token_id] for token_id in ngram if token_id != MISSING_CONTEXT_ID)
+        for ngram in unique_ngrams.tolist()
+    ]
+
+def ngram_context(token_ids, offsets, tokens, subword_context_width, direction='both',
+                  separator=POSITION_CONTEXT_SEPARATOR):
+    """ Derive the subword n-gram of every arc from the monophone token ID sequence
+
+        Only array operations are applied per arc; strings are built once per distinct n-gram.
+
+        Arguments:
+            token_ids: The monophone token IDs of all utterances back to back
+            offsets: The utterance boundaries of token_ids
+            tokens: The monophone tokens indexed by the IDs
+            subword_context_width: The number of units in each n-gram
+            direction: 'left', 'right' or 'both' (see context_extent())
+            separator: The string placed between the units of an n-gram (see ngram_tokens())
+
+        Returns:
+            A tuple of the uint32 n-gram ID of every arc and the list of n-gram tokens the IDs index
+    """
+    ngrams = ngram_id_matrix(token_ids, offsets, subword_context_width, direction)
+    ngram_ids, unique_ngrams = hash_ngrams(ngrams, len(tokens))
+    # N-grams cut short by the utterance boundaries can be rendered alike (with width 3, a+b at the start of
+    # an utterance and a-b at its end are both 'ab'), and then share one token
+    token_ids = {}
+    token_id_map = np.array(
+        [token_ids.setdefault(token, len(token_ids)) for token in ngram_tokens(unique_ngrams, tokens, separator)],
+        dtype=np.uint32
+    )
+    return token_id_map[ngram_ids], list(token_ids)
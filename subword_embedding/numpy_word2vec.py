@@ -0,0 +1,415 @@
+from multiprocessing import Process, RawArray
+import os
+
+import numpy as np
+
+from .corpus_statistics import keep_probabilities
+from .embedding_io import write_word2vec_text
+from .pipeline import open_corpus
+
+
+SENTENCE_END_TOKEN = '</s>'
+UNIGRAM_POWER = 0.75
+MIN_LEARNING_RATE_FRACTION = 1e-4
+CHUNK_TOKENS = 1 << 20
+
+
+def text_corpus_to_ids(corpus_path):
+    """ Read a whitespace separated text corpus into token IDs
+
+        Arguments:
+            corpus_path: The path name of the text corpus (one utterance per line, gzip compressed if it ends with .gz)
+
+        Returns:
+            A tuple of the token ID array, the utterance offsets into it and the list of words indexed by ID
+    """
+    word_to_id = {}
+    words = []
+    token_ids = []
+    offsets = [0]
+    with open_corpus(corpus_path, 'r') as corpus_file:
+        for line in corpus_file:
+            for word in line.split():
+                word_id = word_to_id.get(word)
+                if word_id is None:
+                    word_id = len(words)
+                    word_to_id[word] = word_id
+                    words.append(word)
+                token_ids.append(word_id)
+            offsets.append(len(token_ids))
+    return np.array(token_ids, dtype=np.int64), np.array(offsets, dtype=np.int64), words
+
+
+def split_multiword_tokens(token_ids, offsets, tokens):
+    """ Split tokens which contain whitespace into separate words, as the text corpus does.
+
+        With a separate apostrophe embedding a single token can be e.g. 'G1 A', which the external trainers
+        see as two words. This maps a token ID corpus onto the equivalent word ID corpus.
+
+        Arguments:
+            token_ids: An array of the token IDs of all utterances
+            offsets: The utterance boundaries into token_ids
+            tokens: The list of tokens indexed by token ID
+
+        Returns:
+            A tuple of the word ID array, the utterance offsets into it and the list of words indexed by ID
+    """
+    token_words = [token.split() for token in tokens]
+    if all(len(words) == 1 for words in token_words):
+        return np.asarray(token_ids, dtype=np.int64), np.asarray(offsets, dtype=np.int64), list(tokens)
+
+    word_to_id = {}
+    words = []
+    word_table = []
+    for token in token_words:
+        for word in token:
+            if word not in word_to_id:
+                word_to_id[word] = len(words)
+                words.append(word)
+            word_table.append(word_to_id[word])
+    word_table = np.array(word_table, dtype=np.int64)
+    token_lengths = np.array([len(token) for token in token_words], dtype=np.int64)
+    token_starts = np.concatenate(([0], np.cumsum(token_lengths)[:-1]))
+
+    # Gather the run of word IDs for every token in the corpus
+    token_ids = np.asarray(token_ids, dtype=np.int64)
+    lengths = token_lengths[token_ids]
+    run_starts = np.repeat(token_starts[token_ids], lengths)
+    run_positions = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    word_ids = word_table[run_starts + run_positions]
+
+    cumulative_lengths = np.concatenate(([0], np.cumsum(lengths)))
+    word_offsets = cumulative_lengths[np.asarray(offsets, dtype=np.int64)]
+    return word_ids, word_offsets, words
+
+
+def context_pairs(utterance_ids, window, rng):
+    """ Generate the (centre, context) position pairs of a chunk of the corpus.
+
+        As in word2vec, the window of every centre position is shrunk to a random width in [1, window],
+        and windows never cross utterance boundaries.
+
+        Arguments:
+            utterance_ids: The utterance index of every token position in the chunk
+            window: The maximum context window width
+            rng: A numpy RandomState
+
+        Returns:
+            The centre and context position arrays, sorted by centre position
+    """
+    num_tokens = len(utterance_ids)
+    reduced_window = rng.randint(1, window + 1, size=num_tokens)
+    positions = np.arange(num_tokens)
+    centres = []
+    contexts = []
+    for distance in range(1, window + 1):
+        if distance >= num_tokens:
+            break
+        same_utterance = utterance_ids[:-distance] == utterance_ids[distance:]
+        # Context to the right of the centre
+        right = positions[:-distance][same_utterance & (reduced_window[:-distance] >= distance)]
+        centres.append(right)
+        contexts.append(right + distance)
+        # Context to the left of the centre
+        left = positions[distance:][same_utterance & (reduced_window[distance:] >= distance)]
+        centres.append(left)
+        contexts.append(left - distance)
+
+    if not centres:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    centres = np.concatenate(centres)
+    contexts = np.concatenate(contexts)
+    order = np.argsort(centres, kind='mergesort')
+    return centres[order], contexts[order]
+
+
+def noise_distribution(counts):
+    """ The cumulative unigram^0.75 distribution which negative samples are drawn from
+
+        Arguments:
+            counts: The number of occurrences of every word
+
+        Returns:
+            The cumulative probability of every word ID, ending at 1
+    """
+    noise_cdf = np.cumsum(np.asarray(counts, dtype=np.float64) ** UNIGRAM_POWER)
+    noise_cdf /= noise_cdf[-1] if len(noise_cdf) else 1.0
+    return noise_cdf
+
+
+def sigmoid(x):
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+
+def scatter_mean_add(matrix, row_ids, updates):
+    """ Add updates to the rows of a matrix, averaging the updates that hit the same row.
+
+        A minibatch over a vocabulary of a few hundred subword units hits the frequent rows many times.
+        Summing those updates would multiply the effective learning rate of frequent units and diverge,
+        so each row moves by the mean of its updates instead.
+
+        Arguments:
+            matrix: The weight matrix to update in place
+            row_ids: The (N,) row index of every update
+            updates: The (N, vector_length) updates
+    """
+    unique_rows, inverse, counts = np.unique(row_ids, return_inverse=True, return_counts=True)
+    summed = np.zeros((len(unique_rows), matrix.shape[1]), dtype=matrix.dtype)
+    np.add.at(summed, inverse.ravel(), updates)
+    matrix[unique_rows] += summed / counts[:, None]
+
+
+class Word2VecTrainer(object):
+    """ A vectorized NumPy implementation of word2vec (CBOW and skip-gram) with negative sampling.
+
+        Subword vocabularies are tiny, so rather than iterating over individual words the trainer
+        generates every (centre, context) pair of a chunk of the corpus with array operations and applies
+        the updates in minibatches. With more than one worker the corpus chunks are split between processes
+        which update weight matrices in shared memory without locking (Hogwild).
+    """
+    def __init__(self, vector_length, cbow=True, window=5, negative=5, epochs=5, learning_rate=None,
+                 min_count=1, sample=0, batch_size=512, workers=1, seed=1, verbose=True):
+        """ Initialise the Word2VecTrainer object
+
+            Arguments:
+                vector_length: The length of the embedding vectors
+                cbow: Boolean for whether to use the CBOW (True) or skip-gram (False) architecture
+                window: The maximum context window width
+                negative: The number of negative samples per positive example
+                epochs: The number of passes over the corpus
+                learning_rate: The initial learning rate (defaults to 0.05 for CBOW and 0.025 for skip-gram,
+                               as in word2vec). It decays linearly over training.
+                min_count: Words occurring fewer times than this are discarded
+                sample: The threshold above which frequent words are randomly discarded in every epoch, e.g. 1e-3
+                        as in word2vec (0 disables subsampling). See corpus_statistics.keep_probabilities().
+                batch_size: The number of centre positions (CBOW) or pairs (skip-gram) per update
+                workers: The number of Hogwild training processes
+                seed: The random seed
+                verbose: Boolean for whether to print the training loss per epoch
+        """
+        self.vector_length = vector_length
+        self.cbow = cbow
+        self.window = window
+        self.negative = negative
+        self.epochs = epochs
+        self.learning_rate = learning_rate if learning_rate is not None else (0.05 if cbow else 0.025)
+        self.min_count = min_count
+        self.sample = sample
+        self.batch_size = batch_size
+        self.workers = workers
+        self.seed = seed
+        self.verbose = verbose
+
+    def train(self, token_ids, offsets, words):
+        """ Train embeddings on a token ID corpus
+
+            Arguments:
+                token_ids: An array of the token IDs of all utterances
+                offsets: The utterance boundaries into token_ids
+                words: The list of words indexed by token ID
+
+            Returns:
+                A tuple of the list of trained words (sorted by descending frequency) and their embedding matrix
+        """
+        token_ids = np.asarray(token_ids, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        utterance_ids = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+        # Discard rare words and renumber the vocabulary by descending frequency
+        counts = np.bincount(token_ids, minlength=len(words))
+        order = np.argsort(-counts, kind='mergesort')
+        order = order[counts[order] >= max(self.min_count, 1)]
+        new_ids = np.full(len(words), -1, dtype=np.int64)
+        new_ids[order] = np.arange(len(order))
+        token_ids = new_ids[token_ids]
+        keep = token_ids >= 0
+        token_ids = token_ids[keep]
+        utterance_ids = utterance_ids[keep]
+        vocabulary = [words[word_id] for word_id in order]
+        counts = counts[order]
+
+        vocabulary_size = len(vocabulary)
+        rng = np.random.RandomState(self.seed)
+        syn0_buffer = RawArray('f', vocabulary_size * self.vector_length)
+        syn1_buffer = RawArray('f', vocabulary_size * self.vector_length)
+        syn0 = np.frombuffer(syn0_buffer, dtype=np.float32).reshape(vocabulary_size, self.vector_length)
+        syn0[:] = (rng.random_sample(syn0.shape) - 0.5) / self.vector_length
+
+        noise_cdf = noise_distribution(counts)
+        keep_probability = keep_probabilities(counts, self.sample) if self.sample > 0 else None
+
+        # Split the corpus into chunks so that every Hogwild worker has a share of them
+        chunk_tokens = max(min(CHUNK_TOKENS, -(-len(token_ids) // max(self.workers, 1))), 1)
+        chunks = [
+            (start, min(start + chunk_tokens, len(token_ids))) for start in range(0, len(token_ids), chunk_tokens)
+        ]
+        if self.workers <= 1 or len(chunks) < 2:
+            self._train_worker(
+                syn0_buffer, syn1_buffer, token_ids, utterance_ids, chunks, noise_cdf, keep_probability, 0
+            )
+        else:
+            processes = []
+            for worker_idx in range(self.workers):
+                process = Process(
+                    target=self._train_worker,
+                    args=(syn0_buffer, syn1_buffer, token_ids, utterance_ids, chunks[worker_idx::self.workers],
+                          noise_cdf, keep_probability, worker_idx)
+                )
+                process.start()
+                processes.append(process)
+            for process in processes:
+                process.join()
+                if process.exitcode != 0:
+                    raise RuntimeError('A word2vec training process failed with exit code {}'.format(process.exitcode))
+
+        return vocabulary, syn0.copy()
+
+    def _train_worker(self, syn0_buffer, syn1_buffer, token_ids, utterance_ids, chunks, noise_cdf, keep_probability,
+                      worker_idx):
+        """ Run all epochs over a subset of the corpus chunks, updating the shared weight matrices in place """
+        syn0 = np.frombuffer(syn0_buffer, dtype=np.float32).reshape(-1, self.vector_length)
+        syn1 = np.frombuffer(syn1_buffer, dtype=np.float32).reshape(-1, self.vector_length)
+        rng = np.random.RandomState(self.seed + worker_idx + 1)
+
+        total_tokens = self.epochs * sum(end - start for start, end in chunks)
+        tokens_done = 0
+        for epoch in range(self.epochs):
+            epoch_loss = 0.0
+            epoch_examples = 0
+            for start, end in chunks:
+                chunk_ids = token_ids[start:end]
+                chunk_utterances = utterance_ids[start:end]
+                if self.sample > 0:
+                    # Discarded words are removed before the windows are drawn, which widens the windows
+                    kept = rng.random_sample(len(chunk_ids)) < keep_probability[chunk_ids]
+                    chunk_ids = chunk_ids[kept]
+                    chunk_utterances = chunk_utterances[kept]
+                centres, contexts = context_pairs(chunk_utterances, self.window, rng)
+                centres = chunk_ids[centres]
+                contexts = chunk_ids[contexts]
+
+                # The learning rate decays linearly over the whole run, updated once per chunk
+                progress = tokens_done / max(total_tokens, 1)
+                learning_rate = self.learning_rate * max(1.0 - progress, MIN_LEARNING_RATE_FRACTION)
+                if self.cbow:
+                    loss, examples = self._train_cbow(syn0, syn1, centres, contexts, noise_cdf, learning_rate, rng)
+                else:
+                    loss, examples = self._train_skip_gram(syn0, syn1, centres, contexts, noise_cdf, learning_rate, rng)
+                epoch_loss += loss
+                epoch_examples += examples
+                tokens_done += end - start
+
+            if self.verbose and worker_idx == 0:
+                print('Epoch {}/{}: loss {:.4f}'.format(epoch + 1, self.epochs, epoch_loss / max(epoch_examples, 1)))
+
+    def _negative_samples(self, targets, noise_cdf, rng):
+        """ Draw negative samples from the unigram^0.75 distribution for every target """
+        negatives = np.searchsorted(noise_cdf, rng.random_sample((len(targets), self.negative)))
+        return np.minimum(negatives, len(noise_cdf) - 1)
+
+    def _update(self, syn1, hidden, targets, noise_cdf, learning_rate, rng):
+        """ Apply a negative sampling update to the output weights
+
+            Arguments:
+                syn1: The output weight matrix
+                hidden: The (batch, vector_length) hidden layer activations
+                targets: The (batch,) target word IDs
+
+            Returns:
+                The gradient with respect to the hidden layer and the summed loss of the batch
+        """
+        negatives = self._negative_samples(targets, noise_cdf, rng)
+        output_ids = np.concatenate([targets[:, None], negatives], axis=1)
+        labels = np.zeros(output_ids.shape, dtype=np.float32)
+        labels[:, 0] = 1.0
+        # As in word2vec, negative samples which hit the target word are skipped
+        active = np.ones(output_ids.shape, dtype=np.float32)
+        active[:, 1:] = negatives != targets[:, None]
+
+        output_vectors = syn1[output_ids]
+        scores = np.einsum('bd,bkd->bk', hidden, output_vectors)
+        probabilities = sigmoid(scores)
+        gradient = (labels - probabilities) * active * learning_rate
+
+        hidden_gradient = np.einsum('bk,bkd->bd', gradient, output_vectors)
+        scatter_mean_add(
+            syn1, output_ids.ravel(), (gradient[:, :, None] * hidden[:, None, :]).reshape(-1, hidden.shape[1])
+        )
+
+        likelihood = np.where(labels > 0, probabilities, 1.0 - probabilities)
+        loss = -(np.log(np.maximum(likelihood, 1e-7)) * active).sum()
+        return hidden_gradient, loss
+
+    def _train_skip_gram(self, syn0, syn1, centres, contexts, noise_cdf, learning_rate, rng):
+        """ Skip-gram: each context word predicts the centre word """
+        total_loss = 0.0
+        for batch_start in range(0, len(centres), self.batch_size):
+            inputs = contexts[batch_start:batch_start + self.batch_size]
+            targets = centres[batch_start:batch_start + self.batch_size]
+            hidden_gradient, loss = self._update(syn1, syn0[inputs], targets, noise_cdf, learning_rate, rng)
+            scatter_mean_add(syn0, inputs, hidden_gradient)
+            total_loss += loss
+        return total_loss, len(centres)
+
+    def _train_cbow(self, syn0, syn1, centres, contexts, noise_cdf, learning_rate, rng):
+        """ CBOW: the mean of the context words predicts the centre word """
+        if len(centres) == 0:
+            return 0.0, 0
+        # The pairs are sorted by centre position, so each centre owns a contiguous run of contexts
+        group_starts = np.flatnonzero(np.concatenate(([True], np.diff(centres) != 0)))
+        group_ends = np.append(group_starts[1:], len(centres))
+
+        total_loss = 0.0
+        for batch_start in range(0, len(group_starts), self.batch_size):
+            starts = group_starts[batch_start:batch_start + self.batch_size]
+            ends = group_ends[batch_start:batch_start + self.batch_size]
+            pair_slice = slice(starts[0], ends[-1])
+            batch_contexts = contexts[pair_slice]
+            group_sizes = ends - starts
+
+            hidden = np.add.reduceat(syn0[batch_contexts], starts - starts[0], axis=0) / group_sizes[:, None]
+            hidden_gradient, loss = self._update(
+                syn1, hidden.astype(np.float32), centres[starts], noise_cdf, learning_rate, rng
+            )
+            # As in word2vec, every context word receives the full hidden layer gradient
+            scatter_mean_add(syn0, batch_contexts, np.repeat(hidden_gradient, group_sizes, axis=0))
+            total_loss += loss
+        return total_loss, len(group_starts)
+
+
+def save_word2vec_text(target_file, words, vectors):
+    """ Save embeddings in the word2vec text format (with the </s> entry word2vec emits first)
+
+        Arguments:
+            target_file: The path name of the embedding file
+            words: The list of words
+            vectors: The (number of words, vector length) embedding matrix
+    """
+    words = list(words)
+    vectors = np.asarray(vectors)
+    if SENTENCE_END_TOKEN not in words:
+        # Windows do not cross utterances, so </s> is never trained; keep it for format compatibility
+        words = [SENTENCE_END_TOKEN] + words
+        vectors = np.concatenate([np.zeros((1, vectors.shape[1]), dtype=vectors.dtype), vectors])
+    write_word2vec_text(target_file, words, vectors, float_format='%f')
+
+
+def embed_token_ids(token_ids, offsets, tokens, vector_length, target_dir, **trainer_options):
+    """ Train word2vec embeddings in-process and save them to embedding.txt in the target directory
+
+        Arguments:
+            token_ids: An array of the token IDs of all utterances
+            offsets: The utterance boundaries into token_ids
+            tokens: The list of tokens indexed by token ID
+            vector_length: The length of the embedding vectors
+            target_dir: The embedding directory
+            trainer_options: Keyword arguments passed to Word2VecTrainer
+    """
+    word_ids, word_offsets, words = split_multiword_tokens(token_ids, offsets, tokens)
+    trainer = Word2VecTrainer(vector_length, **trainer_options)
+    trained_words, vectors = trainer.train(word_ids, word_offsets, words)
+
+    if not os.path.exists(target_dir):
+        os.makedirs(target_dir)
+    save_word2vec_text(os.path.join(target_dir, 'embedding.txt'), trained_words, vectors)
+    return trained_words, vectors
@@ -0,0 +1,195 @@
+import gzip
+import queue
+import threading
+import time
+
+
+DEFAULT_QUEUE_SIZE = 64
+GZIP_SUFFIX = '.gz'
+CORPUS_ENCODING = 'utf-8'
+# Put on a queue to tell its consumer that there are no more batches
+END_OF_STREAM = None
+
+
+def open_corpus(corpus_path, mode='r'):
+    """ Open a text corpus, which is gzip compressed if its path name ends with .gz
+
+        Arguments:
+            corpus_path: The path name of the corpus
+            mode: 'r' to read or 'w' to write
+    """
+    if corpus_path.endswith(GZIP_SUFFIX):
+        return gzip.open(corpus_path, mode + 't', encoding=CORPUS_ENCODING)
+    return open(corpus_path, mode, encoding=CORPUS_ENCODING)
+
+
+class StageStats(object):
+    """ The counters of one pipeline stage: the work done, the time spent working and waiting, and the
+        depth of the queue feeding the stage (or fed by it, for the producer)
+    """
+    def __init__(self, name):
+        self.name = name
+        self.batches = 0
+        self.sentences = 0
+        self.bytes = 0
+        self.busy_time = 0.0
+        self.wait_time = 0.0
+        self.max_depth = 0
+        self.total_depth = 0
+        self.depth_samples = 0
+
+    def record_depth(self, depth):
+        self.max_depth = max(self.max_depth, depth)
+        self.total_depth += depth
+        self.depth_samples += 1
+
+    def summary(self):
+        """ A dictionary of the counters and the throughput of the stage while it was busy """
+        return {
+            'stage': self.name,
+            'batches': self.batches,
+            'sentences': self.sentences,
+            'bytes': self.bytes,
+            'busy_s': self.busy_time,
+            'wait_s': self.wait_time,
+            'sentences_per_s': self.sentences / self.busy_time if self.busy_time > 0 else 0.0,
+            'mean_queue_depth': self.total_depth / self.depth_samples if self.depth_samples else 0.0,
+            'max_queue_depth': self.max_depth,
+        }
+
+
+class CorpusPipeline(object):
+    """ Overlaps parsing, writing the corpus and collecting the vocabulary.
+
+        The producer (the calling thread, which may in turn be fed by a process pool of parsers) puts
+        batches of (sentences, unique subwords) onto two bounded queues. A writer thread streams the
+        sentences to the corpus file and a vocabulary thread merges the subword sets. The bounded queues
+        keep memory flat: a producer which outpaces the writer blocks rather than buffering the corpus.
+
+        The time each stage spends working and waiting is recorded, so that report() shows whether a run
+        is bound by parsing (consumers waiting on empty queues) or by writing (the producer blocked on a
+        full queue).
+    """
+    def __init__(self, target_file, queue_size=DEFAULT_QUEUE_SIZE):
+        """ Initialise the CorpusPipeline object
+
+            Arguments:
+                target_file: The path name of the corpus to write (gzip compressed if it ends with .gz)
+                queue_size: The maximum number of batches waiting for each consumer
+        """
+        self.target_file = target_file
+        self.write_queue = queue.Queue(maxsize=queue_size)
+        self.vocabulary_queue = queue.Queue(maxsize=queue_size)
+        self.subwords = set()
+        self.stats = {name: StageStats(name) for name in ('parse', 'write', 'vocabulary')}
+        self.errors = []
+        self.elapsed = 0.0
+
+    def run(self, batches):
+        """ Drain an iterable of (list of sentences, set of subwords) batches through the pipeline
+
+            Returns once the corpus file is closed, so that training can start straight away.
+
+            Arguments:
+                batches: An iterable of batches, e.g. from MLFDataset.iter_sentence_batches()
+
+            Returns:
+                The set of unique subwords in the corpus
+        """
+        start_time = time.time()
+        consumers = [
+            threading.Thread(target=self.consume, args=(self.write_queue, self.stats['write'], self.write_batches)),
+            threading.Thread(
+                target=self.consume, args=(self.vocabulary_queue, self.stats['vocabulary'], self.collect_vocabulary)
+            ),
+        ]
+        for consumer in consumers:
+            consumer.start()
+
+        parse_stats = self.stats['parse']
+        try:
+            batch_iterator = iter(batches)
+            # Stop early if a consumer has failed
+            while not self.errors:
+                parse_start = time.time()
+                try:
+                    batch = next(batch_iterator)
+                except StopIteration:
+                    break
+                parse_stats.busy_time += time.time() - parse_start
+                parse_stats.batches += 1
+                parse_stats.sentences += len(batch[0])
+
+                put_start = time.time()
+                for batch_queue in (self.write_queue, self.vocabulary_queue):
+                    parse_stats.record_depth(batch_queue.qsize())
+                    batch_queue.put(batch)
+                parse_stats.wait_time += time.time() - put_start
+        finally:
+            for batch_queue in (self.write_queue, self.vocabulary_queue):
+                batch_queue.put(END_OF_STREAM)
+            for consumer in consumers:
+                consumer.join()
+            self.elapsed = time.time() - start_time
+
+        if self.errors:
+            raise self.errors[0]
+        return self.subwords
+
+    def consume(self, batch_queue, stats, process_batches):
+        """ Run a consumer stage, which takes a generator of batches, in its own thread """
+        end_of_stream = []
+
+        def iter_batches():
+            while True:
+                wait_start = time.time()
+                batch = batch_queue.get()
+                stats.wait_time += time.time() - wait_start
+                if batch is END_OF_STREAM:
+                    end_of_stream.append(True)
+                    return
+                stats.record_depth(batch_queue.qsize())
+                yield batch
+
+        try:
+            process_batches(iter_batches(), stats)
+        except Exception as error:
+            self.errors.append(error)
+            # Keep draining the queue so that the producer is not blocked forever
+            while not end_of_stream and batch_queue.get() is not END_OF_STREAM:
+                pass
+
+    def write_batches(self, batches, stats):
+        sentences_written = 0
+        with open_corpus(self.target_file, 'w') as corpus_file:
+            for sentences, _ in batches:
+                busy_start = time.time()
+                text = '\n'.join(sentences)
+                if sentences_written > 0 and sentences:
+                    text = '\n' + text
+                corpus_file.write(text)
+                sentences_written += len(sentences)
+                stats.batches += 1
+                stats.sentences += len(sentences)
+                # The size of the encoded text (before any compression), rather than its number of characters
+                stats.bytes += len(text.encode(CORPUS_ENCODING))
+                stats.busy_time += time.time() - busy_start
+
+    def collect_vocabulary(self, batches, stats):
+        for sentences, subwords in batches:
+            busy_start = time.time()
+            self.subwords.update(subwords)
+            stats.batches += 1
+            stats.sentences += len(sentences)
+            stats.busy_time += time.time() - busy_start
+
+    def report(self):
+        """ Print the per-stage counters, throughput and queue depths """
+        print('Corpus pipeline finished in {:.2f}s'.format(self.elapsed))
+        print('  {:<11}{:>9}{:>11}{:>9}{:>9}{:>12}{:>12}{:>11}'.format(
+            'stage', 'batches', 'sentences', 'busy_s', 'wait_s', 'sent/s', 'mean_depth', 'max_depth'
+        ))
+        for stats in self.stats.values():
+            summary = stats.summary()
+            print('  {stage:<11}{batches:>9}{sentences:>11}{busy_s:>9.2f}{wait_s:>9.2f}{sentences_per_s:>12.0f}'
+                  '{mean_queue_depth:>12.1f}{max_queue_depth:>11}'.format(**summary))
@@ -0,0 +1,158 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # The resource module is only available on Unix, where the RSS figures come from
+    resource = None
+
+
+def max_rss_mb(who='self'):
+    """ The peak resident set size in MB of this process ('self') or of its largest finished child ('children')
+
+        Returns:
+            The peak RSS, or None where it cannot be measured
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return usage.ru_maxrss / (1024.0 * 1024.0) if sys.platform == 'darwin' else usage.ru_maxrss / 1024.0
+
+
+def children_cpu_time():
+    """ The CPU time used by the finished child processes (e.g. parser and trainer workers) """
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class StageProfile(object):
+    """ The time, memory and counters recorded for one stage """
+    def __init__(self, name):
+        self.name = name
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.children_cpu_time = 0.0
+        self.peak_traced_mb = None
+        self.max_rss_mb = None
+        self.children_max_rss_mb = None
+        self.counters = OrderedDict()
+
+    def summary(self):
+        return OrderedDict([
+            ('stage', self.name),
+            ('wall_s', self.wall_time),
+            ('cpu_s', self.cpu_time),
+            ('children_cpu_s', self.children_cpu_time),
+            ('peak_traced_mb', self.peak_traced_mb),
+            ('max_rss_mb', self.max_rss_mb),
+            ('children_max_rss_mb', self.children_max_rss_mb),
+            ('counters', self.counters),
+        ])
+
+
+class Profiler(object):
+    """ Records the wall time, CPU time, memory and counters of each stage of a run.
+
+        Stages are run one at a time with the stage() context manager. The CPU time of a stage includes that of
+        the child processes which finished during it. The RSS figures are the high-water marks of the process
+        (and of its largest child) at the end of the stage, so a stage which does not raise them did not need
+        more memory than the stages before it. With trace_memory the peak Python heap allocation of each stage is
+        also measured with tracemalloc, which slows allocation-heavy code down considerably.
+
+        A disabled profiler runs the stages without measuring anything, so that callers need not check.
+    """
+    def __init__(self, enabled=True, trace_memory=False, cprofile_stage=None, cprofile_path=None):
+        """ Initialise the Profiler object
+
+            Arguments:
+                enabled: Boolean for whether anything is recorded
+                trace_memory: Boolean for whether to measure the peak Python heap allocation with tracemalloc
+                cprofile_stage: The name of a stage to run under cProfile
+                cprofile_path: The path name of the cProfile stats file (loadable with pstats)
+        """
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.cprofile_stage = cprofile_stage
+        self.cprofile_path = cprofile_path
+        self.stages = []
+        self.current_stage = None
+
+    @contextmanager
+    def stage(self, name):
+        """ Context manager which profiles the code run within it as the stage of the given name """
+        if not self.enabled:
+            yield None
+            return
+
+        stage_profile = StageProfile(name)
+        self.stages.append(stage_profile)
+        self.current_stage = stage_profile
+        profile = None
+        if name == self.cprofile_stage:
+            import cProfile
+            profile = cProfile.Profile()
+        if self.trace_memory:
+            tracemalloc.start()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        start_children_cpu = children_cpu_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield stage_profile
+        finally:
+            if profile is not None:
+                profile.disable()
+            stage_profile.wall_time = time.perf_counter() - start_wall
+            stage_profile.cpu_time = time.process_time() - start_cpu
+            stage_profile.children_cpu_time = children_cpu_time() - start_children_cpu
+            if self.trace_memory:
+                stage_profile.peak_traced_mb = tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0)
+                tracemalloc.stop()
+            stage_profile.max_rss_mb = max_rss_mb('self')
+            stage_profile.children_max_rss_mb = max_rss_mb('children')
+            self.current_stage = None
+            if profile is not None:
+                profile.dump_stats(self.cprofile_path)
+                print('Saved the cProfile stats of the {} stage to {}'.format(name, self.cprofile_path))
+
+    def count(self, name, value):
+        """ Add to a counter of the stage being run (or of the last stage, once it has finished) """
+        if not self.enabled or not self.stages:
+            return
+        stage_profile = self.current_stage or self.stages[-1]
+        stage_profile.counters[name] = stage_profile.counters.get(name, 0) + value
+
+    def report(self):
+        return OrderedDict([
+            ('stages', [stage_profile.summary() for stage_profile in self.stages]),
+            ('total_wall_s', sum(stage_profile.wall_time for stage_profile in self.stages)),
+            ('max_rss_mb', max_rss_mb('self')),
+        ])
+
+    def save(self, target_file):
+        """ Save the report as JSON """
+        target_dir = os.path.dirname(target_file)
+        if target_dir and not os.path.exists(target_dir):
+            os.makedirs(target_dir)
+        with open(target_file, 'w') as report_file:
+            json.dump(self.report(), report_file, indent=2)
+
+    def print_summary(self):
+        print('{:<10} {:>9} {:>9} {:>9} {:>10}'.format('stage', 'wall (s)', 'cpu (s)', 'child (s)', 'rss (MB)'))
+        for stage_profile in self.stages:
+            print('{:<10} {:>9.2f} {:>9.2f} {:>9.2f} {:>10}'.format(
+                stage_profile.name, stage_profile.wall_time, stage_profile.cpu_time, stage_profile.children_cpu_time,
+                '-' if stage_profile.max_rss_mb is None else '{:.1f}'.format(stage_profile.max_rss_mb)
+            ))
+            for counter, value in stage_profile.counters.items():
+                print('    {}: {}'.format(counter, value))
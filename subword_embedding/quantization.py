@@ -0,0 +1,265 @@
+from collections import OrderedDict
+import json
+import os
+
+import numpy as np
+
+from .embedding_store import EmbeddingStore
+
+
+QUANTIZATION_METHODS = ('float16', 'int8', 'pq')
+QUANTIZED_ARRAYS_SUFFIX = '.quantized.npz'
+QUANTIZED_INFO_SUFFIX = '.quantized.json'
+INT8_MAX = 127
+PQ_CENTROIDS = 256
+PQ_ITERATIONS = 25
+PQ_SEED = 0
+
+
+def default_num_subvectors(vector_length):
+    """ The number of product quantization sub-vectors: the most which divide the vector into pairs or more """
+    for num_subvectors in range(vector_length // 2, 0, -1):
+        if vector_length % num_subvectors == 0:
+            return num_subvectors
+    return 1
+
+
+def kmeans(data, num_centroids, iterations, rng):
+    """ Lloyd's k-means, starting from randomly chosen rows
+
+        Arguments:
+            data: The (number of points, dim) float array to cluster
+            num_centroids: The number of clusters (at most the number of points)
+            iterations: The number of assignment and update steps
+            rng: A numpy RandomState
+
+        Returns:
+            The (num_centroids, dim) centroids and the cluster of each point
+    """
+    centroids = data[rng.choice(len(data), num_centroids, replace=False)].copy()
+    data_norms = np.einsum('ij,ij->i', data, data)[:, np.newaxis]
+    assignments = None
+    for _ in range(iterations):
+        # Squared distances from the expansion |x - c|^2 = |x|^2 - 2 x.c + |c|^2, in one matrix product
+        distances = data_norms - 2 * data.dot(centroids.T) + np.einsum('ij,ij->i', centroids, centroids)
+        new_assignments = np.argmin(distances, axis=1)
+        if assignments is not None and np.array_equal(new_assignments, assignments):
+            break
+        assignments = new_assignments
+        counts = np.bincount(assignments, minlength=num_centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+        # Clusters which lost all of their points keep their previous centroid
+        non_empty = counts > 0
+        centroids[non_empty] = sums[non_empty] / counts[non_empty, np.newaxis]
+    return centroids, assignments
+
+
+def quantize(vectors, method, num_subvectors=None, num_centroids=None, iterations=PQ_ITERATIONS,
+             seed=PQ_SEED):
+    """ Quantize an embedding matrix
+
+        float16 halves the size of a float32 matrix. int8 scales each row by its largest absolute value so that it
+        fits in [-127, 127], a quarter of the size plus one scale per row. Product quantization splits each vector
+        into sub-vectors and replaces each sub-vector by the ID of its nearest centroid in a codebook learnt by
+        k-means, using one byte per sub-vector.
+
+        Arguments:
+            vectors: The (number of tokens, vector length) embedding matrix
+            method: One of QUANTIZATION_METHODS
+            num_subvectors: The number of sub-vectors (pq), which must divide the vector length. Defaults to
+                            default_num_subvectors().
+            num_centroids: The number of centroids per sub-vector codebook (pq), at most 256 and fewer than the
+                           number of tokens. Defaults to 256, or one fewer than the number of tokens if that is less.
+            iterations: The number of k-means iterations (pq)
+            seed: The random seed of the k-means initialisation (pq)
+
+        Returns:
+            A dictionary of the arrays representing the quantized matrix
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if method == 'float16':
+        return {'codes': vectors.astype(np.float16)}
+    elif method == 'int8':
+        scales = np.abs(vectors).max(axis=1) / INT8_MAX
+        # All-zero rows are given a unit scale, so that they are not divided by zero
+        scales[scales == 0] = 1.0
+        codes = np.rint(vectors / scales[:, np.newaxis]).astype(np.int8)
+        return {'codes': codes, 'scales': scales.astype(np.float32)}
+    elif method == 'pq':
+        num_tokens, vector_length = vectors.shape
+        num_subvectors = num_subvectors or default_num_subvectors(vector_length)
+        if vector_length % num_subvectors != 0:
+            raise ValueError('{} sub-vectors do not divide the vector length {}'.format(num_subvectors, vector_length))
+        if num_centroids is None:
+            num_centroids = min(PQ_CENTROIDS, num_tokens - 1)
+        if not 0 < num_centroids <= PQ_CENTROIDS:
+            raise ValueError('Product quantization codes are bytes, so it needs 1 to 256 centroids')
+        if num_tokens <= num_centroids:
+            # The codebook alone would be as large as the float32 matrix, while reproducing it exactly
+            raise ValueError(
+                'Product quantization of {} vectors with {} centroids would store every vector in the codebook, '
+                'which is no smaller than float32. Use fewer centroids or the float16 or int8 format'.format(
+                    num_tokens, num_centroids
+                )
+            )
+        subvector_length = vector_length // num_subvectors
+        rng = np.random.RandomState(seed)
+        codebook = np.zeros((num_subvectors, num_centroids, subvector_length), dtype=np.float32)
+        codes = np.zeros((num_tokens, num_subvectors), dtype=np.uint8)
+        for subvector in range(num_subvectors):
+            subvectors = vectors[:, subvector * subvector_length:(subvector + 1) * subvector_length]
+            codebook[subvector], codes[:, subvector] = kmeans(subvectors, num_centroids, iterations, rng)
+        return {'codes': codes, 'codebook': codebook}
+    else:
+        raise ValueError('Unknown quantization method: {}'.format(method))
+
+
+def dequantize(method, arrays, rows=None):
+    """ Reconstruct float32 vectors from their quantized form
+
+        Arguments:
+            method: One of QUANTIZATION_METHODS
+            arrays: The dictionary of arrays returned by quantize()
+            rows: An optional array of the rows to reconstruct (all rows by default)
+
+        Returns:
+            A (number of rows, vector length) float32 array
+    """
+    codes = arrays['codes'] if rows is None else arrays['codes'][rows]
+    if method == 'float16':
+        return codes.astype(np.float32)
+    elif method == 'int8':
+        scales = arrays['scales'] if rows is None else arrays['scales'][rows]
+        return codes.astype(np.float32) * scales[:, np.newaxis]
+    elif method == 'pq':
+        codebook = arrays['codebook']
+        num_subvectors = codebook.shape[0]
+        # Gather the centroid of every (row, sub-vector) pair and lay the sub-vectors end to end
+        return codebook[np.arange(num_subvectors), codes].reshape(len(codes), -1)
+    else:
+        raise ValueError('Unknown quantization method: {}'.format(method))
+
+
+def reconstruction_error(vectors, reconstructed):
+    """ Measures of how far reconstructed vectors are from the originals
+
+        Returns:
+            A dictionary of the root mean squared error, the maximum absolute error, the mean error norm relative to
+            the vector norm and the mean cosine similarity between the original and reconstructed vectors
+    """
+    vectors = np.asarray(vectors, dtype=np.float64)
+    difference = vectors - reconstructed
+    vector_norms = np.linalg.norm(vectors, axis=1)
+    reconstructed_norms = np.linalg.norm(reconstructed, axis=1)
+    nonzero = (vector_norms > 0) & (reconstructed_norms > 0)
+    cosines = np.einsum('ij,ij->i', vectors[nonzero], reconstructed[nonzero]) / \
+        (vector_norms[nonzero] * reconstructed_norms[nonzero])
+    return OrderedDict([
+        ('rmse', float(np.sqrt(np.mean(difference ** 2)))),
+        ('max_abs_error', float(np.abs(difference).max())),
+        ('mean_relative_error', float(np.mean(np.linalg.norm(difference, axis=1)[nonzero] / vector_norms[nonzero]))),
+        ('mean_cosine_similarity', float(np.mean(cosines))),
+    ])
+
+
+class QuantizedEmbeddingStore(EmbeddingStore):
+    """ An EmbeddingStore whose matrix is held in quantized form (see quantize()) and dequantized on lookup.
+
+        On disk a quantized store is a pair of files sharing a path prefix: <prefix>.quantized.npz holds the
+        quantized arrays and <prefix>.quantized.json the quantization method, the tokens in row order and the
+        reconstruction error measured when the store was quantized. Lookups of many tokens gather and dequantize
+        only the rows asked for; the full float32 matrix is only built if the vectors attribute is used.
+    """
+    def __init__(self, tokens, method, arrays, error=None):
+        """ Initialise the QuantizedEmbeddingStore object
+
+            Arguments:
+                tokens: The list of tokens in row order
+                method: One of QUANTIZATION_METHODS
+                arrays: The dictionary of arrays returned by quantize()
+                error: The reconstruction error of the quantization (see reconstruction_error())
+        """
+        if len(tokens) != len(arrays['codes']):
+            raise ValueError('Found {} tokens but {} quantized vectors'.format(len(tokens), len(arrays['codes'])))
+        self.tokens = list(tokens)
+        self.method = method
+        self.arrays = arrays
+        self.error = error
+        self.token_to_row = {token: row for row, token in enumerate(self.tokens)}
+        self.dequantized = None
+
+    @classmethod
+    def from_store(cls, embedding_store, method, **quantize_options):
+        """ Quantize an EmbeddingStore and measure the reconstruction error
+
+            Arguments:
+                embedding_store: The EmbeddingStore to quantize
+                method: One of QUANTIZATION_METHODS
+                quantize_options: Keyword arguments passed to quantize()
+        """
+        arrays = quantize(embedding_store.vectors, method, **quantize_options)
+        error = reconstruction_error(embedding_store.vectors, dequantize(method, arrays))
+        return cls(embedding_store.tokens, method, arrays, error)
+
+    @property
+    def vectors(self):
+        if self.dequantized is None:
+            self.dequantized = dequantize(self.method, self.arrays)
+        return self.dequantized
+
+    @property
+    def vector_length(self):
+        if self.method == 'pq':
+            codebook = self.arrays['codebook']
+            return codebook.shape[0] * codebook.shape[2]
+        return self.arrays['codes'].shape[1]
+
+    def __getitem__(self, token):
+        return dequantize(self.method, self.arrays, np.array([self.token_to_row[token]]))[0]
+
+    @classmethod
+    def load(cls, path_prefix, mmap=True):
+        """ Load a store saved by save(). The arrays are always read into memory, since they are small. """
+        with open(path_prefix + QUANTIZED_INFO_SUFFIX, 'r') as info_file:
+            info = json.load(info_file)
+        with np.load(path_prefix + QUANTIZED_ARRAYS_SUFFIX) as quantized_arrays:
+            arrays = {name: quantized_arrays[name] for name in quantized_arrays.files}
+        return cls(info['tokens'], info['method'], arrays, info.get('reconstruction_error'))
+
+    def save(self, path_prefix):
+        """ Save the store as <path_prefix>.quantized.npz and <path_prefix>.quantized.json
+
+            Arguments:
+                path_prefix: The path prefix of the store files
+        """
+        target_dir = os.path.dirname(path_prefix)
+        if target_dir and not os.path.exists(target_dir):
+            os.makedirs(target_dir)
+        np.savez(path_prefix + QUANTIZED_ARRAYS_SUFFIX, **self.arrays)
+        with open(path_prefix + QUANTIZED_INFO_SUFFIX, 'w') as info_file:
+            json.dump({'method': self.method, 'reconstruction_error': self.error, 'tokens': self.tokens}, info_file)
+
+    def lookup(self, tokens, missing='raise'):
+        """ Look up and dequantize the embeddings of many tokens at once
+
+            Arguments:
+                tokens: An iterable of tokens
+                missing: What to do with unknown tokens: 'raise' a KeyError or return a 'zero' vector
+
+            Returns:
+                A (number of tokens, vector length) float32 array
+        """
+        if missing == 'raise':
+            return dequantize(self.method, self.arrays, self.rows(tokens, missing_row=None))
+        elif missing == 'zero':
+            rows = self.rows(tokens)
+            vectors = np.zeros((len(rows), self.vector_length), dtype=np.float32)
+            known = rows >= 0
+            vectors[known] = dequantize(self.method, self.arrays, rows[known])
+            return vectors
+        else:
+            raise ValueError('Unknown missing token option: {}'.format(missing))
+
+    def as_dict(self):
+        return {token: vector for token, vector in zip(self.tokens, self.vectors)}
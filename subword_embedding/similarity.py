@@ -0,0 +1,154 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from .embedding_io import EMBEDDING_ENCODING
+
+
+DEFAULT_CACHE_SIZE = 4096
+QUERY_BATCH_SIZE = 1024
+
+
+class NeighbourIndex(object):
+    """ A cosine similarity index over the rows of an EmbeddingStore.
+
+        The rows are normalised once, so that a batch of queries is answered by a single matrix product
+        followed by argpartition to select the top-k rows. The neighbours of recently queried tokens are
+        kept in a bounded LRU cache.
+    """
+    def __init__(self, embedding_store, cache_size=DEFAULT_CACHE_SIZE):
+        """ Initialise the NeighbourIndex object
+
+            Arguments:
+                embedding_store: The EmbeddingStore to index
+                cache_size: The maximum number of cached token queries (0 disables the cache)
+        """
+        self.store = embedding_store
+        self.normalised = self.normalise(embedding_store.vectors)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalise(vectors):
+        """ Scale the rows of a matrix to unit length (leaving zero rows at zero) """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def query_vectors(self, query_vectors, k=10, exclude_rows=None):
+        """ Find the k rows most cosine-similar to each of a batch of query vectors
+
+            Arguments:
+                query_vectors: A (number of queries, vector length) array
+                k: The number of neighbours to return per query
+                exclude_rows: An optional array with a row to exclude for every query (e.g. the query itself),
+                              where negative values exclude nothing
+
+            Returns:
+                A tuple of the (number of queries, k) arrays of neighbour rows and similarities, most similar first
+        """
+        similarities = self.normalise(query_vectors).dot(self.normalised.T)
+        if exclude_rows is not None:
+            exclude_rows = np.asarray(exclude_rows)
+            excluded = exclude_rows >= 0
+            similarities[np.flatnonzero(excluded), exclude_rows[excluded]] = -np.inf
+
+        num_rows = similarities.shape[1]
+        k = min(k, num_rows - (1 if exclude_rows is not None and excluded.any() else 0))
+        if k <= 0:
+            empty = np.zeros((len(similarities), 0))
+            return empty.astype(np.int64), empty
+        if k < num_rows:
+            top_rows = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        else:
+            top_rows = np.tile(np.arange(num_rows), (len(similarities), 1))
+        query_idx = np.arange(len(similarities))[:, None]
+        top_similarities = similarities[query_idx, top_rows]
+        order = np.argsort(-top_similarities, axis=1, kind='mergesort')
+        return top_rows[query_idx, order], top_similarities[query_idx, order]
+
+    def query(self, tokens, k=10, exclude_self=True):
+        """ Find the nearest neighbours of a batch of tokens in the index
+
+            Arguments:
+                tokens: A list of tokens in the store
+                k: The number of neighbours to return per token
+                exclude_self: Boolean for whether a token is excluded from its own neighbours
+
+            Returns:
+                A list with, for every token, a list of (neighbour token, cosine similarity) tuples
+
+            Raises:
+                KeyError: If any of the tokens is not in the store
+        """
+        unknown_tokens = self.unknown_tokens(tokens)
+        if unknown_tokens:
+            raise KeyError('The subword units {} are not in the embedding'.format(unknown_tokens))
+
+        results = [None] * len(tokens)
+        uncached = []
+        for i, token in enumerate(tokens):
+            key = (token, k, exclude_self)
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                results[i] = self.cache[key]
+            else:
+                self.misses += 1
+                uncached.append(i)
+
+        for batch_start in range(0, len(uncached), QUERY_BATCH_SIZE):
+            batch = uncached[batch_start:batch_start + QUERY_BATCH_SIZE]
+            rows = self.store.rows([tokens[i] for i in batch], missing_row=None)
+            neighbour_rows, similarities = self.query_vectors(
+                self.normalised[rows], k, exclude_rows=rows if exclude_self else None
+            )
+            for i, token_rows, token_similarities in zip(batch, neighbour_rows.tolist(), similarities.tolist()):
+                neighbours = [
+                    (self.store.tokens[row], similarity) for row, similarity in zip(token_rows, token_similarities)
+                ]
+                results[i] = neighbours
+                self.add_to_cache((tokens[i], k, exclude_self), neighbours)
+        return results
+
+    def unknown_tokens(self, tokens):
+        """ The tokens which are not in the store, in the order given """
+        return [token for token in tokens if token not in self.store]
+
+    def add_to_cache(self, key, neighbours):
+        if self.cache_size <= 0:
+            return
+        self.cache[key] = neighbours
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def neighbour_table(self, k=10):
+        """ Generator over (token, neighbours) for the whole vocabulary, queried in batches """
+        for batch_start in range(0, len(self.store), QUERY_BATCH_SIZE):
+            batch_tokens = self.store.tokens[batch_start:batch_start + QUERY_BATCH_SIZE]
+            for token, neighbours in zip(batch_tokens, self.query(batch_tokens, k)):
+                yield token, neighbours
+
+
+def write_neighbour_table(neighbour_index, target_file, k=10, tokens=None):
+    """ Write the nearest neighbours of tokens as tab separated 'token neighbour:similarity ...' lines
+
+        Arguments:
+            neighbour_index: The NeighbourIndex to query
+            target_file: The path name of the table to write
+            k: The number of neighbours per token
+            tokens: An optional list of tokens to query (defaults to the whole vocabulary)
+    """
+    if tokens is None:
+        table = neighbour_index.neighbour_table(k)
+    else:
+        table = zip(tokens, neighbour_index.query(tokens, k))
+
+    with open(target_file, 'w', encoding=EMBEDDING_ENCODING) as table_file:
+        for token, neighbours in table:
+            table_file.write('\t'.join(
+                [token] + ['{}:{:.4f}'.format(neighbour, similarity) for neighbour, similarity in neighbours]
+            ) + '\n')
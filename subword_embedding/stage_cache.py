@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+
+# Bump to invalidate every cached artifact when the format of an artifact changes
+CACHE_VERSION = 1
+DEFAULT_CACHE_SIZE_MB = 10240
+DIGESTS_FILE = 'digests.json'
+ENTRY_MANIFEST = 'entry.json'
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def path_size(path_name):
+    """ The size in bytes of a file or of all the files below a directory """
+    if not os.path.isdir(path_name):
+        return os.path.getsize(path_name)
+    return sum(
+        os.path.getsize(os.path.join(dir_path, file_name))
+        for dir_path, _, file_names in os.walk(path_name) for file_name in file_names
+    )
+
+
+def modification_time(path_name):
+    """ The latest modification time in ns of a file or of the files below a directory """
+    if not os.path.isdir(path_name):
+        return os.stat(path_name).st_mtime_ns
+    return max(
+        [os.stat(os.path.join(dir_path, file_name)).st_mtime_ns
+         for dir_path, _, file_names in os.walk(path_name) for file_name in file_names] or [0]
+    )
+
+
+def copy_path(source, target):
+    """ Copy a file or directory, replacing the target """
+    target_dir = os.path.dirname(target)
+    if target_dir and not os.path.exists(target_dir):
+        os.makedirs(target_dir)
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    if os.path.isdir(source):
+        shutil.copytree(source, target)
+    else:
+        shutil.copy2(source, target)
+
+
+class StageCache(object):
+    """ A content-addressed cache of the artifacts (output files and directories) of the pipeline stages.
+
+        Each entry is a directory named by the stage and a hash of everything the stage's outputs depend on: the
+        content of its input files, the options which change its outputs and the key of the upstream stage. A
+        rerun with the same key restores the artifacts instead of running the stage, and keys are chained so that
+        changing an input invalidates every stage after it. The total size of the entries is bounded, evicting
+        the least recently used entries first.
+
+        Hashing large inputs (e.g. the MLF) is avoided on reruns by remembering the digest of each file together
+        with its size and modification time.
+    """
+    def __init__(self, cache_dir, max_size_mb=DEFAULT_CACHE_SIZE_MB):
+        """ Initialise the StageCache object
+
+            Arguments:
+                cache_dir: The cache directory, which is created if needed
+                max_size_mb: The bound on the total size of the cached artifacts in MB
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.digests_path = os.path.join(cache_dir, DIGESTS_FILE)
+        if os.path.exists(self.digests_path):
+            with open(self.digests_path, 'r') as digests_file:
+                self.digests = json.load(digests_file)
+        else:
+            self.digests = {}
+
+    def file_digest(self, path_name):
+        """ The SHA-1 digest of the content of a file, reusing the remembered digest if the file is unchanged """
+        abs_path = os.path.abspath(path_name)
+        file_stat = os.stat(abs_path)
+        signature = [file_stat.st_size, file_stat.st_mtime_ns]
+        remembered = self.digests.get(abs_path)
+        if remembered is not None and remembered[:2] == signature:
+            return remembered[2]
+
+        hasher = hashlib.sha1()
+        with open(abs_path, 'rb') as input_file:
+            for block in iter(lambda: input_file.read(HASH_BLOCK_SIZE), b''):
+                hasher.update(block)
+        digest = hasher.hexdigest()
+        self.digests[abs_path] = signature + [digest]
+        temp_path = self.digests_path + '.tmp'
+        with open(temp_path, 'w') as digests_file:
+            json.dump(self.digests, digests_file)
+        os.replace(temp_path, self.digests_path)
+        return digest
+
+    def key(self, stage, input_files=(), options=None, upstream_key=None):
+        """ The cache key of a stage
+
+            Arguments:
+                stage: The name of the stage
+                input_files: The files whose content the stage reads
+                options: A JSON serialisable dictionary of the options which change the stage's outputs
+                upstream_key: The key of the stage which produced this stage's inputs, if it was cached
+
+            Returns:
+                The key as a hex string
+        """
+        hasher = hashlib.sha1()
+        hasher.update(json.dumps(
+            [CACHE_VERSION, stage, upstream_key, options or {}], sort_keys=True
+        ).encode('utf-8'))
+        for path_name in input_files:
+            hasher.update(self.file_digest(path_name).encode('utf-8'))
+        return hasher.hexdigest()
+
+    def entry_dir(self, stage, key):
+        return os.path.join(self.cache_dir, '{}-{}'.format(stage, key))
+
+    def restore(self, stage, key, artifacts):
+        """ Copy the cached artifacts of a stage to where they are expected
+
+            Arguments:
+                stage: The name of the stage
+                key: The cache key of the stage
+                artifacts: A dictionary mapping artifact names to their path names
+
+            Returns:
+                Whether the stage was cached (in which case its artifacts have been restored)
+        """
+        entry_dir = self.entry_dir(stage, key)
+        manifest_path = os.path.join(entry_dir, ENTRY_MANIFEST)
+        if not os.path.exists(manifest_path):
+            return False
+        with open(manifest_path, 'r') as manifest_file:
+            cached_names = json.load(manifest_file)['artifacts']
+        if not set(name for name, path_name in artifacts.items() if path_name) <= set(cached_names):
+            return False
+
+        for name in cached_names:
+            if artifacts.get(name):
+                copy_path(os.path.join(entry_dir, name), artifacts[name])
+        # The modification time of the manifest records when the entry was last used
+        os.utime(manifest_path)
+        return True
+
+    @staticmethod
+    def snapshot(artifacts):
+        """ The modification times of the artifacts before a stage runs, to pass to store() """
+        return dict(
+            (name, modification_time(path_name) if path_name and os.path.exists(path_name) else None)
+            for name, path_name in artifacts.items()
+        )
+
+    def store(self, stage, key, artifacts, snapshot=None):
+        """ Add the artifacts of a stage to the cache and evict the least recently used entries beyond the bound
+
+            Arguments:
+                stage: The name of the stage
+                key: The cache key of the stage
+                artifacts: A dictionary mapping artifact names to their path names (None for unused artifacts)
+                snapshot: If given, the snapshot() taken before the stage ran. Artifacts which were not rewritten
+                          since are stale (e.g. when a trainer left a previous embedding in place), and the stage
+                          is then not cached.
+
+            Returns:
+                Whether the artifacts were cached
+        """
+        artifacts = dict((name, path_name) for name, path_name in artifacts.items() if path_name)
+        for name, path_name in artifacts.items():
+            if not os.path.exists(path_name) or \
+                    (snapshot is not None and snapshot.get(name) == modification_time(path_name)):
+                print('Not caching the {} stage, since {} was not written'.format(stage, path_name))
+                return False
+
+        entry_dir = self.entry_dir(stage, key)
+        temp_dir = entry_dir + '.tmp'
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+        os.makedirs(temp_dir)
+        for name, path_name in artifacts.items():
+            copy_path(path_name, os.path.join(temp_dir, name))
+        with open(os.path.join(temp_dir, ENTRY_MANIFEST), 'w') as manifest_file:
+            json.dump({'stage': stage, 'artifacts': sorted(artifacts), 'created': time.time()}, manifest_file)
+        if os.path.exists(entry_dir):
+            shutil.rmtree(entry_dir)
+        os.rename(temp_dir, entry_dir)
+        self.evict()
+        return os.path.exists(entry_dir)
+
+    def evict(self):
+        """ Remove the least recently used entries until the cache fits in its size bound """
+        entries = []
+        for entry_name in os.listdir(self.cache_dir):
+            manifest_path = os.path.join(self.cache_dir, entry_name, ENTRY_MANIFEST)
+            if os.path.exists(manifest_path):
+                entry_dir = os.path.join(self.cache_dir, entry_name)
+                entries.append((os.path.getmtime(manifest_path), path_size(entry_dir), entry_dir))
+        total_bytes = sum(entry_bytes for _, entry_bytes, _ in entries)
+        for _, entry_bytes, entry_dir in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            print('Evicting {} from the stage cache'.format(entry_dir))
+            shutil.rmtree(entry_dir)
+            total_bytes -= entry_bytes
@@ -0,0 +1,1173 @@
+from array import array
+from collections import Counter, OrderedDict
+import json
+from multiprocessing import Pool
+import os
+import re
+import shutil
+import tempfile
+
+import numpy as np
+
+from .binary_corpus import BinaryCorpusWriter, write_binary_corpus
+from .corpus_statistics import (
+    min_count_mapping, ngram_counts, save_subword_counts, subsample_mask, token_counts, SUBSAMPLE_SEED, UNK_TOKEN
+)
+from .ngram_context import ngram_context, PLAIN_CONTEXT_SEPARATOR, POSITION_CONTEXT_SEPARATOR
+from .utils import to_float, remove_comment_elements
+
+
+TIME_SCALE_FACTOR = 1e9
+DECIMAL_PLACES = 6
+POSN_INFO_LEN = 2
+APOSTROPHE_TOKEN = 'A'
+MLF_ENCODING = 'utf-8'
+SHARDS_PER_WORKER = 4
+SENTENCES_PER_BATCH = 256
+PIPELINE_SHARD_BYTES = 4 * 1024 * 1024
+SUBWORD_CONTEXT_PATTERN = re.compile(r'\+|\-')
+
+def extract_arc(arc_string):
+    """ Split a raw arc line into its start time (s), end time (s), raw subword label and negative log score
+    """
+    start_time, end_time, subword_info, neg_log_score = to_float(arc_string.split())
+    start_time_s = round(start_time / TIME_SCALE_FACTOR, DECIMAL_PLACES)
+    end_time_s = round(end_time / TIME_SCALE_FACTOR, DECIMAL_PLACES)
+    return start_time_s, end_time_s, subword_info, neg_log_score
+
+
+def strip_subword(subword_info, subword_context_width, incl_posn_info, apostrophe_embedding):
+    """ Strip subwords of context and optionally the location indicator
+
+        Arguments:
+            subword_info: String with the full subword context information and location indicators.
+            subword_context_width: The subword context width as an integer (the number of grams to consider)
+            incl_posn_info: A boolean indicator for whether or not to include the subword position information (^I, ^M, ^F)
+            apostrophe_embedding: Boolean which determines whether apostrophes are modelled as separate subword units
+    """
+    if subword_context_width > 3:
+        raise Exception(
+            'The subword context width cannot be greater than 3. Wider context can be derived from the monophone '
+            'sequence instead (see MLFDataset context_direction).'
+        )
+
+    itemised_subword_info = SUBWORD_CONTEXT_PATTERN.split(subword_info)
+    if len(itemised_subword_info) == 1:
+        return itemised_subword_info[0] if incl_posn_info else remove_location_indicator(itemised_subword_info[0], apostrophe_embedding)
+    elif len(itemised_subword_info) == 3:
+        if subword_context_width > 1:
+            # Assume that if the context is 2 (bigram), we want the include the preceding subword unit
+            stop = subword_context_width
+            return ''.join(itemised_subword_info[:stop]) if incl_posn_info else remove_location_indicator(itemised_subword_info[:stop], apostrophe_embedding)
+        else:
+            return itemised_subword_info[1] if incl_posn_info else remove_location_indicator(itemised_subword_info[1], apostrophe_embedding)
+    else:
+        raise Exception('The subword unit length should be 1 or 3, but found {}'.format(len(itemised_subword_info)))
+
+
+def remove_location_indicator(subword_with_location, apostrophe_embedding):
+    """ Strip location indicators from a string or strings within a list and return the result as a string
+
+        Arguments:
+            subword_with_location: Either a string or list containing the raw subword unit with location indicators.
+            apostrophe_embedding: Boolean which determines whether apostrophes are modelled as separate subword units
+    """
+    if isinstance(subword_with_location, list):
+        clean_subword_list = []
+        for subword in subword_with_location:
+            subword_split = subword.split('^')
+            if len(subword_split) == 1:
+                clean_subword_list.append(subword_split[0])
+            else:
+                clean_subword, apostrophe = clean_subword_split(subword_split)
+                if apostrophe_embedding:
+                    clean_subword_list.append(clean_subword)
+                    if apostrophe:
+                        clean_subword_list.append(apostrophe)
+                else:
+                    clean_subword_list.append(clean_subword + apostrophe)
+        return ' '.join(clean_subword_list)
+    else:
+        subword_split = subword_with_location.split('^')
+        if len(subword_split) == 1:
+            return subword_split[0]
+        else:
+            clean_subword, apostrophe = clean_subword_split(subword_split)
+
+            if apostrophe is not None:
+                if apostrophe_embedding:
+                    return ' '.join([clean_subword, apostrophe])
+                else:
+                    return ''.join([clean_subword, apostrophe])
+            else:
+                return clean_subword
+
+
+def clean_subword_split(raw_subword_split):
+    pronunciation = raw_subword_split[1][POSN_INFO_LEN - 1:]
+    if pronunciation.endswith(APOSTROPHE_TOKEN):
+        pronunciation = pronunciation.replace(APOSTROPHE_TOKEN, '')
+        apostrophe = APOSTROPHE_TOKEN
+    else:
+        apostrophe = None
+
+    raw_subword = raw_subword_split[0] + pronunciation
+    return raw_subword, apostrophe
+
+
+class LabelNormaliser(object):
+    """ A memoizing cache in front of strip_subword().
+
+        An MLF only contains a few thousand distinct raw labels spread over millions of arcs, so the
+        normalised form of each (raw label, context width, position flag, apostrophe flag) key is computed
+        once and then looked up. The cache can optionally be bounded, in which case the least recently used
+        entry is evicted. A single instance can be shared across MLFDataset objects in the same process.
+    """
+    def __init__(self, max_size=None):
+        """ Initialise the LabelNormaliser object
+
+            Arguments:
+                max_size: The maximum number of cached labels, or None for an unbounded cache
+        """
+        if max_size is not None and max_size < 1:
+            raise ValueError('The normalisation cache size must be positive, but found {}'.format(max_size))
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.cache)
+
+    def normalise(self, subword_info, subword_context_width, incl_posn_info, apostrophe_embedding):
+        """ Strip a raw subword label of context and optionally the location indicator (see strip_subword())
+        """
+        key = (subword_info, subword_context_width, incl_posn_info, apostrophe_embedding)
+        try:
+            token = self.cache[key]
+        except KeyError:
+            self.misses += 1
+            token = strip_subword(subword_info, subword_context_width, incl_posn_info, apostrophe_embedding)
+            self.cache[key] = token
+            if self.max_size is not None and len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+                self.evictions += 1
+            return token
+
+        self.hits += 1
+        if self.max_size is not None:
+            self.cache.move_to_end(key)
+        return token
+
+    def add_stats(self, hits, misses, evictions=0):
+        """ Accumulate the hit/miss statistics of another normaliser (e.g. one used in a worker process) """
+        self.hits += hits
+        self.misses += misses
+        self.evictions += evictions
+
+    def stats(self):
+        """ A dictionary of the cache statistics """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self.cache),
+            'max_size': self.max_size,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        """ Empty the cache and reset the statistics """
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+# The normaliser shared by all MLFDataset objects which are not given their own
+DEFAULT_NORMALISER = LabelNormaliser()
+# The normaliser of a worker process (see worker_normaliser())
+WORKER_NORMALISER = None
+
+
+def worker_normaliser(max_size):
+    """ The LabelNormaliser of a worker process, which is kept between tasks so that its cache is reused
+
+        Arguments:
+            max_size: The cache size of the normaliser of the dataset which started the worker
+    """
+    global WORKER_NORMALISER
+    if WORKER_NORMALISER is None or WORKER_NORMALISER.max_size != max_size:
+        WORKER_NORMALISER = LabelNormaliser(max_size)
+    return WORKER_NORMALISER
+
+
+class Arc(object):
+    """ Container for the arc information """
+    __slots__ = ('apostrophe_embedding', 'start_time_s', 'end_time_s', 'neg_log_score', 'token')
+
+    def __init__(self, arc_string, subword_context_width, include_position_information=True, apostrophe_embedding=False,
+                 normaliser=None):
+        """ Initialise the Arc object
+
+            Arguments:
+                arc_string: A string line from the unzipped HTK MLF file
+                subword_context_width: The subword context width as an integer (the number of grams to consider)
+                include_position_information: Boolean for whether the position information should be included (^I, ^M, ^F)
+                apostrophe_embedding: Boolean which determines whether apostrophes are modelled as separate subword units
+                normaliser: An optional LabelNormaliser used to memoize the subword label normalisation
+        """
+        self.apostrophe_embedding = apostrophe_embedding
+        self.start_time_s, self.end_time_s, subword_info, self.neg_log_score = self.extract_arc(arc_string)
+        if normaliser is None:
+            self.token = self.strip_subword(subword_info, subword_context_width, include_position_information)
+        else:
+            self.token = normaliser.normalise(
+                subword_info, subword_context_width, include_position_information, apostrophe_embedding
+            )
+
+    def __str__(self):
+        return '{} ---- {} / {} ----> {}'.format(self.start_time_s, self.token, self.neg_log_score, self.end_time_s)
+
+    def extract_arc(self, arc_string):
+        """ Extract arc information and format it such that it is ready to be saved as object attributes
+        """
+        return extract_arc(arc_string)
+
+    def strip_subword(self, subword_info, subword_context_width, incl_posn_info):
+        """ Strip subwords of context and optionally the location indicator (see strip_subword())
+        """
+        return strip_subword(subword_info, subword_context_width, incl_posn_info, self.apostrophe_embedding)
+
+    def remove_location_indicator(self, subword_with_location):
+        """ Strip location indicators from a string or strings within a list (see remove_location_indicator())
+        """
+        return remove_location_indicator(subword_with_location, self.apostrophe_embedding)
+
+
+class SentenceLabels(object):
+    """ A representation of a sentence as a one-best sequence. """
+    __slots__ = ('label_name', 'arc_list', 'start_arc')
+
+    def __init__(self, string_mlf, subword_context_width, include_posn_info, separate_apostrophe_embedding,
+                 normaliser=None):
+        """ Initialise the SentenceLabels object
+
+            Arguments:
+                string_mlf: The raw form of a reference sentence (MLF) as a string
+                subword_context_width: The subword unit context width as an integer
+                include_posn_info: Boolean indicator for whether the position information should be included.
+                separate_apostrophe_embedding: boolean indicator of whether the apostrophe should be viewed
+                                               a distinct subword unit or included within the pronunciation
+                normaliser: An optional LabelNormaliser used to memoize the subword label normalisation
+        """
+        # A chunk may consist solely of comments (e.g. an MLF containing only the #!MLF!# header)
+        one_best_list = remove_comment_elements(string_mlf) if string_mlf else []
+        if one_best_list:
+            self.label_name = one_best_list[0]
+            self.arc_list = self.extract_arcs(
+                one_best_list[1:], subword_context_width, include_posn_info, separate_apostrophe_embedding, normaliser
+            )
+            self.start_arc = self.arc_starts_at_zero()
+        else:
+            self.label_name = None
+            self.arc_list = None
+
+    def __str__(self):
+        viz_arcs = ""
+        for arc in self.arc_list:
+            viz_arcs += (str(arc) + '\n')
+        return "{}\n{}".format(self.label_name, viz_arcs)
+
+    def extract_arcs(self, raw_arcs_list, subword_context_width, include_posn_info, separate_apostrophe_embedding,
+                     normaliser=None):
+        """ Converts a string list of arcs to a list of Arc objects
+
+            Arguments:
+                raw_arcs_list: A list of string arcs
+                subword_context_width: The subword unit context width as an integer
+                include_posn_info: Boolean indicator for whether the position information should be included.
+                separate_apostrophe_embedding: boolean indicator of whether the apostrophe should be viewed
+                                               a distinct subword unit or included within the pronunciation
+                normaliser: An optional LabelNormaliser used to memoize the subword label normalisation
+
+            Returns:
+                arc_list: A list of arcs as Arc objects
+        """
+        arc_list = []
+        for raw_arc in raw_arcs_list:
+            arc_list.append(
+                Arc(raw_arc, subword_context_width, include_posn_info, separate_apostrophe_embedding, normaliser)
+            )
+        return arc_list
+
+    def is_none(self):
+        """ Returns a boolean indicating if the SentenceLabels object is empty
+        """
+        if self.label_name is None and self.arc_list is None:
+            return True
+        else:
+            return False
+
+    def arc_starts_at_zero(self):
+        """ Returns the first arc in the SentenceLabels object
+            (i.e. the arc which has a start time of zero seconds)
+        """
+        for arc in self.arc_list:
+            if arc.start_time_s == 0.0:
+                return arc
+
+    def get_unique_tokens(self):
+        """ Extract all unique sub-word level units in the dataset
+
+            Returns:
+                A set of unique sub-word level units
+        """
+        unique_tokens = set()
+        for arc in self.arc_list:
+            if not arc.token in unique_tokens:
+                unique_tokens.add(arc.token)
+        return unique_tokens
+
+    def sentence(self):
+        """ Combine all tokens on each arc (in order) to generate the original sentence. """
+        return ' '.join([arc.token for arc in self.arc_list])
+
+
+class SubwordVocabulary(object):
+    """ An interned vocabulary mapping subword tokens to contiguous integer IDs """
+    __slots__ = ('tokens', 'token_to_id')
+
+    def __init__(self, tokens=None):
+        """ Initialise the SubwordVocabulary object
+
+            Arguments:
+                tokens: An optional iterable of tokens to intern in order
+        """
+        self.tokens = []
+        self.token_to_id = {}
+        for token in tokens or []:
+            self.intern(token)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __contains__(self, token):
+        return token in self.token_to_id
+
+    def intern(self, token):
+        """ Return the ID of a token, adding it to the vocabulary if it is new """
+        token_id = self.token_to_id.get(token)
+        if token_id is None:
+            token_id = len(self.tokens)
+            self.token_to_id[token] = token_id
+            self.tokens.append(token)
+        return token_id
+
+    def token_array(self):
+        """ The tokens as a NumPy object array so that ID arrays can be mapped back to tokens by indexing """
+        token_array = np.empty(len(self.tokens), dtype=object)
+        token_array[:] = self.tokens
+        return token_array
+
+
+class CompactMLF(object):
+    """ Columnar storage of the one-best sequences in an MLF.
+
+        Rather than one Python object per arc, the arcs of all utterances are stored back to back in NumPy
+        arrays: token IDs (into a SubwordVocabulary), start and end times and scores. The arcs of utterance
+        i are those in [offsets[i], offsets[i + 1]). Utterances are appended while parsing and the arrays
+        are built by finalise().
+    """
+    def __init__(self, vocabulary=None):
+        """ Initialise the CompactMLF object
+
+            Arguments:
+                vocabulary: An optional SubwordVocabulary to intern tokens into (e.g. to share IDs across datasets)
+        """
+        self.vocabulary = vocabulary if vocabulary is not None else SubwordVocabulary()
+        self.label_names = []
+        # Compact typed buffers used while parsing, converted to NumPy arrays by finalise()
+        self._token_ids = array('I')
+        self._start_times = array('d')
+        self._end_times = array('d')
+        self._scores = array('d')
+        self._offsets = array('q', [0])
+        self.token_ids = None
+        self.start_times = None
+        self.end_times = None
+        self.scores = None
+        self.offsets = None
+
+    def __len__(self):
+        return len(self.label_names)
+
+    def __getitem__(self, utterance_idx):
+        if utterance_idx < 0:
+            utterance_idx += len(self)
+        if not 0 <= utterance_idx < len(self):
+            raise IndexError('Utterance index out of range')
+        return SentenceView(self, utterance_idx)
+
+    def __iter__(self):
+        for utterance_idx in range(len(self)):
+            yield SentenceView(self, utterance_idx)
+
+    @property
+    def num_arcs(self):
+        return int(self.offsets[-1]) if self.offsets is not None else len(self._token_ids)
+
+    def append_utterance(self, string_mlf, subword_context_width, incl_posn_info, separate_apostrophe_embedding,
+                         normaliser=None):
+        """ Parse a raw utterance from the MLF and append its arcs to the columnar buffers
+
+            Arguments:
+                string_mlf: The raw form of a reference sentence (MLF) as a string
+                subword_context_width: The subword unit context width as an integer
+                incl_posn_info: Boolean indicator for whether the position information should be included.
+                separate_apostrophe_embedding: boolean indicator of whether the apostrophe should be viewed
+                                               a distinct subword unit or included within the pronunciation
+                normaliser: An optional LabelNormaliser used to memoize the subword label normalisation
+
+            Returns:
+                A boolean indicating whether an utterance was appended (False for empty chunks)
+        """
+        one_best_list = remove_comment_elements(string_mlf) if string_mlf else []
+        if not one_best_list:
+            return False
+
+        self.label_names.append(one_best_list[0])
+        normalise = strip_subword if normaliser is None else normaliser.normalise
+        for raw_arc in one_best_list[1:]:
+            start_time_s, end_time_s, subword_info, neg_log_score = extract_arc(raw_arc)
+            token = normalise(subword_info, subword_context_width, incl_posn_info, separate_apostrophe_embedding)
+            self._token_ids.append(self.vocabulary.intern(token))
+            self._start_times.append(start_time_s)
+            self._end_times.append(end_time_s)
+            self._scores.append(neg_log_score)
+        self._offsets.append(len(self._token_ids))
+        return True
+
+    def finalise(self):
+        """ Convert the parsing buffers into NumPy arrays """
+        self.token_ids = np.frombuffer(self._token_ids, dtype=np.uint32)
+        self.start_times = np.frombuffer(self._start_times, dtype=np.float64)
+        self.end_times = np.frombuffer(self._end_times, dtype=np.float64)
+        self.scores = np.frombuffer(self._scores, dtype=np.float64)
+        self.offsets = np.frombuffer(self._offsets, dtype=np.int64)
+
+    def utterance_token_ids(self, utterance_idx):
+        """ The token ID array of a single utterance """
+        return self.token_ids[self.offsets[utterance_idx]:self.offsets[utterance_idx + 1]]
+
+    def unique_token_ids(self):
+        """ The sorted array of token IDs which occur in the corpus """
+        return np.flatnonzero(np.bincount(self.token_ids, minlength=len(self.vocabulary)))
+
+    def unique_tokens(self):
+        """ The set of tokens which occur in the corpus """
+        return set(self.vocabulary.token_array()[self.unique_token_ids()])
+
+    def sentences(self):
+        """ Generator over the sentence strings of every utterance """
+        token_array = self.vocabulary.token_array()
+        for start, end in zip(self.offsets[:-1], self.offsets[1:]):
+            yield ' '.join(token_array[self.token_ids[start:end]])
+
+    def corpus(self):
+        """ Generate a text corpus with one sentence per line """
+        return '\n'.join(self.sentences())
+
+    def with_ngram_context(self, subword_context_width, direction='both', separator=POSITION_CONTEXT_SEPARATOR):
+        """ Derive a CompactMLF of subword n-grams from this one, whose tokens are taken to be monophones
+
+            The times, scores and utterance boundaries are shared with this CompactMLF.
+
+            Arguments:
+                subword_context_width: The number of units in each n-gram
+                direction: 'left', 'right' or 'both' (see ngram_context.context_extent())
+                separator: The string placed between the units of an n-gram (see ngram_context.ngram_tokens())
+        """
+        ngram_ids, ngram_tokens = ngram_context(
+            self.token_ids, self.offsets, self.vocabulary.tokens, subword_context_width, direction, separator
+        )
+        derived = self.select_arcs(None)
+        derived.vocabulary = SubwordVocabulary(ngram_tokens)
+        derived.token_ids = ngram_ids
+        return derived
+
+    def token_counts(self):
+        """ The number of occurrences of every token ID in the vocabulary """
+        return token_counts(self.token_ids, len(self.vocabulary))
+
+    def prune_vocabulary(self, min_count):
+        """ Derive a CompactMLF in which the tokens seen fewer than min_count times are replaced by UNK_TOKEN
+
+            Arguments:
+                min_count: The minimum count of a token to keep it
+        """
+        id_map, kept, unk_id = min_count_mapping(self.token_counts(), min_count)
+        tokens = [self.vocabulary.tokens[token_id] for token_id in kept.tolist()]
+        if unk_id is not None:
+            tokens.append(UNK_TOKEN)
+        derived = self.select_arcs(None)
+        derived.vocabulary = SubwordVocabulary(tokens)
+        derived.token_ids = id_map[self.token_ids].astype(np.uint32)
+        return derived
+
+    def subsample(self, threshold, seed=SUBSAMPLE_SEED):
+        """ Derive a CompactMLF in which frequent tokens are randomly dropped, as word2vec does while training
+
+            Arguments:
+                threshold: The subsampling threshold (see corpus_statistics.keep_probabilities())
+                seed: The seed of the random draws
+        """
+        return self.select_arcs(subsample_mask(self.token_ids, self.token_counts(), threshold, seed))
+
+    def select_arcs(self, arc_mask):
+        """ Derive a CompactMLF holding the arcs selected by a boolean mask (or all arcs if it is None),
+            sharing the vocabulary and keeping every utterance, even if all of its arcs are dropped
+        """
+        derived = CompactMLF(self.vocabulary)
+        derived.label_names = self.label_names
+        if arc_mask is None:
+            derived.token_ids, derived.start_times, derived.end_times, derived.scores, derived.offsets = (
+                self.token_ids, self.start_times, self.end_times, self.scores, self.offsets
+            )
+            return derived
+
+        utterance_idx = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+        kept_per_utterance = np.bincount(utterance_idx[arc_mask], minlength=len(self))
+        derived.offsets = np.concatenate([[0], np.cumsum(kept_per_utterance)]).astype(np.int64)
+        derived.token_ids = self.token_ids[arc_mask]
+        derived.start_times = self.start_times[arc_mask]
+        derived.end_times = self.end_times[arc_mask]
+        derived.scores = self.scores[arc_mask]
+        return derived
+
+
+class ArcView(object):
+    """ A lightweight view of a single arc stored in a CompactMLF, with the same attributes as an Arc """
+    __slots__ = ('store', 'arc_idx')
+
+    def __init__(self, store, arc_idx):
+        self.store = store
+        self.arc_idx = arc_idx
+
+    def __str__(self):
+        return '{} ---- {} / {} ----> {}'.format(self.start_time_s, self.token, self.neg_log_score, self.end_time_s)
+
+    @property
+    def start_time_s(self):
+        return float(self.store.start_times[self.arc_idx])
+
+    @property
+    def end_time_s(self):
+        return float(self.store.end_times[self.arc_idx])
+
+    @property
+    def neg_log_score(self):
+        return float(self.store.scores[self.arc_idx])
+
+    @property
+    def token_id(self):
+        return int(self.store.token_ids[self.arc_idx])
+
+    @property
+    def token(self):
+        return self.store.vocabulary.tokens[self.token_id]
+
+
+class SentenceView(object):
+    """ A lightweight view of a single utterance stored in a CompactMLF, with the same interface as SentenceLabels """
+    __slots__ = ('store', 'utterance_idx')
+
+    def __init__(self, store, utterance_idx):
+        self.store = store
+        self.utterance_idx = utterance_idx
+
+    def __str__(self):
+        viz_arcs = ""
+        for arc in self.arc_list:
+            viz_arcs += (str(arc) + '\n')
+        return "{}\n{}".format(self.label_name, viz_arcs)
+
+    @property
+    def label_name(self):
+        return self.store.label_names[self.utterance_idx]
+
+    @property
+    def token_ids(self):
+        return self.store.utterance_token_ids(self.utterance_idx)
+
+    @property
+    def arc_list(self):
+        start, end = self.store.offsets[self.utterance_idx:self.utterance_idx + 2]
+        return [ArcView(self.store, arc_idx) for arc_idx in range(start, end)]
+
+    @property
+    def start_arc(self):
+        return self.arc_starts_at_zero()
+
+    def is_none(self):
+        return False
+
+    def arc_starts_at_zero(self):
+        """ Returns the first arc which has a start time of zero seconds """
+        start, end = self.store.offsets[self.utterance_idx:self.utterance_idx + 2]
+        zero_start = np.flatnonzero(self.store.start_times[start:end] == 0.0)
+        if len(zero_start) > 0:
+            return ArcView(self.store, start + zero_start[0])
+
+    def get_unique_tokens(self):
+        """ Extract all unique sub-word level units in the utterance """
+        token_array = self.store.vocabulary.token_array()
+        return set(token_array[np.unique(self.token_ids)])
+
+    def sentence(self):
+        """ Combine all tokens on each arc (in order) to generate the original sentence. """
+        tokens = self.store.vocabulary.tokens
+        return ' '.join([tokens[token_id] for token_id in self.token_ids.tolist()])
+
+
+def iter_mlf_utterances(mlf_lines):
+    """ Lazily group the lines of an MLF file into raw utterance strings.
+
+        Utterances are delimited by a line containing a single '.', exactly as in
+        the '\n.\n' split used when the whole file is held in memory.
+
+        Arguments:
+            mlf_lines: An iterable over the lines of an MLF file (e.g. an open file object)
+    """
+    utterance_lines = []
+    for line in mlf_lines:
+        line = line.rstrip('\n')
+        if line == '.':
+            yield '\n'.join(utterance_lines)
+            utterance_lines = []
+        else:
+            utterance_lines.append(line)
+    if utterance_lines:
+        yield '\n'.join(utterance_lines)
+
+
+def utterance_label_name(string_mlf):
+    """ The label name of a raw utterance (its first line which is not a comment) without parsing its arcs
+
+        Arguments:
+            string_mlf: The raw form of a reference sentence (MLF) as a string
+    """
+    for line in string_mlf.split('\n'):
+        if not line.startswith('#'):
+            return line
+
+
+def find_shard_offsets(path_to_mlf, num_shards):
+    """ Split an MLF file into byte ranges which start and end on utterance boundaries
+
+        Each boundary is placed just after a '.' line, so that every shard contains whole utterances.
+
+        Arguments:
+            path_to_mlf: The path to the MLF file as a string
+            num_shards: The desired number of shards. Fewer may be returned for small files.
+
+        Returns:
+            A list of (start, end) byte offsets covering the entire file in order
+    """
+    file_size = os.path.getsize(path_to_mlf)
+    boundaries = [0]
+    with open(path_to_mlf, 'rb') as mlf_file:
+        for shard_idx in range(1, num_shards):
+            target_offset = file_size * shard_idx // num_shards
+            if target_offset <= boundaries[-1]:
+                continue
+            # Step back a byte so that readline() lands on the start of the line after the target offset
+            mlf_file.seek(target_offset - 1)
+            mlf_file.readline()
+            offset = file_size
+            for line in iter(mlf_file.readline, b''):
+                if line.rstrip(b'\r\n') == b'.':
+                    offset = mlf_file.tell()
+                    break
+            if offset >= file_size:
+                break
+            boundaries.append(offset)
+    boundaries.append(file_size)
+    return [(start, end) for start, end in zip(boundaries[:-1], boundaries[1:]) if end > start]
+
+
+def iter_shard_lines(mlf_file, start, end):
+    """ Iterate over the decoded lines of a binary MLF file object within the byte range [start, end)
+
+        Arguments:
+            mlf_file: An MLF file object opened in binary mode
+            start: The byte offset of the first line
+            end: The byte offset at which to stop (which must fall on a line boundary)
+    """
+    mlf_file.seek(start)
+    position = start
+    while position < end:
+        line = mlf_file.readline()
+        if not line:
+            break
+        position += len(line)
+        if line.endswith(b'\r\n'):
+            line = line[:-2] + b'\n'
+        yield line.decode(MLF_ENCODING)
+
+
+def parse_mlf_shard(shard_info):
+    """ Parse a single shard of an MLF file and write its part of the text corpus to a part file.
+        This is the process pool worker used by MLFDataset when parsing with multiple workers.
+
+        Arguments:
+            shard_info: A tuple of (path_to_mlf, start, end, subword_context_width, incl_posn_info,
+                        separate_apostrophe_embedding, part_file, norm_cache_size)
+
+        Returns:
+            A tuple of the part file path, the number of sentences written, the Counter of the subword units and
+            the (hits, misses, evictions) of the worker's label normalisation cache while parsing the shard
+    """
+    (path_to_mlf, start, end, subword_context_width, incl_posn_info,
+     separate_apostrophe_embedding, part_file, norm_cache_size) = shard_info
+
+    normaliser = worker_normaliser(norm_cache_size)
+    initial_stats = (normaliser.hits, normaliser.misses, normaliser.evictions)
+    subword_counts = Counter()
+    num_sentences = 0
+    with open(part_file, 'w', encoding=MLF_ENCODING) as corpus_part:
+        for mlf_labels in iter_shard_labels(
+                path_to_mlf, start, end, subword_context_width, incl_posn_info, separate_apostrophe_embedding,
+                normaliser):
+            if num_sentences > 0:
+                corpus_part.write('\n')
+            corpus_part.write(mlf_labels.sentence())
+            subword_counts.update(arc.token for arc in mlf_labels.arc_list)
+            num_sentences += 1
+    cache_stats = (
+        normaliser.hits - initial_stats[0], normaliser.misses - initial_stats[1],
+        normaliser.evictions - initial_stats[2]
+    )
+    return part_file, num_sentences, subword_counts, cache_stats
+
+
+def parse_mlf_shard_sentences(shard_info):
+    """ Parse a single shard of an MLF file into its corpus sentences.
+        This is the process pool worker used by MLFDataset.iter_sentence_batches().
+
+        Arguments:
+            shard_info: A tuple of (path_to_mlf, start, end, subword_context_width, incl_posn_info,
+                        separate_apostrophe_embedding, norm_cache_size)
+
+        Returns:
+            A tuple of the list of sentences, the Counter of the subword units and the (hits, misses, evictions)
+            of the worker's label normalisation cache while parsing the shard
+    """
+    normaliser = worker_normaliser(shard_info[-1])
+    initial_stats = (normaliser.hits, normaliser.misses, normaliser.evictions)
+    sentences = []
+    subword_counts = Counter()
+    for mlf_labels in iter_shard_labels(*(shard_info[:-1] + (normaliser,))):
+        sentences.append(mlf_labels.sentence())
+        subword_counts.update(arc.token for arc in mlf_labels.arc_list)
+    cache_stats = (
+        normaliser.hits - initial_stats[0], normaliser.misses - initial_stats[1],
+        normaliser.evictions - initial_stats[2]
+    )
+    return sentences, subword_counts, cache_stats
+
+
+def iter_shard_labels(path_to_mlf, start, end, subword_context_width, incl_posn_info, separate_apostrophe_embedding,
+                      normaliser):
+    """ Generator over the SentenceLabels of the non-empty utterances in the byte range [start, end) of an MLF """
+    with open(path_to_mlf, 'rb') as mlf_file:
+        for string_sentence in iter_mlf_utterances(iter_shard_lines(mlf_file, start, end)):
+            mlf_labels = SentenceLabels(
+                string_sentence, subword_context_width, incl_posn_info, separate_apostrophe_embedding, normaliser
+            )
+            if not mlf_labels.is_none():
+                yield mlf_labels
+
+
+class MLFDataset(object):
+    """ A class for containing the sub-word marked one-best reference sequences described in the MLF file """
+    def __init__(self, path_to_mlf, subword_context_width, incl_posn_info, separate_apostrophe_embedding,
+                 streaming=False, workers=1, compact=False, vocabulary=None, normaliser=None,
+                 context_direction=None, min_count=1, subsample_threshold=None):
+        """ Initialises the MLFDataset object
+
+            Arguments:
+                path_to_mlf: The path to the MLF file as a string
+                subword_context_width: Integer indicator of whether to use monophones, biphones, triphones, etc
+                incl_posn_info: Boolean indicator for whether the position information should be included.
+                separate_apostrophe_embedding: boolean indicator of whether the apostrophe should be viewed
+                                               a distinct subword unit or included within the pronunciation
+                streaming: Boolean indicator for whether to avoid holding the parsed MLF in memory. In streaming
+                           mode the utterances are parsed lazily by write_corpus() and the unique subword set is
+                           only populated once the corpus has been written.
+                workers: The number of processes used to parse the MLF. With more than one worker the MLF is
+                         split into shards at utterance boundaries and parsed in a process pool when the
+                         corpus is written (this implies streaming). The output is identical to the serial path.
+                compact: Boolean indicator for whether to hold the parsed MLF in a CompactMLF (token IDs and
+                         NumPy arrays) rather than as lists of SentenceLabels and Arc objects. This cannot stream.
+                vocabulary: An optional SubwordVocabulary shared with other compact datasets
+                normaliser: The LabelNormaliser used to memoize the subword label normalisation. Defaults to the
+                            module-level DEFAULT_NORMALISER, which is shared by all datasets in the process.
+                            Worker processes use their own normaliser with the same cache size and report their
+                            statistics to it.
+                context_direction: If given ('left', 'right' or 'both'), the MLF is parsed into monophones once and
+                                   the subword context is derived from the monophone sequence rather than the
+                                   HTK labels, for any context width. This implies compact and cannot stream.
+                                   See derive_subword_context().
+                min_count: Subword units seen fewer times than this are replaced by UNK_TOKEN. Pruning
+                           implies compact and cannot stream.
+                subsample_threshold: If given, frequent subword units are randomly dropped from the written corpus
+                                     as in word2vec (see corpus_statistics.keep_probabilities()). This implies
+                                     compact and cannot stream.
+        """
+        needs_compact = context_direction is not None or min_count > 1 or subsample_threshold
+        if needs_compact and (streaming or workers > 1):
+            raise ValueError(
+                'Deriving subword context, pruning and subsampling need the whole parsed MLF and cannot stream'
+            )
+        if compact and (streaming or workers > 1):
+            raise ValueError('A compact dataset holds the whole parsed MLF and cannot stream')
+        self.path_to_mlf = path_to_mlf
+        self.subword_context_width = subword_context_width
+        self.incl_posn_info = incl_posn_info
+        self.separate_apostrophe_embedding = separate_apostrophe_embedding
+        self.streaming = streaming or workers > 1
+        self.workers = workers
+        self.compact = compact or bool(needs_compact)
+        self.normaliser = normaliser if normaliser is not None else DEFAULT_NORMALISER
+        self.min_count = min_count
+        self.subsample_threshold = subsample_threshold
+        self.monophones = None
+        # The counts of the subword units of a dataset which is not compact, collected as its corpus is written
+        self.subword_counts = Counter()
+        # The size of the written corpus
+        self.num_sentences = 0
+        self.num_tokens = 0
+
+        if self.streaming:
+            self.ref_list = None
+            self.subwords = set()
+        elif context_direction is not None:
+            self.monophones = self.read_compact_mlf(vocabulary, subword_context_width=1)
+            self.derive_subword_context(subword_context_width, context_direction)
+        elif self.compact:
+            self.use_compact_mlf(self.read_compact_mlf(vocabulary))
+        else:
+            self.ref_list = self.read_mlf_list(
+                path_to_mlf, subword_context_width, incl_posn_info, separate_apostrophe_embedding
+            )
+            self.subwords = self.unique_subwords()
+
+    def iter_sentences(self, skip_label_names=None):
+        """ Generator which parses the MLF file one utterance at a time
+
+            Arguments:
+                skip_label_names: An optional set of label names whose utterances are skipped without parsing
+
+            Yields:
+                A SentenceLabels object for each non-empty utterance in the MLF file
+        """
+        with open(self.path_to_mlf, 'r', encoding=MLF_ENCODING) as mlf_file:
+            for string_sentence in iter_mlf_utterances(mlf_file):
+                if skip_label_names and utterance_label_name(string_sentence) in skip_label_names:
+                    continue
+                mlf_labels = SentenceLabels(
+                    string_sentence, self.subword_context_width, self.incl_posn_info,
+                    self.separate_apostrophe_embedding, self.normaliser
+                )
+                if not mlf_labels.is_none():
+                    yield mlf_labels
+
+    def read_mlf_list(self, path_to_mlf, subword_context_width, incl_posn_info, separate_apostrophe_embedding):
+        """ Saves the MLF (one-best sequence) in the target file as a list of SentenceLabels objects
+
+            Arguments:
+                path_to_mlf: The path to the MLF file as a string
+                subword_context_width: The subword context width as an integer
+                incl_posn_info: Boolean indicator for whether the position information should be included.
+                separate_apostrophe_embedding: boolean indicator of whether the apostrophe should be viewed
+                                               a distinct subword unit or included within the pronunciation
+        """
+        with open(path_to_mlf, 'r', encoding=MLF_ENCODING) as mlf_file:
+            one_best_list = []
+            for string_sentence in iter_mlf_utterances(mlf_file):
+                mlf_labels = SentenceLabels(
+                    string_sentence, subword_context_width, incl_posn_info, separate_apostrophe_embedding,
+                    self.normaliser
+                )
+                if not mlf_labels.is_none():
+                    one_best_list.append(mlf_labels)
+
+            return one_best_list
+
+    def read_compact_mlf(self, vocabulary=None, subword_context_width=None):
+        """ Parse the MLF into a CompactMLF
+
+            Arguments:
+                vocabulary: An optional SubwordVocabulary to intern the tokens into
+                subword_context_width: The subword context width to parse with (defaults to that of the dataset)
+        """
+        if subword_context_width is None:
+            subword_context_width = self.subword_context_width
+        compact_mlf = CompactMLF(vocabulary)
+        with open(self.path_to_mlf, 'r', encoding=MLF_ENCODING) as mlf_file:
+            for string_sentence in iter_mlf_utterances(mlf_file):
+                compact_mlf.append_utterance(
+                    string_sentence, subword_context_width, self.incl_posn_info,
+                    self.separate_apostrophe_embedding, self.normaliser
+                )
+        compact_mlf.finalise()
+        return compact_mlf
+
+    def derive_subword_context(self, subword_context_width, direction='both'):
+        """ Switch the dataset to subword n-grams derived from the parsed monophone sequence
+
+            Since the MLF is only parsed once, the corpora of several context widths can be written from
+            the same dataset by calling this before each write_corpus().
+
+            Arguments:
+                subword_context_width: The number of units in each n-gram
+                direction: 'left', 'right' or 'both' (see ngram_context.context_extent())
+        """
+        if self.monophones is None:
+            raise ValueError('The dataset was not parsed into monophones (see the context_direction argument)')
+        self.subword_context_width = subword_context_width
+        # Render the n-grams as strip_subword() renders the HTK context labels
+        separator = POSITION_CONTEXT_SEPARATOR if self.incl_posn_info else PLAIN_CONTEXT_SEPARATOR
+        self.use_compact_mlf(self.monophones.with_ngram_context(subword_context_width, direction, separator))
+
+    def use_compact_mlf(self, compact_mlf):
+        """ Hold a CompactMLF as the reference sequences, pruning its vocabulary to the minimum count """
+        if self.min_count > 1:
+            compact_mlf = compact_mlf.prune_vocabulary(self.min_count)
+        self.ref_list = compact_mlf
+        self.subwords = compact_mlf.unique_tokens()
+
+    def corpus_mlf(self):
+        """ The CompactMLF to write as the corpus: the reference sequences after any subsampling """
+        if self.subsample_threshold:
+            return self.ref_list.subsample(self.subsample_threshold)
+        return self.ref_list
+
+    def save_subword_counts(self, target_file, max_ngram_order=1):
+        """ Save the subword unit counts (before any subsampling) as JSON
+
+            A compact dataset counts its token ID arrays. Otherwise the counts are collected while the corpus is
+            written, so this must be called after write_corpus() or save_binary_corpus().
+
+            Arguments:
+                target_file: The path name of the counts file
+                max_ngram_order: Also count the n-grams of consecutive units up to this order (compact datasets)
+        """
+        if not self.compact:
+            if max_ngram_order > 1:
+                raise ValueError('N-gram counts are only computed for compact datasets')
+            tokens = list(self.subword_counts)
+            save_subword_counts(target_file, tokens, [self.subword_counts[token] for token in tokens])
+            return
+        ngram_counts_by_order = {
+            order: ngram_counts(self.ref_list.token_ids, self.ref_list.offsets, self.ref_list.vocabulary.tokens, order)
+            for order in range(2, max_ngram_order + 1)
+        }
+        save_subword_counts(
+            target_file, self.ref_list.vocabulary.tokens, self.ref_list.token_counts(), ngram_counts_by_order
+        )
+
+    def unique_subwords(self):
+        """ Compiles a set containing all sub-word units in the one-best training set.
+        """
+        subwords_in_dataset = set()
+        for one_best_ref in self.ref_list:
+            unique_token_set = one_best_ref.get_unique_tokens()
+            for subword in unique_token_set:
+                if not subword in subwords_in_dataset:
+                    subwords_in_dataset.add(subword)
+        return subwords_in_dataset
+
+    def save_unique_subwords(self, target_file):
+        with open(target_file, 'w') as subword_file:
+            json.dump(list(self.subwords), subword_file)
+
+    def corpus(self):
+        """ Generate a text corpus from the 1-best reference sequences from ASR recording.
+        """
+        if self.compact:
+            return self.corpus_mlf().corpus()
+        corpus = []
+        for lat in self.ref_list:
+            corpus.append(lat.sentence())
+        return '\n'.join(corpus)
+
+    def write_corpus(self, target_file):
+        """ Write the text corpus to file one sentence at a time. The output is identical to writing corpus().
+
+            In streaming mode the MLF is parsed as the corpus is written and the unique subword set is
+            accumulated on the fly, so the memory footprint does not grow with the size of the MLF. The subword
+            counts of a dataset which is not compact are collected at the same time.
+
+            Arguments:
+                target_file: The path name of the corpus file to write
+        """
+        if self.workers > 1:
+            self.write_corpus_parallel(target_file)
+            return
+
+        if self.compact:
+            corpus_mlf = self.corpus_mlf()
+            sentences = corpus_mlf.sentences()
+        else:
+            sentences = (sentence_labels.sentence() for sentence_labels in self.sentence_labels())
+
+        num_sentences = 0
+        with open(target_file, 'w', encoding=MLF_ENCODING) as corpus_file:
+            for sentence in sentences:
+                if num_sentences > 0:
+                    corpus_file.write('\n')
+                corpus_file.write(sentence)
+                num_sentences += 1
+        self.num_sentences = num_sentences
+        self.num_tokens = len(corpus_mlf.token_ids) if self.compact else sum(self.subword_counts.values())
+
+    def save_binary_corpus(self, corpus_dir):
+        """ Write the corpus in the memory-mappable binary format (see binary_corpus.BinaryCorpusWriter)
+
+            A compact dataset writes its arrays directly. Otherwise the tokens are interned into a vocabulary
+            in order of first occurrence while the utterances are written (parsing lazily when streaming;
+            shards are not parsed in parallel for the binary format).
+
+            Arguments:
+                corpus_dir: The path of the directory to write the binary corpus to
+        """
+        if self.compact:
+            corpus_mlf = self.corpus_mlf()
+            write_binary_corpus(corpus_dir, corpus_mlf.token_ids, corpus_mlf.offsets, corpus_mlf.vocabulary.tokens)
+            self.num_sentences = len(corpus_mlf.offsets) - 1
+            self.num_tokens = len(corpus_mlf.token_ids)
+            return
+
+        vocabulary = SubwordVocabulary()
+        num_sentences = 0
+        with BinaryCorpusWriter(corpus_dir) as writer:
+            for sentence_labels in self.sentence_labels():
+                writer.append_utterance([vocabulary.intern(arc.token) for arc in sentence_labels.arc_list])
+                num_sentences += 1
+            writer.close(vocabulary.tokens)
+        self.num_sentences = num_sentences
+        self.num_tokens = sum(self.subword_counts.values())
+
+    def sentence_labels(self):
+        """ Iterate over the SentenceLabels of the dataset, counting their subword units and updating the unique
+            subword set when streaming
+        """
+        self.subword_counts = Counter()
+        if not self.streaming:
+            for sentence_labels in self.ref_list:
+                self.subword_counts.update(arc.token for arc in sentence_labels.arc_list)
+                yield sentence_labels
+            return
+
+        for sentence_labels in self.iter_sentences():
+            self.subword_counts.update(arc.token for arc in sentence_labels.arc_list)
+            self.subwords.update(sentence_labels.get_unique_tokens())
+            yield sentence_labels
+
+    def iter_sentence_batches(self, batch_size=SENTENCES_PER_BATCH):
+        """ Generator over batches of parsed sentences, as consumed by pipeline.CorpusPipeline
+
+            With several workers the MLF is split into shards of about PIPELINE_SHARD_BYTES, which are parsed in
+            a process pool a few at a time so that only a bounded number of parsed shards is held in memory.
+
+            Arguments:
+                batch_size: The number of sentences per batch when parsing in this process
+
+            Yields:
+                Tuples of a list of sentences and the set of unique subwords in them. The unique subword set of
+                the dataset is left to the consumer (e.g. the vocabulary stage of the pipeline), while the subword
+                counts are merged once per batch.
+        """
+        for sentences, batch_counts in self.iter_counted_batches(batch_size):
+            self.subword_counts.update(batch_counts)
+            self.num_sentences += len(sentences)
+            self.num_tokens += sum(batch_counts.values())
+            yield sentences, set(batch_counts)
+
+    def iter_counted_batches(self, batch_size):
+        """ Generator over the batches of iter_sentence_batches(), with the Counter of the subword units in each """
+        self.subword_counts = Counter()
+        self.num_sentences = 0
+        self.num_tokens = 0
+        if self.workers <= 1:
+            sentences = []
+            batch_counts = Counter()
+            for sentence_labels in self.iter_sentences() if self.streaming else self.ref_list:
+                sentences.append(sentence_labels.sentence())
+                batch_counts.update(arc.token for arc in sentence_labels.arc_list)
+                if len(sentences) == batch_size:
+                    yield sentences, batch_counts
+                    sentences = []
+                    batch_counts = Counter()
+            if sentences:
+                yield sentences, batch_counts
+            return
+
+        num_shards = max(self.workers * SHARDS_PER_WORKER, os.path.getsize(self.path_to_mlf) // PIPELINE_SHARD_BYTES)
+        shard_info = [
+            (self.path_to_mlf, start, end, self.subword_context_width, self.incl_posn_info,
+             self.separate_apostrophe_embedding, self.normaliser.max_size)
+            for start, end in find_shard_offsets(self.path_to_mlf, num_shards)
+        ]
+        window = self.workers * 2
+        with Pool(processes=self.workers) as pool:
+            for window_start in range(0, len(shard_info), window):
+                for sentences, subword_counts, cache_stats in pool.imap(
+                        parse_mlf_shard_sentences, shard_info[window_start:window_start + window]):
+                    self.normaliser.add_stats(*cache_stats)
+                    yield sentences, subword_counts
+
+    def write_corpus_parallel(self, target_file):
+        """ Parse the MLF in a process pool and write the text corpus to file.
+
+            The MLF is split into shards at utterance boundaries using byte offsets. Each shard is parsed by
+            a worker into a part file, and the parts are concatenated and their unique subword sets merged
+            in shard order, so that the corpus is byte-identical to the one produced serially.
+
+            Arguments:
+                target_file: The path name of the corpus file to write
+        """
+        shard_offsets = find_shard_offsets(self.path_to_mlf, self.workers * SHARDS_PER_WORKER)
+        part_dir = tempfile.mkdtemp(prefix='corpus-parts-', dir=os.path.dirname(os.path.abspath(target_file)))
+        shard_info = [
+            (self.path_to_mlf, start, end, self.subword_context_width, self.incl_posn_info,
+             self.separate_apostrophe_embedding, os.path.join(part_dir, 'part-{:05d}.dat'.format(shard_idx)),
+             self.normaliser.max_size)
+            for shard_idx, (start, end) in enumerate(shard_offsets)
+        ]
+
+        try:
+            with open(target_file, 'w', encoding=MLF_ENCODING) as corpus_file, \
+                    Pool(processes=self.workers) as pool:
+                sentences_written = 0
+                self.subword_counts = Counter()
+                # imap preserves the shard order so the parts can be concatenated as they complete
+                for part_file, num_sentences, subword_counts, cache_stats in pool.imap(parse_mlf_shard, shard_info):
+                    if num_sentences > 0:
+                        if sentences_written > 0:
+                            corpus_file.write('\n')
+                        with open(part_file, 'r', encoding=MLF_ENCODING) as corpus_part:
+                            shutil.copyfileobj(corpus_part, corpus_file)
+                        sentences_written += num_sentences
+                    self.subwords.update(subword_counts)
+                    self.subword_counts.update(subword_counts)
+                    self.normaliser.add_stats(*cache_stats)
+                    os.remove(part_file)
+        finally:
+            shutil.rmtree(part_dir, ignore_errors=True)
+        self.num_sentences = sentences_written
+        self.num_tokens = sum(self.subword_counts.values())
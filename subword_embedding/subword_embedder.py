@@ -0,0 +1,175 @@
+import numpy as np
+
+from .embedding_store import load_embedding_store
+from .subword_corpus import CompactMLF, DEFAULT_NORMALISER, MLF_ENCODING, iter_mlf_utterances
+
+
+MISSING_ROW = -1
+MISSING_OPTIONS = ('zero', 'raise')
+UTTERANCES_PER_BATCH = 64
+
+
+class SubwordEmbedder(object):
+    """ Turns batches of MLF utterances or subword label sequences into padded embedding feature arrays.
+
+        Raw HTK labels are normalised exactly as when the corpus is built (see subword_corpus.strip_subword()),
+        so the options must match those the embedding was trained with. Every normalised token is mapped to
+        its embedding row once and cached, and the rows of a whole batch are gathered from the (typically
+        memory-mapped) embedding matrix in a single indexing operation.
+
+        With a separate apostrophe embedding, a token such as 'G1 A' is two words of the corpus and is
+        embedded as the mean of their vectors.
+    """
+    def __init__(self, embedding_store, subword_context_width, incl_posn_info, separate_apostrophe_embedding,
+                 missing='zero', normaliser=None):
+        """ Initialise the SubwordEmbedder object
+
+            Arguments:
+                embedding_store: The EmbeddingStore holding the subword embeddings
+                subword_context_width: The subword unit context width the embedding was trained with
+                incl_posn_info: Boolean indicator for whether the embedding includes the position information
+                separate_apostrophe_embedding: boolean indicator of whether the apostrophe was embedded as a
+                                               distinct subword unit
+                missing: What to do with subword units which are not in the embedding: give them a 'zero'
+                         vector or 'raise' a KeyError
+                normaliser: The LabelNormaliser used to memoize the subword label normalisation
+        """
+        if missing not in MISSING_OPTIONS:
+            raise ValueError('Unknown missing token option: {}'.format(missing))
+        self.store = embedding_store
+        self.subword_context_width = subword_context_width
+        self.incl_posn_info = incl_posn_info
+        self.separate_apostrophe_embedding = separate_apostrophe_embedding
+        self.missing = missing
+        self.normaliser = normaliser if normaliser is not None else DEFAULT_NORMALISER
+        # Token -> row in the store, or a negative index into the composite vectors (see token_row())
+        self.row_cache = {}
+        self.composite_vectors = []
+
+    @classmethod
+    def load(cls, embedding_path, subword_context_width, incl_posn_info, separate_apostrophe_embedding, **kwargs):
+        """ Create a SubwordEmbedder from an EmbeddingStore path prefix, a word2vec/fastText embedding file or a
+            legacy embedding.npy (see SubwordEmbedder() for the arguments)
+        """
+        return cls(
+            load_embedding_store(embedding_path), subword_context_width, incl_posn_info,
+            separate_apostrophe_embedding, **kwargs
+        )
+
+    @property
+    def vector_length(self):
+        return self.store.vector_length
+
+    def token_row(self, token):
+        """ The cached row of a normalised token
+
+            Tokens in the store map to their row, tokens made of several words in the store (e.g. 'G1 A') map
+            to -2 - i for the i-th composite vector, and unknown tokens map to MISSING_ROW.
+        """
+        row = self.row_cache.get(token)
+        if row is not None:
+            return row
+
+        if token in self.store:
+            row = self.store.token_to_row[token]
+        elif ' ' in token and all(word in self.store for word in token.split()):
+            self.composite_vectors.append(np.mean(self.store.lookup(token.split()), axis=0))
+            row = -2 - (len(self.composite_vectors) - 1)
+        elif self.missing == 'raise':
+            raise KeyError('The subword unit {} is not in the embedding'.format(token))
+        else:
+            row = MISSING_ROW
+        self.row_cache[token] = row
+        return row
+
+    def gather(self, rows, lengths):
+        """ Gather the embedding of every row into a zero padded (batch, max length, vector length) array
+
+            Arguments:
+                rows: The rows of all sequences back to back (see token_row())
+                lengths: The length of every sequence
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        vectors = np.zeros((len(rows), self.vector_length), dtype=np.float32)
+        in_store = rows >= 0
+        vectors[in_store] = self.store.vectors[rows[in_store]]
+        composite = rows <= -2
+        if composite.any():
+            vectors[composite] = np.array(self.composite_vectors, dtype=np.float32)[-2 - rows[composite]]
+
+        max_length = int(lengths.max()) if len(lengths) else 0
+        features = np.zeros((len(lengths), max_length, self.vector_length), dtype=np.float32)
+        sequence_idx = np.repeat(np.arange(len(lengths)), lengths)
+        positions = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        features[sequence_idx, positions] = vectors
+        return features
+
+    def embed_label_sequences(self, label_sequences, normalised=False):
+        """ Embed a batch of subword label sequences
+
+            Arguments:
+                label_sequences: A list of sequences of raw HTK subword labels (e.g. 'G1^ID1-G2^MD1+G3^FD2')
+                normalised: Boolean indicating that the labels are already normalised subword units
+
+            Returns:
+                A tuple of the (batch, max length, vector length) float32 features and the int64 lengths
+        """
+        rows = []
+        for labels in label_sequences:
+            for label in labels:
+                if not normalised:
+                    label = self.normaliser.normalise(
+                        label, self.subword_context_width, self.incl_posn_info, self.separate_apostrophe_embedding
+                    )
+                rows.append(self.token_row(label))
+        lengths = np.array([len(labels) for labels in label_sequences], dtype=np.int64)
+        return self.gather(rows, lengths), lengths
+
+    def embed_utterances(self, mlf_utterances):
+        """ Embed a batch of MLF utterances
+
+            Arguments:
+                mlf_utterances: A list of raw utterances as they appear in the MLF (a label name line followed
+                                by one 'start end label score' line per arc)
+
+            Returns:
+                A tuple of the label names, the (batch, max length, vector length) float32 features, the int64
+                lengths and the (batch, max length) start and end times in seconds (zero padded)
+        """
+        batch = CompactMLF()
+        for string_mlf in mlf_utterances:
+            batch.append_utterance(
+                string_mlf, self.subword_context_width, self.incl_posn_info, self.separate_apostrophe_embedding,
+                self.normaliser
+            )
+        batch.finalise()
+
+        # Only the distinct tokens of the batch are looked up, then all arcs are mapped with one gather
+        token_rows = np.array([self.token_row(token) for token in batch.vocabulary.tokens], dtype=np.int64)
+        lengths = np.diff(batch.offsets)
+        features = self.gather(token_rows[batch.token_ids], lengths)
+
+        start_times = np.zeros(features.shape[:2], dtype=np.float64)
+        end_times = np.zeros(features.shape[:2], dtype=np.float64)
+        valid = np.arange(features.shape[1]) < lengths[:, None]
+        start_times[valid] = batch.start_times
+        end_times[valid] = batch.end_times
+        return batch.label_names, features, lengths, start_times, end_times
+
+    def embed_mlf(self, path_to_mlf, batch_size=UTTERANCES_PER_BATCH):
+        """ Generator over the embedded batches of the utterances in an MLF file (see embed_utterances())
+
+            Arguments:
+                path_to_mlf: The path to the MLF file as a string
+                batch_size: The number of utterances per batch
+        """
+        batch = []
+        with open(path_to_mlf, 'r', encoding=MLF_ENCODING) as mlf_file:
+            for string_mlf in iter_mlf_utterances(mlf_file):
+                batch.append(string_mlf)
+                if len(batch) == batch_size:
+                    yield self.embed_utterances(batch)
+                    batch = []
+        if batch:
+            yield self.embed_utterances(batch)
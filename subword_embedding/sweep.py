@@ -0,0 +1,144 @@
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import json
+import multiprocessing
+import os
+import time
+
+from .cli import generate_corpus, make_parent_dirs
+from .subword_corpus import LabelNormaliser
+from .training import train_embedding, word2vec_job
+from .word2vec_runner import run_budgeted_jobs, run_word2vec
+
+
+# The options which may be varied across the grid, as named by the command line argument destinations
+SWEEP_OPTIONS = (
+    'model', 'vec_length', 'cbow', 'window', 'negative', 'sample', 'epochs', 'min_count', 'maxn', 'threads'
+)
+SUMMARY_FILE = 'summary.tsv'
+
+
+def expand_grid(grid):
+    """ Expand a grid specification into the list of grid points it describes
+
+        Arguments:
+            grid: A dictionary mapping option names to lists of values (or single values), or a list of them
+
+        Returns:
+            A list of dictionaries, each mapping the option names to one combination of values
+    """
+    if isinstance(grid, list):
+        return [point for sub_grid in grid for point in expand_grid(sub_grid)]
+
+    unknown_options = sorted(set(grid) - set(SWEEP_OPTIONS))
+    if unknown_options:
+        raise ValueError('Cannot sweep over {}. The options are {}'.format(unknown_options, list(SWEEP_OPTIONS)))
+    names = sorted(grid, key=SWEEP_OPTIONS.index)
+    values = [grid[name] if isinstance(grid[name], list) else [grid[name]] for name in names]
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+def job_name(args):
+    """ A directory name identifying the model and the values of the swept options of a job """
+    name = '{}-l{}'.format(args.model, args.vec_length)
+    for option in args.swept_options:
+        if option not in ('model', 'vec_length'):
+            name += '-{}{}'.format(option.replace('_', '-'), getattr(args, option))
+    return name
+
+def sweep_jobs(args, grid_points):
+    """ Create the arguments of every job in the sweep from the shared arguments and the grid points
+
+        Arguments:
+            args: The parsed command line arguments
+            grid_points: The list of grid points from expand_grid()
+    """
+    threads_per_job = max(1, args.cpu_budget // max(1, min(args.jobs, len(grid_points))))
+    jobs = []
+    for grid_point in grid_points:
+        job_args = Namespace(**vars(args))
+        if args.threads is None:
+            job_args.threads = threads_per_job
+        for option, value in grid_point.items():
+            setattr(job_args, option, value)
+        job_args.swept_options = sorted(grid_point, key=SWEEP_OPTIONS.index)
+        job_args.embedding = os.path.join(args.sweep_dir, job_name(job_args))
+        jobs.append(job_args)
+
+    names = [job_args.embedding for job_args in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError('The grid contains repeated grid points')
+    return jobs
+
+def run_job(job_args):
+    """ Train the embedding of one grid point, returning the training time """
+    start_time = time.time()
+    train_embedding(job_args)
+    return time.time() - start_time
+
+def job_result(job_args, train_time, error):
+    """ Report a finished job and return its (job arguments, training time, vocabulary size, error) tuple """
+    if error is not None:
+        print('Failed to train {}: {}'.format(job_args.embedding, error))
+        return job_args, None, None, error
+    with open(os.path.join(job_args.embedding, 'embedding.txt'), 'r') as embedding_file:
+        num_vectors = int(embedding_file.readline().split()[0])
+    print('Finished {} in {:.2f}s'.format(job_args.embedding, train_time))
+    return job_args, train_time, num_vectors, None
+
+def write_summary(results, target_file):
+    """ Write the summary table of the sweep as tab separated values and print it
+
+        Arguments:
+            results: A list of (job arguments, training time, vocabulary size, error) tuples
+            target_file: The path name of the summary table
+    """
+    header = ['name', 'model', 'vec_length', 'threads', 'train_seconds', 'num_vectors', 'status']
+    rows = [header]
+    for job_args, train_time, num_vectors, error in results:
+        rows.append([
+            os.path.basename(job_args.embedding), job_args.model, str(job_args.vec_length), str(job_args.threads),
+            '{:.2f}'.format(train_time) if error is None else '-',
+            str(num_vectors) if error is None else '-',
+            'ok' if error is None else 'failed: {}'.format(str(error).splitlines()[0])
+        ])
+
+    with open(target_file, 'w') as summary_file:
+        summary_file.write('\n'.join('\t'.join(row) for row in rows) + '\n')
+
+    widths = [max(len(row[column]) for row in rows) for column in range(len(header))]
+    for row in rows:
+        print('  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+def run_sweep(args):
+    """ Build the subword corpus once and train every point of the grid on it """
+    with open(args.grid, 'r') as grid_file:
+        jobs = sweep_jobs(args, expand_grid(json.load(grid_file)))
+    if not os.path.exists(args.sweep_dir):
+        os.makedirs(args.sweep_dir)
+
+    if not args.skip_corpus:
+        make_parent_dirs(args.subword_corpus, args.unique_subwords)
+        print('Generating corpus...')
+        generate_corpus(args, LabelNormaliser(max_size=args.norm_cache_size))
+
+    print('Training {} embeddings with {} jobs of {} threads...'.format(
+        len(jobs), min(args.jobs, len(jobs)), jobs[0].threads if jobs else 0
+    ))
+    results = []
+    # Spawned rather than forked, since the scheduler threads are running when the processes are started
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs), mp_context=multiprocessing.get_context('spawn')) \
+            as executor:
+        def train(job_args):
+            if job_args.model == 'word2vec':
+                # The word2vec binary runs in a process of its own
+                return run_word2vec(word2vec_job(job_args), args.train_timeout)
+            # The other models are trained in separate processes, so that the GIL-bound parts of training
+            # overlap and the word2vec-numpy trainer can start its own worker processes
+            return executor.submit(run_job, job_args).result()
+
+        # Every grid point shares the CPU budget and the number of jobs, whichever model it trains
+        for job_args, train_time, error in run_budgeted_jobs(jobs, train, args.cpu_budget, args.jobs):
+            results.append(job_result(job_args, train_time, error))
+
+    write_summary(results, os.path.join(args.sweep_dir, SUMMARY_FILE))
@@ -0,0 +1,133 @@
+import json
+import os
+
+import numpy as np
+
+from .binary_corpus import BinaryCorpus
+from .embedding_io import write_word2vec_binary, write_word2vec_text
+from .numpy_word2vec import embed_token_ids, text_corpus_to_ids
+from .word2vec_runner import Word2VecJob, run_word2vec
+
+
+def word2vec_job(args):
+    """ The Word2VecJob which trains the original word2vec binary with the options in args """
+    return Word2VecJob(
+        corpus_path=args.subword_corpus,
+        vector_length=args.vec_length,
+        target_dir=args.embedding,
+        word2vec_path=args.word2vec_dir,
+        training_options={
+            'cbow': args.cbow,
+            'window': args.window,
+            'negative': args.negative,
+            'sample': args.sample,
+            'iter': args.epochs,
+            'min_count': args.min_count,
+            'threads': args.threads,
+        }
+    )
+
+def numpy_word2vec_embed(corpus_path, binary_corpus_dir, vector_length, target_dir, training_options):
+    """ Train word2vec in-process on the binary corpus if there is one, otherwise on the text corpus """
+    if binary_corpus_dir:
+        corpus = BinaryCorpus(binary_corpus_dir)
+        token_ids, offsets, tokens = corpus.token_ids, corpus.offsets, corpus.tokens
+    else:
+        token_ids, offsets, tokens = text_corpus_to_ids(corpus_path)
+    training_options = {key: val for key, val in training_options.items() if val is not None}
+    embed_token_ids(token_ids, offsets, tokens, vector_length, target_dir, **training_options)
+
+def fasttext_word_vectors(model, words):
+    """ Compute the fastText vectors of many words at once.
+
+        A fastText word vector is the mean of the input matrix rows of the word and its character n-grams.
+        Without character n-grams (maxn = 0) the vectors of in-vocabulary words are simply rows of the input
+        matrix and are gathered in one indexing operation. Otherwise every vector is looked up in C++ by
+        fastText and written into a preallocated array (which is faster than collecting the n-gram row IDs
+        of each word in Python).
+
+        Arguments:
+            model: A trained fastText model
+            words: The list of words (which may be out of vocabulary)
+
+        Returns:
+            A (number of words, dim) float32 array
+    """
+    vectors = np.empty((len(words), model.get_dimension()), dtype=np.float32)
+    if model.f.getArgs().maxn == 0:
+        word_ids = {word: word_id for word_id, word in enumerate(model.words)}
+        row_ids = np.array([word_ids.get(word, -1) for word in words], dtype=np.int64)
+        in_vocab = row_ids >= 0
+        # Zero-copy view of the input matrix, since get_input_matrix() copies all of the n-gram buckets
+        vectors[in_vocab] = np.asarray(model.f.getInputMatrix())[row_ids[in_vocab]]
+        missing = np.flatnonzero(~in_vocab)
+    else:
+        missing = range(len(words))
+
+    for i in missing:
+        vectors[i] = model.get_word_vector(words[i])
+    return vectors
+
+def fasttext_embed(corpus_path, vector_length, unique_subwords_path, target_dir, training_options,
+                   binary_embedding=False):
+    # fastText is only needed (and imported) when it is the model being trained
+    import fasttext
+
+    training_options = {key: val for key, val in training_options.items() if val is not None}
+    model = fasttext.train_unsupervised(corpus_path, dim=vector_length, **training_options)
+    print('In-vocab subwords: {}'.format(model.words))
+
+    with open(unique_subwords_path) as unique_subwords_file:
+        unique_subwords = json.load(unique_subwords_file)
+
+    subwords = ['</s>'] + unique_subwords
+    # Check that nothing has been left out
+    listed_subwords = set(subwords)
+    for subword in model.words:
+        if not subword in listed_subwords:
+            print('Adding {}'.format(subword))
+            subwords.append(subword)
+            listed_subwords.add(subword)
+
+    vectors = fasttext_word_vectors(model, subwords)
+    write_word2vec_text(os.path.join(target_dir, 'embedding.txt'), subwords, vectors)
+    if binary_embedding:
+        write_word2vec_binary(os.path.join(target_dir, 'embedding.bin'), subwords, vectors)
+
+def train_embedding(args):
+    """ Train the embedding model selected by args.model on the subword corpus and save it to args.embedding """
+    if args.model == 'word2vec':
+        # Raises a Word2VecError if the run fails or times out
+        run_word2vec(word2vec_job(args), args.train_timeout)
+    elif args.model == 'fastText':
+        if not os.path.exists(args.embedding):
+            os.makedirs(args.embedding)
+        fasttext_embed(
+            corpus_path=args.subword_corpus,
+            vector_length=args.vec_length,
+            unique_subwords_path=args.unique_subwords,
+            target_dir=args.embedding,
+            training_options={
+                'thread': args.threads,
+                'epoch': args.epochs,
+                'minCount': args.min_count,
+                'maxn': args.maxn,
+            },
+            binary_embedding=args.binary_embedding
+        )
+    elif args.model == 'word2vec-numpy':
+        numpy_word2vec_embed(
+            corpus_path=args.subword_corpus,
+            binary_corpus_dir=args.binary_corpus,
+            vector_length=args.vec_length,
+            target_dir=args.embedding,
+            training_options={
+                'cbow': args.cbow,
+                'window': args.window,
+                'negative': args.negative,
+                'sample': args.sample,
+                'epochs': args.epochs,
+                'min_count': args.min_count,
+                'workers': args.threads,
+            }
+        )
@@ -0,0 +1,171 @@
+import hashlib
+import inspect
+import json
+import os
+
+import numpy as np
+
+# TODO: This should be a command line param or infered from the file
+APOSTROPHE_TOKEN = 'A'
+TSNE_ITERATIONS = 20000
+FAST_TSNE_ITERATIONS = 1000
+FAST_TSNE_PATIENCE = 100
+FAST_TSNE_MIN_GRAD_NORM = 1e-5
+
+
+def tsne_parameters(perplexity, learning_rate, fast=False, max_iter=None):
+    """ The t-SNE parameters for the default or fast visualisation
+
+        In fast mode t-SNE starts from the PCA projection and stops early once the KL divergence has converged
+        (the gradient norm drops below a looser threshold or there is no progress for 100 iterations),
+        with far fewer iterations in total.
+
+        Arguments:
+            perplexity: As described in https://scikit-learn.org/stable/modules/generated/sklearn.manifold.TSNE.html
+            learning_rate: As described in https://scikit-learn.org/stable/modules/generated/sklearn.manifold.TSNE.html
+            fast: Boolean for whether to use the fast settings
+            max_iter: The maximum number of iterations (defaults to 20000, or 1000 in fast mode)
+    """
+    tsne_params = {
+        'perplexity': perplexity,
+        'learning_rate': learning_rate,
+    }
+    if fast:
+        tsne_params.update({
+            'init': 'pca',
+            'max_iter': max_iter if max_iter is not None else FAST_TSNE_ITERATIONS,
+            'n_iter_without_progress': FAST_TSNE_PATIENCE,
+            'min_grad_norm': FAST_TSNE_MIN_GRAD_NORM,
+        })
+    else:
+        tsne_params['max_iter'] = max_iter if max_iter is not None else TSNE_ITERATIONS
+    return tsne_params
+
+
+def projection_cache_key(vectors, tsne_params):
+    """ A hash of the embedding matrix and the t-SNE parameters used to key cached projections """
+    hasher = hashlib.sha1()
+    hasher.update(str(vectors.shape).encode('utf-8'))
+    hasher.update(np.ascontiguousarray(vectors).tobytes())
+    hasher.update(json.dumps(tsne_params, sort_keys=True).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def project_embedding(vectors, tsne_params, cache_dir=None):
+    """ Compute the 2-D t-SNE projection of an embedding matrix, reusing a cached projection when available
+
+        Arguments:
+            vectors: The (number of subwords, vector length) embedding matrix
+            tsne_params: The t-SNE parameters (see tsne_parameters())
+            cache_dir: An optional directory in which projections are cached, keyed by projection_cache_key()
+    """
+    vectors = np.asarray(vectors, dtype=np.float64)
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = os.path.join(cache_dir, 'tsne-{}.npy'.format(projection_cache_key(vectors, tsne_params)))
+        if os.path.exists(cache_file):
+            print('Using the cached t-SNE projection {}'.format(cache_file))
+            return np.load(cache_file)
+
+    # scikit-learn is only imported when a projection is computed, since it is slow to import
+    from sklearn.manifold import TSNE
+    if 'max_iter' not in inspect.signature(TSNE).parameters:
+        # scikit-learn before 1.5 names the maximum number of iterations n_iter, which later versions deprecate
+        tsne_params = dict(tsne_params)
+        tsne_params['n_iter'] = tsne_params.pop('max_iter')
+    tsne = TSNE(n_components=2, random_state=0, **tsne_params)
+    emb_2d = tsne.fit_transform(vectors)
+
+    if cache_file is not None:
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        np.save(cache_file, emb_2d)
+    return emb_2d
+
+
+def visualise_embedding(embedding_store, perplexity, learning_rate, image_path_name, label_mapping,
+                        fast=False, max_iter=None, cache_dir=None):
+    """ Save the t-SNE visualisation of an embedding
+
+        Arguments:
+            embedding_store: The EmbeddingStore holding the subword embeddings (without the </s> entry).
+            perplexity: As described in https://scikit-learn.org/stable/modules/generated/sklearn.manifold.TSNE.html
+            learning_rate: As described in https://scikit-learn.org/stable/modules/generated/sklearn.manifold.TSNE.html
+            image_path_name: Name of the resulting t-SNE plot.
+            label_mapping: The dictionary mapping to be used to insert the labels next to the data points.
+            fast: Boolean for whether to use the fast t-SNE settings (see tsne_parameters())
+            max_iter: The maximum number of t-SNE iterations
+            cache_dir: An optional directory in which to cache the projection, so that relabelling the plot
+                       (e.g. with a different label mapping) only redraws it.
+
+        Returns:
+            The 2-D t-SNE projection of the embedding
+    """
+    print('Number of subword units: {}'.format(len(embedding_store)))
+
+    # Units without a mapping (e.g. <unk> or context-dependent units) are labelled as they are
+    subword_labels = [label_mapping.get(subword, subword) for subword in embedding_store.tokens]
+    emb_2d = project_embedding(
+        embedding_store.vectors, tsne_parameters(perplexity, learning_rate, fast, max_iter), cache_dir
+    )
+
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+    fig, ax = plt.subplots()
+    ax.scatter(emb_2d[:, 0], emb_2d[:, 1], c='c')
+
+    for i, subword_label in enumerate(subword_labels):
+        ax.annotate(subword_label, (emb_2d[i, 0], emb_2d[i, 1]))
+
+    plt.savefig(image_path_name)
+    plt.close(fig)
+    return emb_2d
+
+
+def label_maps_from_file(path_to_summary, label_mapping_code, separate_apostrophe_embedding, saved_dict=False):
+    """ Generate a label mapping from the summary.txt file or a previously compiled
+        mapping dictionary.
+
+        Arguments:
+            path_to_summary : A string variable of the path to the summary.txt file
+            label_mapping_code : The mapping code is an integer defined as follows:
+                                    0 = Map to self (no mapping)
+                                    1 = Map to English phonetic spelling
+                                    2 = Map to native language characters
+            separate_apostrophe_embedding: boolean indicator of whether the apostrophe should be viewed
+                                            a distinct subword unit or included within the pronunciation
+            TODO: saved_dict : If the file is already a saved dictionary in the correct form
+    """
+    with open(path_to_summary, 'r') as mapping_file:
+        mapping_list = mapping_file.readlines()
+
+    apostrophe_options = find_apostrophe_options(mapping_list)
+
+    label_map = {}
+    for line in mapping_list:
+        split_line = line.split()
+        # Design the mapping such that the mapping code can be used to index the list
+        # code: [code, phonetic English, native characters]
+        code = split_line[1]
+        code_options = [code, split_line[-1], split_line[0]]
+        label_map[code] = code_options[label_mapping_code]
+        if not separate_apostrophe_embedding:
+            label_map[code + APOSTROPHE_TOKEN] = code_options[label_mapping_code] + apostrophe_options[label_mapping_code]
+    # Add special characters sp and sil
+    label_map['sp'] = 'sp'
+    label_map['sil'] = 'sil'
+    # Add special characters for the two hesitation characters
+    label_map['G00'] = 'G00'
+    label_map['G01'] = 'G01'
+    return label_map
+
+
+def find_apostrophe_options(mapping_list):
+    for line in mapping_list:
+        split_line = line.split()
+        if split_line[0] == "'":
+            en = split_line[0]
+            native = split_line[-1]
+            apostrophe_code = split_line[1]
+            return [apostrophe_code, native, en]
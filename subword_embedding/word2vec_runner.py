@@ -0,0 +1,217 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+
+
+WORD2VEC_BINARY = 'word2vec'
+# word2vec rewrites its progress line in place with carriage returns
+PROGRESS_PATTERN = re.compile(r'Progress:\s*([\d.]+)%')
+PROGRESS_LOG_STEP = 10.0
+OUTPUT_TAIL_LINES = 20
+READ_SIZE = 4096
+# The word2vec options which can be passed through, by their training_options keyword
+WORD2VEC_OPTIONS = ('cbow', 'threads', 'window', 'negative', 'sample', 'iter', 'min_count')
+
+logger = logging.getLogger(__name__)
+
+
+class Word2VecError(RuntimeError):
+    """ Raised when a word2vec training run fails, times out or cannot be started """
+
+
+def word2vec_binary(word2vec_path):
+    """ The word2vec executable, given either the executable or the directory it was built in """
+    if os.path.isdir(word2vec_path):
+        return os.path.join(word2vec_path, WORD2VEC_BINARY)
+    return word2vec_path
+
+
+class Word2VecJob(object):
+    """ One training run of the original word2vec binary """
+    def __init__(self, corpus_path, vector_length, target_dir, word2vec_path, training_options=None, name=None):
+        """ Initialise the Word2VecJob object
+
+            Arguments:
+                corpus_path: The path name of the text corpus
+                vector_length: The length of the embedding vectors
+                target_dir: The embedding directory, where embedding.txt and embedding.log are written
+                word2vec_path: The word2vec executable or the directory containing it
+                training_options: A dictionary of the WORD2VEC_OPTIONS to pass on (None values are left to the
+                                  word2vec defaults). cbow is a boolean.
+                name: The name used in log messages (defaults to the embedding directory)
+        """
+        self.corpus_path = corpus_path
+        self.vector_length = vector_length
+        self.target_dir = target_dir
+        self.word2vec_path = word2vec_path
+        self.training_options = dict(training_options or {})
+        unknown_options = sorted(set(self.training_options) - set(WORD2VEC_OPTIONS))
+        if unknown_options:
+            raise ValueError('Unknown word2vec options {}. The options are {}'.format(
+                unknown_options, list(WORD2VEC_OPTIONS)
+            ))
+        self.name = name or target_dir
+
+    @property
+    def threads(self):
+        """ The number of CPUs the run uses (word2vec defaults to 12 threads) """
+        return self.training_options.get('threads') or 12
+
+    def command(self):
+        """ The argument list of the word2vec run """
+        command = [
+            word2vec_binary(self.word2vec_path),
+            '-train', self.corpus_path,
+            '-output', os.path.join(self.target_dir, 'embedding.txt'),
+            '-size', str(self.vector_length),
+            '-binary', '0',
+        ]
+        for option in WORD2VEC_OPTIONS:
+            value = self.training_options.get(option)
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                value = int(value)
+            command.extend(['-{}'.format(option.replace('_', '-')), str(value)])
+        return command
+
+
+def stream_output(process, job, log_file, output_tail):
+    """ Log the output of a word2vec run as it arrives and save all of it to the log file
+
+        Progress lines are logged every PROGRESS_LOG_STEP percent rather than on every update.
+    """
+    last_logged = -PROGRESS_LOG_STEP
+    partial_line = b''
+    for chunk in iter(lambda: os.read(process.stdout.fileno(), READ_SIZE), b''):
+        log_file.write(chunk)
+        lines = re.split(b'[\r\n]', partial_line + chunk)
+        partial_line = lines.pop()
+        for line in lines:
+            line = line.decode('utf-8', 'replace').strip()
+            if not line:
+                continue
+            progress = PROGRESS_PATTERN.search(line)
+            if progress is not None:
+                if float(progress.group(1)) < last_logged + PROGRESS_LOG_STEP:
+                    continue
+                last_logged = float(progress.group(1))
+            else:
+                output_tail.append(line)
+            logger.info('[%s] %s', job.name, line)
+    if partial_line.strip():
+        line = partial_line.decode('utf-8', 'replace').strip()
+        output_tail.append(line)
+        logger.info('[%s] %s', job.name, line)
+
+
+def run_word2vec(job, timeout=None):
+    """ Run word2vec without a shell, streaming its progress to the log, and raise if it does not succeed
+
+        Arguments:
+            job: The Word2VecJob to run
+            timeout: The number of seconds after which the run is killed (no limit by default)
+
+        Returns:
+            The training time in seconds
+    """
+    if not os.path.exists(job.target_dir):
+        os.makedirs(job.target_dir)
+    command = job.command()
+    logger.info('[%s] Running %s', job.name, ' '.join(command))
+
+    start_time = time.time()
+    output_tail = deque(maxlen=OUTPUT_TAIL_LINES)
+    with open(os.path.join(job.target_dir, 'embedding.log'), 'wb') as log_file:
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        except OSError as error:
+            raise Word2VecError('Cannot run {}: {}'.format(command[0], error))
+        reader = threading.Thread(target=stream_output, args=(process, job, log_file, output_tail))
+        reader.daemon = True
+        reader.start()
+        try:
+            return_code = process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            reader.join()
+            process.stdout.close()
+            raise Word2VecError('word2vec training of {} timed out after {}s'.format(job.name, timeout))
+        reader.join()
+        process.stdout.close()
+
+    if return_code != 0:
+        raise Word2VecError('word2vec training of {} failed with exit code {} (see {}):\n{}'.format(
+            job.name, return_code, os.path.join(job.target_dir, 'embedding.log'), '\n'.join(output_tail)
+        ))
+    if not os.path.exists(os.path.join(job.target_dir, 'embedding.txt')):
+        raise Word2VecError('word2vec training of {} did not write embedding.txt'.format(job.name))
+    train_time = time.time() - start_time
+    logger.info('[%s] Finished in %.1fs', job.name, train_time)
+    return train_time
+
+
+class CpuBudget(object):
+    """ A pool of CPUs which concurrent runs acquire their threads from """
+    def __init__(self, num_cpus):
+        self.num_cpus = num_cpus
+        self.available = num_cpus
+        self.condition = threading.Condition()
+
+    def acquire(self, num_cpus):
+        with self.condition:
+            while self.available < num_cpus:
+                self.condition.wait()
+            self.available -= num_cpus
+
+    def release(self, num_cpus):
+        with self.condition:
+            self.available += num_cpus
+            self.condition.notify_all()
+
+
+def run_budgeted_jobs(jobs, run_job, cpu_budget=None, max_jobs=None):
+    """ Run jobs concurrently, starting each one once its threads fit in the CPU budget
+
+        Jobs start in the order of the list, each one once the CPUs it needs are free and fewer than max_jobs are
+        running, so the total number of threads in use never exceeds the budget (a job needing more than the whole
+        budget runs with the budget). The results are only yielded once every job has started. Every job is run
+        even if some fail, and the failures are returned rather than raised.
+
+        Arguments:
+            jobs: A list of jobs with a threads attribute, the number of CPUs each one uses (e.g. Word2VecJob)
+            run_job: The function run in a thread for every job, e.g. a call of run_word2vec()
+            cpu_budget: The total number of CPUs shared by the jobs (defaults to the number of CPUs)
+            max_jobs: The maximum number of jobs running at the same time (no limit by default)
+
+        Returns:
+            A generator of (job, result of run_job, error) tuples in the order of the jobs, where the result is
+            None and the error is the exception raised if the job failed
+    """
+    budget = CpuBudget(cpu_budget or os.cpu_count() or 1)
+    job_slots = threading.BoundedSemaphore(max_jobs or max(1, len(jobs)))
+
+    def run_in_budget(job, num_cpus):
+        try:
+            return run_job(job)
+        finally:
+            budget.release(num_cpus)
+            job_slots.release()
+
+    with ThreadPoolExecutor(max_workers=max(1, len(jobs))) as executor:
+        futures = []
+        # The jobs are started from this loop alone, so a large job is never overtaken by smaller ones behind it
+        for job in jobs:
+            num_cpus = min(job.threads, budget.num_cpus)
+            job_slots.acquire()
+            budget.acquire(num_cpus)
+            futures.append(executor.submit(run_in_budget, job, num_cpus))
+        for job, future in zip(jobs, futures):
+            error = future.exception()
+            yield job, None if error is not None else future.result(), error
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# Make the subword_embedding and benchmarks packages importable when pytest is run from any directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generate_mlf import generate_mlf
+
+
+@pytest.fixture(scope='session')
+def triphone_mlf(tmp_path_factory):
+    """ A small synthetic triphone MLF with word position markers and apostrophes """
+    mlf_path = str(tmp_path_factory.mktemp('mlf') / 'tri.mlf')
+    generate_mlf(mlf_path, num_utterances=300, seed=1)
+    return mlf_path
+
+
+@pytest.fixture(scope='session')
+def monophone_mlf(tmp_path_factory):
+    """ A small synthetic monophone MLF without word position markers """
+    mlf_path = str(tmp_path_factory.mktemp('mlf') / 'mono.mlf')
+    generate_mlf(mlf_path, num_utterances=300, triphones=False, position_markers=False, seed=2)
+    return mlf_path
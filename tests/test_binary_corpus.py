@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from subword_embedding.binary_corpus import BinaryCorpus, binary_to_text, write_binary_corpus
+from subword_embedding.subword_corpus import MLF_ENCODING, MLFDataset
+
+
+def read_text(path_name):
+    with open(path_name, 'r', encoding=MLF_ENCODING) as text_file:
+        return text_file.read()
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_text_export_matches_the_text_corpus(triphone_mlf, tmp_path, compact):
+    """ The text converted from the binary corpus for word2vec and fastText is the corpus written as text """
+    options = {'subword_context_width': 3, 'incl_posn_info': True, 'separate_apostrophe_embedding': True}
+    text_path = str(tmp_path / 'corpus.txt')
+    MLFDataset(path_to_mlf=triphone_mlf, compact=compact, **options).write_corpus(target_file=text_path)
+
+    corpus_dir = str(tmp_path / 'binary')
+    exported_path = str(tmp_path / 'exported.txt')
+    MLFDataset(path_to_mlf=triphone_mlf, compact=compact, **options).save_binary_corpus(corpus_dir=corpus_dir)
+    binary_to_text(corpus_dir=corpus_dir, target_file=exported_path)
+    assert read_text(exported_path) == read_text(text_path)
+
+    binary_corpus = BinaryCorpus(corpus_dir)
+    assert isinstance(binary_corpus.token_ids, np.memmap)
+    assert len(binary_corpus) == 300
+    sentences = read_text(text_path).split('\n')
+    assert ' '.join(binary_corpus.token_array()[binary_corpus[7]]) == sentences[7]
+
+
+def test_round_trip_with_empty_utterances(tmp_path):
+    corpus_dir = str(tmp_path / 'binary')
+    write_binary_corpus(corpus_dir, np.array([2, 0, 1, 2]), np.array([0, 2, 2, 4]), ['a', 'b', 'c'])
+    binary_corpus = BinaryCorpus(corpus_dir)
+    assert [binary_corpus[i].tolist() for i in range(len(binary_corpus))] == [[2, 0], [], [1, 2]]
+    assert list(binary_corpus.sentences()) == ['c a', '', 'b c']
+
+    write_binary_corpus(str(tmp_path / 'empty'), np.array([], dtype=np.uint32), np.array([0]), [])
+    empty_corpus = BinaryCorpus(str(tmp_path / 'empty'))
+    assert len(empty_corpus) == 0 and empty_corpus.num_tokens == 0
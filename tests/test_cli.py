@@ -0,0 +1,18 @@
+import pytest
+
+from subword_embedding.cli import parse_arguments, run_command
+
+
+def test_options_without_a_subcommand_are_run_options():
+    args = parse_arguments(['-i', 'data/train.mlf', '-l', '8', '--save-to-npy'])
+    assert args.command == 'run' and args.run_command is run_command
+    assert (args.mlf_file, args.vec_length, args.embed_to_npy, args.only_viz) == ('data/train.mlf', 8, True, False)
+
+
+def test_only_viz_needs_no_corpus_options():
+    args = parse_arguments(['--only-viz', '--map-to-en'])
+    assert args.command == 'run' and args.only_viz
+    with pytest.raises(SystemExit):
+        parse_arguments(['run'])
+    with pytest.raises(SystemExit):
+        parse_arguments([])
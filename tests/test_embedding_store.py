@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from subword_embedding.embedding_io import write_word2vec_text
+from subword_embedding.embedding_store import EmbeddingStore, load_embedding_store
+
+
+TOKENS = ['a', 'b', 'c', 'd']
+
+
+@pytest.fixture
+def embedding_store():
+    return EmbeddingStore(TOKENS, np.arange(12, dtype=np.float32).reshape(4, 3))
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_save_and_load(tmp_path, embedding_store, mmap):
+    path_prefix = str(tmp_path / 'store')
+    embedding_store.save(path_prefix)
+    loaded_store = EmbeddingStore.load(path_prefix, mmap=mmap)
+    assert loaded_store.tokens == TOKENS
+    assert isinstance(loaded_store.vectors, np.memmap) == mmap
+    assert np.array_equal(loaded_store.vectors, embedding_store.vectors)
+    assert np.array_equal(load_embedding_store(path_prefix).vectors, embedding_store.vectors)
+
+
+def test_row_lookup(embedding_store):
+    assert 'c' in embedding_store and 'z' not in embedding_store
+    assert np.array_equal(embedding_store['c'], [6, 7, 8])
+    assert embedding_store.rows(['d', 'z', 'a']).tolist() == [3, -1, 0]
+    assert np.array_equal(embedding_store.lookup(['b', 'a']), [[3, 4, 5], [0, 1, 2]])
+    assert np.array_equal(embedding_store.lookup(['z', 'b'], missing='zero'), [[0, 0, 0], [3, 4, 5]])
+    with pytest.raises(KeyError):
+        embedding_store.lookup(['a', 'z'])
+
+
+def test_legacy_npy_round_trip(tmp_path, embedding_store):
+    npy_file_path = str(tmp_path / 'embedding.npy')
+    embedding_store.save_legacy_npy(npy_file_path)
+    embedding_dict = np.load(npy_file_path, allow_pickle=True).item()
+    assert sorted(embedding_dict) == TOKENS
+    assert np.array_equal(embedding_dict['b'], [3, 4, 5])
+    for path in (npy_file_path, str(tmp_path / 'embedding')):
+        loaded_store = load_embedding_store(path)
+        assert np.array_equal(loaded_store.lookup(TOKENS), embedding_store.vectors)
+
+
+def test_from_embedding_file_drops_sentence_end(tmp_path, embedding_store):
+    embedding_file_path = str(tmp_path / 'embedding.txt')
+    write_word2vec_text(
+        embedding_file_path, ['</s>'] + TOKENS, np.vstack([np.ones((1, 3)), embedding_store.vectors])
+    )
+    loaded_store = load_embedding_store(embedding_file_path)
+    assert loaded_store.tokens == TOKENS
+    assert np.allclose(loaded_store.vectors, embedding_store.vectors)
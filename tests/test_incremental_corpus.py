@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from subword_embedding.corpus_statistics import load_subword_counts
+from subword_embedding.incremental_corpus import update_corpus
+from subword_embedding.subword_corpus import MLF_ENCODING, MLFDataset, iter_mlf_utterances
+
+
+MLF_HEADER = '#!MLF!#\n'
+
+
+def write_mlf(target_file, utterances):
+    with open(target_file, 'w', encoding=MLF_ENCODING) as mlf_file:
+        mlf_file.write(MLF_HEADER + ''.join(utterance + '\n.\n' for utterance in utterances))
+
+
+@pytest.fixture
+def split_mlf(triphone_mlf, tmp_path):
+    """ The utterances of the triphone MLF split over two MLF files, the second repeating one of its utterances,
+        and the MLF file of all of them
+    """
+    with open(triphone_mlf, 'r', encoding=MLF_ENCODING) as mlf_file:
+        utterances = list(iter_mlf_utterances(mlf_file))
+    utterances[0] = utterances[0][len(MLF_HEADER):]
+    first_part, second_part = utterances[:120], utterances[120:] + [utterances[150]]
+    mlf_paths = [str(tmp_path / 'first.mlf'), str(tmp_path / 'second.mlf'), str(tmp_path / 'all.mlf')]
+    for mlf_path, part in zip(mlf_paths, [first_part, second_part, first_part + second_part]):
+        write_mlf(mlf_path, part)
+    return mlf_paths
+
+
+def read_outputs(corpus_path, unique_subwords_path, counts_path):
+    with open(corpus_path, 'r', encoding=MLF_ENCODING) as corpus_file:
+        corpus = corpus_file.read()
+    with open(unique_subwords_path, 'r') as subword_file:
+        unique_subwords = set(json.load(subword_file))
+    return corpus, unique_subwords, load_subword_counts(counts_path)
+
+
+def test_incremental_equals_full_build(split_mlf, tmp_path):
+    first_mlf, second_mlf, all_mlf = split_mlf
+    options = {'subword_context_width': 3, 'incl_posn_info': True, 'separate_apostrophe_embedding': False}
+
+    full_paths = [str(tmp_path / name) for name in ('full.dat', 'full-subwords.json', 'full-counts.json')]
+    subword_dataset = MLFDataset(path_to_mlf=all_mlf, streaming=True, **options)
+    subword_dataset.write_corpus(target_file=full_paths[0])
+    subword_dataset.save_unique_subwords(target_file=full_paths[1])
+    subword_dataset.save_subword_counts(target_file=full_paths[2])
+
+    incremental_paths = [str(tmp_path / name) for name in ('inc.dat', 'inc-subwords.json', 'inc-counts.json')]
+    num_appended = [
+        update_corpus(
+            mlf_path, incremental_paths[0], incremental_paths[1], str(tmp_path / 'inc.manifest.json'),
+            subword_counts_path=incremental_paths[2], **options
+        )
+        for mlf_path in (first_mlf, second_mlf, second_mlf)
+    ]
+
+    assert num_appended == [120, 181, 0]
+    assert read_outputs(*incremental_paths) == read_outputs(*full_paths)
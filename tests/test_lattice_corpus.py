@@ -0,0 +1,152 @@
+import gzip
+import os
+
+import numpy as np
+import pytest
+
+from subword_embedding.lattice_corpus import Lattice, LatticeDataset, iter_lattice_files
+from subword_embedding.subword_corpus import LabelNormaliser
+
+
+# Three paths from node 0 to node 3: arcs 3-4 ('e f g'), arcs 0-2 ('a c') and arcs 1-2 ('b c'). Arc 3 has
+# neither an alignment nor a word, so its unit is the word of its end node.
+LATTICE = '''VERSION=1.0
+UTTERANCE={name}
+lmscale=2.0 wdpenalty=-0.1
+acscale=1.0
+N=4 L=5
+# A comment
+I=0 t=0.00 W=!NULL
+I=1 t=0.10 W=!NULL
+I=2 t=0.20 W=e
+
+I=3 t=0.30 W=!NULL
+J=0 S=0 E=1 a=-1.0 l=-0.5 d=:a,0.10:
+J=1 S=0 E=1 a=-2.0 l=-0.5 d=:<s>,0.00:b,0.10:
+J=2 S=1 E=3 a=-1.0 l=0.0 W=c
+J=3 S=0 E=2 a=-1.5 l=-0.25
+J=4 S=2 E=3 a=-0.5 l=0.0 d=:f,0.10:g,0.10:
+'''
+# The score of every arc: a + lmscale * l + wdpenalty
+ARC_SCORES = [-2.1, -3.1, -1.1, -2.1, -0.6]
+# The paths, best first, with their sentences and scores
+PATHS = [([3, 4], 'e f g', -2.7), ([0, 2], 'a c', -3.2), ([1, 2], 'b c', -4.2)]
+
+
+def write_lattice(lattice_path, name='utt0'):
+    if lattice_path.endswith('.gz'):
+        with gzip.open(lattice_path, 'wt') as lattice_file:
+            lattice_file.write(LATTICE.format(name=name))
+    else:
+        with open(lattice_path, 'w') as lattice_file:
+            lattice_file.write(LATTICE.format(name=name))
+    return lattice_path
+
+
+def read_lattice(lattice_path):
+    return Lattice(lattice_path, 1, False, False, LabelNormaliser())
+
+
+@pytest.fixture
+def lattice(tmp_path):
+    return read_lattice(write_lattice(str(tmp_path / 'utt0.lat')))
+
+
+def test_header_nodes_and_arcs(lattice):
+    assert lattice.name == 'utt0'
+    assert lattice.num_nodes == 4
+    assert (lattice.start_node, lattice.end_node) == (0, 3)
+    assert lattice.arc_starts.tolist() == [0, 0, 1, 0, 2]
+    assert lattice.arc_ends.tolist() == [1, 1, 3, 2, 3]
+    assert lattice.arc_scores == pytest.approx(ARC_SCORES)
+    assert lattice.arc_tokens == [['a'], ['b'], ['c'], ['e'], ['f', 'g']]
+
+
+def test_gzipped_lattice_is_read(lattice, tmp_path):
+    gzipped_lattice = read_lattice(write_lattice(str(tmp_path / 'utt0.lat.gz')))
+    assert gzipped_lattice.arc_tokens == lattice.arc_tokens
+    assert np.array_equal(gzipped_lattice.arc_scores, lattice.arc_scores)
+
+
+def test_backward_scores_sum_every_path(lattice):
+    beta = lattice.backward_scores(lattice.topological_order())
+    assert beta[lattice.end_node] == 0
+    assert beta[lattice.start_node] == pytest.approx(np.logaddexp.reduce([score for _, _, score in PATHS]))
+    assert beta[2] == pytest.approx(ARC_SCORES[4])
+
+
+def test_nbest_order_and_scores(lattice):
+    paths = lattice.nbest_paths(5)
+    assert paths == [path for path, _, _ in PATHS]
+    assert [lattice.path_sentence(path) for path in paths] == [sentence for _, sentence, _ in PATHS]
+    assert [sum(ARC_SCORES[arc] for arc in path) for path in paths] == pytest.approx([score for _, _, score in PATHS])
+    assert lattice.nbest_paths(2) == paths[:2]
+
+
+def test_sampled_paths_follow_the_posteriors(lattice):
+    num_samples = 20000
+    paths = lattice.sample_paths(num_samples, np.random.RandomState(0))
+    assert len(paths) == num_samples
+    scores = np.array([score for _, _, score in PATHS])
+    posteriors = np.exp(scores - np.logaddexp.reduce(scores))
+    for (path, _, _), posterior in zip(PATHS, posteriors):
+        frequency = sum(sampled == path for sampled in paths) / num_samples
+        assert frequency == pytest.approx(posterior, abs=0.01)
+    assert lattice.sample_paths(10, np.random.RandomState(1)) == lattice.sample_paths(10, np.random.RandomState(1))
+
+
+def test_cycles_are_rejected(tmp_path):
+    lattice_path = str(tmp_path / 'cycle.lat')
+    with open(lattice_path, 'w') as lattice_file:
+        lattice_file.write(
+            LATTICE.format(name='cycle') + 'J=5 S=1 E=2 a=0.0 l=0.0 W=c\nJ=6 S=2 E=1 a=0.0 l=0.0 W=c\n'
+        )
+    with pytest.raises(ValueError, match='cycle'):
+        read_lattice(lattice_path).topological_order()
+
+
+@pytest.fixture
+def lattice_dir(tmp_path):
+    lattice_dir = tmp_path / 'lattices'
+    lattice_dir.mkdir()
+    for i in range(20):
+        extension = '.lat.gz' if i % 2 else '.lat'
+        write_lattice(str(lattice_dir / 'utt{:02d}{}'.format(i, extension)), name='utt{:02d}'.format(i))
+    (lattice_dir / 'notes.txt').write_text('not a lattice')
+    return str(lattice_dir)
+
+
+def test_lattice_files_are_listed_in_order(lattice_dir, tmp_path):
+    lattice_paths = list(iter_lattice_files(lattice_dir))
+    assert [os.path.basename(path).split('.')[0] for path in lattice_paths] == ['utt{:02d}'.format(i) for i in range(20)]
+    list_path = str(tmp_path / 'lattices.list')
+    with open(list_path, 'w') as list_file:
+        list_file.write('\n'.join(lattice_paths[:3]) + '\n\n')
+    assert list(iter_lattice_files(list_path)) == lattice_paths[:3]
+
+
+@pytest.mark.parametrize('path_mode', ['sample', 'nbest'])
+def test_corpus_is_identical_with_workers(lattice_dir, tmp_path, path_mode):
+    corpora = []
+    for workers in (1, 3):
+        dataset = LatticeDataset(
+            lattice_dir, 1, False, False, path_mode=path_mode, num_paths=3, workers=workers,
+            normaliser=LabelNormaliser()
+        )
+        corpus_path = str(tmp_path / 'corpus{}.txt'.format(workers))
+        dataset.write_corpus(corpus_path)
+        with open(corpus_path, 'rb') as corpus_file:
+            corpora.append(corpus_file.read())
+        assert dataset.subwords == {'a', 'b', 'c', 'e', 'f', 'g'}
+        assert dataset.num_sentences == 60
+        assert dataset.num_tokens == len(corpora[-1].split())
+    assert corpora[0] == corpora[1]
+    sentences = corpora[0].decode('utf-8').split('\n')
+    if path_mode == 'nbest':
+        assert sentences[:3] == [sentence for _, sentence, _ in PATHS]
+    assert set(sentences) <= set(sentence for _, sentence, _ in PATHS)
+
+
+def test_unknown_path_mode_is_rejected(lattice_dir):
+    with pytest.raises(ValueError, match='path mode'):
+        LatticeDataset(lattice_dir, 1, False, False, path_mode='viterbi')
@@ -0,0 +1,117 @@
+import os
+import shutil
+
+import pytest
+
+from subword_embedding.mlf_index import MLFIndex, build_mlf_index, default_index_path
+from subword_embedding.subword_corpus import LabelNormaliser, MLFDataset
+
+
+NEW_UTTERANCE = '"*/new000000.lab"\n0 100000 sil-G1^ID1+G2^FD1 -1.0000\n100000 200000 G1^ID1-G2^FD1+sil -2.0000\n.\n'
+
+
+@pytest.fixture
+def mlf_path(triphone_mlf, tmp_path):
+    """ A copy of the triphone MLF, which the tests may modify and index next to """
+    mlf_path = str(tmp_path / 'train.mlf')
+    shutil.copyfile(triphone_mlf, mlf_path)
+    return mlf_path
+
+
+def open_index(mlf_path, subword_context_width=3, incl_posn_info=True):
+    return MLFIndex(mlf_path, subword_context_width, incl_posn_info, False, normaliser=LabelNormaliser())
+
+
+def arcs(sentence_labels):
+    return [(arc.start_time_s, arc.end_time_s, arc.token, arc.neg_log_score) for arc in sentence_labels.arc_list]
+
+
+@pytest.mark.parametrize('subword_context_width,incl_posn_info', [(1, False), (3, True)])
+def test_random_access_matches_a_full_parse(mlf_path, subword_context_width, incl_posn_info):
+    dataset = MLFDataset(
+        mlf_path, subword_context_width, incl_posn_info, False, normaliser=LabelNormaliser()
+    )
+    mlf_index = open_index(mlf_path, subword_context_width, incl_posn_info)
+    try:
+        assert len(mlf_index) == len(dataset.ref_list)
+        assert mlf_index.label_names() == [sentence.label_name for sentence in dataset.ref_list]
+        # Look the utterances up out of order
+        for utterance_idx in [len(dataset.ref_list) - 1, 0, 137, 5, 137]:
+            expected = dataset.ref_list[utterance_idx]
+            sentence_labels = mlf_index[expected.label_name]
+            assert sentence_labels.label_name == expected.label_name
+            assert arcs(sentence_labels) == arcs(expected)
+        assert '"*/missing.lab"' not in mlf_index
+        with pytest.raises(KeyError):
+            mlf_index['"*/missing.lab"']
+    finally:
+        mlf_index.close()
+
+
+def test_index_matches_compact_and_streaming_labels(mlf_path):
+    compact = MLFDataset(mlf_path, 3, True, False, compact=True, normaliser=LabelNormaliser())
+    streaming = MLFDataset(mlf_path, 3, True, False, streaming=True, normaliser=LabelNormaliser())
+    streamed = list(streaming.iter_sentences())
+    mlf_index = open_index(mlf_path)
+    try:
+        label_names = list(reversed(mlf_index.label_names()))
+        indexed = list(mlf_index.iter_sentence_labels(label_names))
+        # The utterances are read back in file order
+        assert [label_name for label_name, _ in indexed] == mlf_index.label_names()
+        assert len(indexed) == len(compact.ref_list) == len(streamed)
+        for (label_name, sentence_labels), compact_view, streamed_labels in zip(indexed, compact.ref_list, streamed):
+            assert label_name == compact_view.label_name == streamed_labels.label_name
+            assert sentence_labels.sentence() == compact_view.sentence() == streamed_labels.sentence()
+            assert arcs(sentence_labels) == arcs(streamed_labels)
+    finally:
+        mlf_index.close()
+
+
+def test_a_changed_mlf_invalidates_the_index(mlf_path):
+    index_path = build_mlf_index(mlf_path)
+    assert index_path == default_index_path(mlf_path)
+    assert MLFIndex.is_current(mlf_path, index_path)
+
+    with open(mlf_path, 'a') as mlf_file:
+        mlf_file.write(NEW_UTTERANCE)
+    assert not MLFIndex.is_current(mlf_path, index_path)
+    mlf_index = open_index(mlf_path)
+    try:
+        assert MLFIndex.is_current(mlf_path, index_path)
+        assert len(mlf_index) == 301
+        expected = MLFDataset(mlf_path, 3, True, False, normaliser=LabelNormaliser()).ref_list[-1]
+        assert expected.label_name == '"*/new000000.lab"'
+        assert arcs(mlf_index['"*/new000000.lab"']) == arcs(expected)
+    finally:
+        mlf_index.close()
+
+
+def test_an_edit_of_the_same_size_invalidates_the_index(mlf_path):
+    with open(mlf_path, 'a') as mlf_file:
+        mlf_file.write(NEW_UTTERANCE)
+    index_path = build_mlf_index(mlf_path)
+    with open(mlf_path, 'r') as mlf_file:
+        content = mlf_file.read()
+    with open(mlf_path, 'w') as mlf_file:
+        mlf_file.write(content.replace('-2.0000', '-3.0000'))
+    file_stat = os.stat(mlf_path)
+    os.utime(mlf_path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 10 ** 9))
+    assert not MLFIndex.is_current(mlf_path, index_path)
+
+    mlf_index = open_index(mlf_path)
+    try:
+        assert mlf_index['"*/new000000.lab"'].arc_list[-1].neg_log_score == -3.0
+    finally:
+        mlf_index.close()
+
+
+def test_empty_mlf(tmp_path):
+    mlf_path = str(tmp_path / 'empty.mlf')
+    with open(mlf_path, 'w') as mlf_file:
+        mlf_file.write('#!MLF!#\n')
+    mlf_index = open_index(mlf_path)
+    try:
+        assert len(mlf_index) == 0
+        assert mlf_index.label_names() == []
+    finally:
+        mlf_index.close()
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from subword_embedding.corpus_statistics import ngram_counts
+from subword_embedding.ngram_context import (
+    MISSING_CONTEXT_ID, context_extent, ngram_context, ngram_id_matrix, ngram_tokens
+)
+from subword_embedding.subword_corpus import LabelNormaliser, MLFDataset
+
+
+# Two utterances of the tokens a, b, c
+TOKENS = ['a', 'b', 'c']
+TOKEN_IDS = [0, 1, 2, 2, 0]
+OFFSETS = [0, 3, 5]
+
+
+def test_context_extent():
+    assert context_extent(1) == (0, 0)
+    assert context_extent(2) == (1, 0)
+    assert context_extent(3) == (1, 1)
+    assert context_extent(4) == (2, 1)
+    assert context_extent(3, 'left') == (2, 0)
+    assert context_extent(3, 'right') == (0, 2)
+    with pytest.raises(ValueError):
+        context_extent(0)
+    with pytest.raises(ValueError):
+        context_extent(3, 'centre')
+
+
+def test_context_stops_at_utterance_boundaries():
+    ngrams = ngram_id_matrix(TOKEN_IDS, OFFSETS, 3)
+    missing = MISSING_CONTEXT_ID
+    assert ngrams.tolist() == [[missing, 0, 1], [0, 1, 2], [1, 2, missing], [missing, 2, 0], [2, 0, missing]]
+    assert ngram_id_matrix(TOKEN_IDS, OFFSETS, 2, 'right').tolist() == [[0, 1], [1, 2], [2, missing], [2, 0], [0, missing]]
+
+
+def test_ngram_tokens_are_rendered_as_the_units_of_the_ngram():
+    ngrams = np.array([[MISSING_CONTEXT_ID, 0, 1], [0, 1, 2]])
+    assert ngram_tokens(ngrams, TOKENS) == ['ab', 'abc']
+    assert ngram_tokens(ngrams, TOKENS, ' ') == ['a b', 'a b c']
+
+
+def test_ngrams_rendered_alike_share_a_token():
+    # a+b opens the first utterance and a-b ends the second
+    ngram_ids, tokens = ngram_context([0, 1, 2, 0, 1], [0, 2, 5], TOKENS, 3)
+    assert len(tokens) == len(set(tokens))
+    assert [tokens[ngram_id] for ngram_id in ngram_ids] == ['ab', 'ab', 'ca', 'cab', 'ab']
+    assert ngram_ids[0] == ngram_ids[1] == ngram_ids[4]
+
+
+def test_ngram_counts_keep_their_keys():
+    assert ngram_counts(np.array([0, 1, 2, 0, 1]), np.array([0, 5]), TOKENS, 2) == {'a-b': 2, 'b-c': 1, 'c-a': 1}
+
+
+def strip_boundary_context(token, separator, first, last):
+    """ Remove the silence the HTK labels name as the context beyond either end of the utterance """
+    if first:
+        token = token[len('sil' + separator):] if token.startswith('sil' + separator) else token
+    if last:
+        token = token[:-len(separator + 'sil')] if token.endswith(separator + 'sil') else token
+    return token
+
+
+@pytest.mark.parametrize('subword_context_width', [2, 3])
+@pytest.mark.parametrize('incl_posn_info,separate_apostrophe_embedding', [(True, False), (False, True)])
+def test_derived_context_matches_the_htk_labels(triphone_mlf, subword_context_width, incl_posn_info,
+                                                 separate_apostrophe_embedding):
+    options = (subword_context_width, incl_posn_info, separate_apostrophe_embedding)
+    parsed = MLFDataset(triphone_mlf, *options, normaliser=LabelNormaliser())
+    derived = MLFDataset(triphone_mlf, *options, normaliser=LabelNormaliser(), context_direction='both')
+    derived_tokens = derived.ref_list.vocabulary.tokens
+    separator = '' if incl_posn_info else ' '
+
+    assert len(parsed.ref_list) == len(derived.ref_list)
+    num_boundary_arcs = 0
+    for parsed_sentence, derived_sentence in zip(parsed.ref_list, derived.ref_list):
+        assert parsed_sentence.label_name == derived_sentence.label_name
+        parsed_arcs = [arc.token for arc in parsed_sentence.arc_list]
+        derived_arcs = [derived_tokens[token_id] for token_id in derived_sentence.token_ids.tolist()]
+        assert len(parsed_arcs) == len(derived_arcs)
+        for arc_idx, (parsed_token, derived_token) in enumerate(zip(parsed_arcs, derived_arcs)):
+            first, last = arc_idx == 0, arc_idx == len(parsed_arcs) - 1
+            if first or (last and subword_context_width == 3):
+                num_boundary_arcs += 1
+                parsed_token = strip_boundary_context(parsed_token, separator, first, last)
+            assert derived_token == parsed_token
+    assert num_boundary_arcs > 0
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from subword_embedding.corpus_statistics import keep_probabilities
+from subword_embedding.numpy_word2vec import (
+    UNIGRAM_POWER, Word2VecTrainer, context_pairs, noise_distribution, split_multiword_tokens
+)
+
+
+# Two groups of units which only ever occur with units of their own group
+CLUSTERS = [['a{}'.format(i) for i in range(4)], ['b{}'.format(i) for i in range(4)]]
+
+
+def clustered_corpus(num_sentences=400, sentence_length=8, seed=0):
+    """ A token ID corpus whose sentences are drawn from one cluster each """
+    rng = np.random.RandomState(seed)
+    words = CLUSTERS[0] + CLUSTERS[1]
+    sentences = []
+    for sentence in range(num_sentences):
+        cluster = sentence % 2
+        sentences.append(rng.randint(0, len(CLUSTERS[0]), size=sentence_length) + cluster * len(CLUSTERS[0]))
+    offsets = np.arange(num_sentences + 1) * sentence_length
+    return np.concatenate(sentences), offsets, words
+
+
+def mean_cosines(words, vectors):
+    """ The mean cosine similarity of pairs of units in the same cluster and in different clusters """
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    cosines = vectors.dot(vectors.T)
+    cluster = np.array([int(word[0] == 'b') for word in words])
+    same = cluster[:, None] == cluster[None, :]
+    off_diagonal = ~np.eye(len(words), dtype=bool)
+    return cosines[same & off_diagonal].mean(), cosines[~same].mean()
+
+
+def test_noise_distribution_is_the_smoothed_unigram_distribution():
+    counts = np.array([100, 10, 1, 0, 30])
+    noise_cdf = noise_distribution(counts)
+    expected = counts ** UNIGRAM_POWER / (counts ** UNIGRAM_POWER).sum()
+    assert noise_cdf[-1] == pytest.approx(1.0)
+    assert np.diff(np.concatenate(([0], noise_cdf))) == pytest.approx(expected)
+
+    trainer = Word2VecTrainer(4, negative=5)
+    negatives = trainer._negative_samples(np.zeros(20000, dtype=np.int64), noise_cdf, np.random.RandomState(0))
+    assert negatives.shape == (20000, 5)
+    frequencies = np.bincount(negatives.ravel(), minlength=len(counts)) / negatives.size
+    assert frequencies == pytest.approx(expected, abs=0.01)
+    # Words which never occur are never drawn
+    assert frequencies[3] == 0
+
+
+def test_keep_probabilities():
+    counts = np.array([900, 90, 9, 1, 0])
+    sample = 0.01
+    keep = keep_probabilities(counts, sample)
+    fractions = counts / counts.sum()
+    expected = np.minimum((np.sqrt(fractions[:4] / sample) + 1) * sample / fractions[:4], 1.0)
+    assert keep[:4] == pytest.approx(expected)
+    # Unseen words do not divide by zero
+    assert keep[4] == 1.0
+    # Frequent words are discarded most often and words below the threshold are always kept
+    assert np.all(np.diff(keep[:4]) >= 0)
+    assert keep[0] < 0.2 and keep[3] == 1.0
+
+
+def test_context_windows_stay_within_sentences():
+    utterance_ids = np.array([0, 0, 0, 1, 2, 2, 2, 2])
+    centres, contexts = context_pairs(utterance_ids, 2, np.random.RandomState(0))
+    assert len(centres) > 0
+    assert np.all(utterance_ids[centres] == utterance_ids[contexts])
+    assert np.all(np.abs(centres - contexts) <= 2) and np.all(centres != contexts)
+    assert np.all(np.diff(centres) >= 0)
+    # The one-token sentence has no context
+    assert 3 not in centres and 3 not in contexts
+
+
+def test_context_window_of_one_is_the_neighbours():
+    utterance_ids = np.array([0, 0, 0, 1, 1])
+    centres, contexts = context_pairs(utterance_ids, 1, np.random.RandomState(0))
+    assert sorted(zip(centres.tolist(), contexts.tolist())) == [(0, 1), (1, 0), (1, 2), (2, 1), (3, 4), (4, 3)]
+
+
+def test_multiword_tokens_are_split():
+    word_ids, offsets, words = split_multiword_tokens([0, 1, 0], [0, 2, 3], ['G1 A', 'G2'])
+    assert words == ['G1', 'A', 'G2']
+    assert word_ids.tolist() == [0, 1, 2, 0, 1]
+    assert offsets.tolist() == [0, 3, 5]
+
+
+@pytest.mark.parametrize('trainer_options', [
+    {'cbow': True},
+    {'cbow': False},
+    {'cbow': True, 'workers': 2},
+    {'cbow': False, 'workers': 2},
+    {'cbow': True, 'sample': 0.01},
+])
+def test_training_separates_planted_clusters(trainer_options):
+    token_ids, offsets, words = clustered_corpus()
+    trainer = Word2VecTrainer(8, window=3, epochs=5, seed=3, verbose=False, **trainer_options)
+    trained_words, vectors = trainer.train(token_ids, offsets, words)
+    assert sorted(trained_words) == sorted(words)
+    assert vectors.shape == (len(words), 8)
+    assert np.all(np.isfinite(vectors))
+    same_cluster, cross_cluster = mean_cosines(trained_words, vectors)
+    assert same_cluster > cross_cluster + 0.2
+
+
+def test_training_is_deterministic():
+    token_ids, offsets, words = clustered_corpus(num_sentences=50)
+    first = Word2VecTrainer(4, epochs=2, verbose=False).train(token_ids, offsets, words)
+    second = Word2VecTrainer(4, epochs=2, verbose=False).train(token_ids, offsets, words)
+    assert first[0] == second[0]
+    assert np.array_equal(first[1], second[1])
+
+
+def test_rare_words_are_discarded():
+    token_ids, offsets, words = clustered_corpus(num_sentences=50)
+    token_ids = np.append(token_ids, len(words))
+    offsets = np.append(offsets, len(token_ids))
+    trained_words, vectors = Word2VecTrainer(4, epochs=1, min_count=2, verbose=False).train(
+        token_ids, offsets, words + ['rare']
+    )
+    assert 'rare' not in trained_words
+    assert len(vectors) == len(words)
@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+from subword_embedding.pipeline import CorpusPipeline, GZIP_SUFFIX, open_corpus
+
+
+BATCHES = [(['ა ვ', 'ს sil'], {'ა', 'ვ', 'ს', 'sil'}), ([], set()), (['G1 ა'], {'G1', 'ა'})]
+
+
+@pytest.mark.parametrize('suffix', ['', GZIP_SUFFIX])
+def test_written_bytes_match_the_corpus(tmp_path, suffix):
+    corpus_path = str(tmp_path / 'corpus.dat') + suffix
+    corpus_pipeline = CorpusPipeline(corpus_path, queue_size=1)
+    assert corpus_pipeline.run(iter(BATCHES)) == {'ა', 'ვ', 'ს', 'sil', 'G1'}
+
+    with open_corpus(corpus_path) as corpus_file:
+        corpus = corpus_file.read()
+    assert corpus == 'ა ვ\nს sil\nG1 ა'
+    write_stats = corpus_pipeline.stats['write'].summary()
+    assert (write_stats['batches'], write_stats['sentences']) == (3, 3)
+    # Each Georgian letter takes three bytes in UTF-8
+    assert write_stats['bytes'] == len(corpus.encode('utf-8')) == len(corpus) + 2 * 4
+    if not suffix:
+        assert write_stats['bytes'] == os.path.getsize(corpus_path)
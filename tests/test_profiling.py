@@ -0,0 +1,36 @@
+import json
+import os
+
+import pytest
+
+from subword_embedding.cli import corpus_command, parse_arguments
+from subword_embedding.profiling import Profiler
+from subword_embedding.subword_corpus import MLF_ENCODING
+
+
+@pytest.mark.parametrize('options', [
+    [], ['--streaming'], ['--workers', '2'], ['--compact'], ['--binary-corpus', 'binary'], ['--pipeline']
+])
+def test_corpus_counters_match_the_written_corpus(triphone_mlf, tmp_path, options):
+    corpus_path = str(tmp_path / 'corpus.dat')
+    unique_subwords_path = str(tmp_path / 'unique-subwords.json')
+    if '--binary-corpus' in options:
+        options = ['--binary-corpus', str(tmp_path / 'binary')]
+    args = parse_arguments([
+        'corpus', '-i', triphone_mlf, '-c', '3', '--loc-info', '--subword-corpus', corpus_path,
+        '-u', unique_subwords_path
+    ] + options)
+    profiler = Profiler(trace_memory=False)
+    corpus_command(args, profiler)
+
+    with open(corpus_path, 'r', encoding=MLF_ENCODING) as corpus_file:
+        sentences = corpus_file.read().split('\n')
+    with open(unique_subwords_path, 'r') as subword_file:
+        unique_subwords = json.load(subword_file)
+    counters = profiler.stages[0].counters
+    assert counters['sentences'] == len(sentences) == 300
+    assert counters['tokens'] == sum(len(sentence.split()) for sentence in sentences)
+    assert counters['arcs'] == counters['tokens']
+    assert counters['corpus_bytes'] == os.path.getsize(corpus_path)
+    assert counters['unique_subwords'] == len(unique_subwords)
+    assert counters['norm_cache_hits'] + counters['norm_cache_misses'] == counters['arcs']
@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+import pytest
+
+from subword_embedding.embedding_store import EmbeddingStore, load_embedding_store
+from subword_embedding.quantization import (
+    QUANTIZED_ARRAYS_SUFFIX, QuantizedEmbeddingStore, dequantize, quantize, reconstruction_error
+)
+
+
+NUM_TOKENS = 300
+VECTOR_LENGTH = 8
+# The largest absolute error of each format on vectors drawn from a unit normal distribution
+MAX_ERRORS = {'float16': 1e-2, 'int8': 5e-2, 'pq': 1.5}
+
+
+@pytest.fixture(scope='session')
+def vectors():
+    return np.random.RandomState(1).randn(NUM_TOKENS, VECTOR_LENGTH).astype(np.float32)
+
+
+@pytest.fixture(scope='session')
+def embedding_store(vectors):
+    return EmbeddingStore(['t{}'.format(row) for row in range(NUM_TOKENS)], vectors)
+
+
+@pytest.mark.parametrize('method', ['float16', 'int8', 'pq'])
+def test_round_trip(vectors, method):
+    arrays = quantize(vectors, method, num_centroids=64)
+    reconstructed = dequantize(method, arrays)
+    assert reconstructed.shape == vectors.shape
+    assert reconstructed.dtype == np.float32
+    assert np.abs(reconstructed - vectors).max() < MAX_ERRORS[method]
+    rows = np.array([5, 0, 299])
+    assert np.array_equal(dequantize(method, arrays, rows), reconstructed[rows])
+
+
+def test_quantized_arrays_are_smaller(vectors):
+    for method in ('float16', 'int8', 'pq'):
+        arrays = quantize(vectors, method, num_centroids=64)
+        assert sum(array.nbytes for array in arrays.values()) * 2 <= vectors.nbytes
+
+
+def test_int8_keeps_zero_rows(vectors):
+    zero_vectors = vectors.copy()
+    zero_vectors[3] = 0
+    reconstructed = dequantize('int8', quantize(zero_vectors, 'int8'))
+    assert not np.isnan(reconstructed).any()
+    assert not reconstructed[3].any()
+
+
+def test_pq_refuses_a_codebook_of_every_vector(vectors):
+    with pytest.raises(ValueError, match='no smaller than float32'):
+        quantize(vectors[:64], 'pq', num_centroids=64)
+
+
+@pytest.mark.parametrize('num_tokens, num_centroids', [(10, 9), (256, 255), (NUM_TOKENS, 256)])
+def test_pq_default_centroids_fit_the_vocabulary(vectors, num_tokens, num_centroids):
+    arrays = quantize(vectors[:num_tokens], 'pq')
+    assert arrays['codebook'].shape[1] == num_centroids
+    assert dequantize('pq', arrays).shape == (num_tokens, VECTOR_LENGTH)
+
+
+def test_pq_options_are_checked(vectors):
+    with pytest.raises(ValueError, match='divide'):
+        quantize(vectors, 'pq', num_subvectors=3)
+    with pytest.raises(ValueError, match='centroids'):
+        quantize(vectors, 'pq', num_centroids=257)
+    with pytest.raises(ValueError, match='Unknown'):
+        quantize(vectors, 'int4')
+
+
+def test_reconstruction_error_fields(vectors):
+    error = reconstruction_error(vectors, vectors.copy())
+    assert list(error) == ['rmse', 'max_abs_error', 'mean_relative_error', 'mean_cosine_similarity']
+    assert error['rmse'] == 0 and error['max_abs_error'] == 0 and error['mean_relative_error'] == 0
+    assert error['mean_cosine_similarity'] == pytest.approx(1.0)
+
+    error = reconstruction_error(vectors, 2 * vectors)
+    assert error['rmse'] == pytest.approx(np.sqrt(np.mean(vectors.astype(np.float64) ** 2)))
+    assert error['max_abs_error'] == pytest.approx(np.abs(vectors).max())
+    assert error['mean_relative_error'] == pytest.approx(1.0)
+    assert error['mean_cosine_similarity'] == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize('method', ['float16', 'int8', 'pq'])
+def test_store_save_load_and_lookup(embedding_store, tmp_path, method):
+    quantized_store = QuantizedEmbeddingStore.from_store(embedding_store, method, num_centroids=64)
+    assert quantized_store.error['max_abs_error'] < MAX_ERRORS[method]
+    path_prefix = str(tmp_path / 'store' / 'embedding')
+    quantized_store.save(path_prefix)
+    assert os.path.exists(path_prefix + QUANTIZED_ARRAYS_SUFFIX)
+
+    loaded_store = load_embedding_store(path_prefix)
+    assert isinstance(loaded_store, QuantizedEmbeddingStore)
+    assert loaded_store.tokens == embedding_store.tokens
+    assert loaded_store.vector_length == VECTOR_LENGTH
+    assert loaded_store.error == pytest.approx(dict(quantized_store.error))
+    assert np.array_equal(loaded_store.vectors, quantized_store.vectors)
+
+    tokens = ['t7', 't0', 't7']
+    vectors = loaded_store.lookup(tokens)
+    assert np.array_equal(vectors, quantized_store.vectors[[7, 0, 7]])
+    assert np.array_equal(loaded_store['t7'], vectors[0])
+    with pytest.raises(KeyError):
+        loaded_store.lookup(['t7', 'unknown'])
+    vectors = loaded_store.lookup(['t7', 'unknown'], missing='zero')
+    assert np.array_equal(vectors[0], quantized_store.vectors[7])
+    assert not vectors[1].any()
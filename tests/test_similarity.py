@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from subword_embedding.cli import main, parse_arguments
+from subword_embedding.embedding_store import EmbeddingStore
+from subword_embedding.similarity import NeighbourIndex, QUERY_BATCH_SIZE
+
+
+NUM_TOKENS = QUERY_BATCH_SIZE + 50
+VECTOR_LENGTH = 6
+
+
+@pytest.fixture(scope='module')
+def embedding_store():
+    vectors = np.random.RandomState(3).randn(NUM_TOKENS, VECTOR_LENGTH).astype(np.float32)
+    vectors[7] = 0
+    return EmbeddingStore(['t{}'.format(row) for row in range(NUM_TOKENS)], vectors)
+
+
+def brute_force_neighbours(vectors, row, k):
+    norms = np.linalg.norm(vectors, axis=1)
+    norms[norms == 0] = 1
+    similarities = vectors.dot(vectors[row]) / (norms * norms[row])
+    similarities[row] = -np.inf
+    return np.argsort(-similarities, kind='mergesort')[:k], np.sort(similarities)[::-1][:k]
+
+
+@pytest.mark.parametrize('k', [1, 5, NUM_TOKENS + 3])
+def test_top_k_matches_brute_force(embedding_store, k):
+    neighbour_index = NeighbourIndex(embedding_store)
+    tokens = ['t0', 't7', 't{}'.format(NUM_TOKENS - 1)]
+    for token, neighbours in zip(tokens, neighbour_index.query(tokens, k)):
+        expected_rows, expected_similarities = brute_force_neighbours(
+            embedding_store.vectors, embedding_store.token_to_row[token], min(k, NUM_TOKENS - 1)
+        )
+        assert len(neighbours) == len(expected_rows)
+        assert token not in [neighbour for neighbour, _ in neighbours]
+        assert np.allclose([similarity for _, similarity in neighbours], expected_similarities, atol=1e-5)
+        if token != 't7':
+            # The zero vector of t7 is equally similar to every row, so only the others have a unique order
+            assert [neighbour for neighbour, _ in neighbours] == [embedding_store.tokens[row] for row in expected_rows]
+
+
+def test_neighbour_table_covers_every_batch(embedding_store):
+    table = list(NeighbourIndex(embedding_store).neighbour_table(k=2))
+    assert [token for token, _ in table] == embedding_store.tokens
+    assert all(len(neighbours) == 2 for _, neighbours in table)
+
+
+def test_cache_hits_and_eviction(embedding_store):
+    neighbour_index = NeighbourIndex(embedding_store, cache_size=2)
+    first = neighbour_index.query(['t1', 't2'], 3)
+    assert neighbour_index.query(['t2', 't1'], 3) == first[::-1]
+    assert (neighbour_index.hits, neighbour_index.misses) == (2, 2)
+    # t2 was the least recently used entry when t3 was added
+    neighbour_index.query(['t3'], 3)
+    neighbour_index.query(['t1'], 3)
+    assert (neighbour_index.hits, neighbour_index.misses) == (3, 3)
+    neighbour_index.query(['t2'], 3)
+    assert (neighbour_index.hits, neighbour_index.misses) == (3, 4)
+    assert len(neighbour_index.cache) == 2
+
+
+def test_unknown_tokens_are_reported(embedding_store, tmp_path, capsys):
+    neighbour_index = NeighbourIndex(embedding_store)
+    with pytest.raises(KeyError, match='unknown'):
+        neighbour_index.query(['t1', 'unknown'])
+    assert neighbour_index.misses == 0
+
+    store_prefix = str(tmp_path / 'store')
+    embedding_store.save(store_prefix)
+    table_path = str(tmp_path / 'neighbours.tsv')
+    main(parse_arguments(['query', '-e', store_prefix, '-o', table_path, '-k', '2', '-q', 't4', 'unknown', 't5']))
+    assert 'unknown' in capsys.readouterr().out
+    with open(table_path, 'r') as table_file:
+        assert [line.split('\t')[0] for line in table_file] == ['t4', 't5']
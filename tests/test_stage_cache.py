@@ -0,0 +1,172 @@
+import os
+
+import pytest
+
+from subword_embedding.cli import parse_arguments, train_command
+from subword_embedding.profiling import Profiler
+from subword_embedding.stage_cache import StageCache
+
+
+def write_file(path_name, content):
+    with open(path_name, 'w') as output_file:
+        output_file.write(content)
+
+
+def read_file(path_name):
+    with open(path_name, 'r') as input_file:
+        return input_file.read()
+
+
+@pytest.fixture
+def stage_cache(tmp_path):
+    return StageCache(str(tmp_path / 'cache'))
+
+
+@pytest.fixture
+def corpus_file(tmp_path):
+    corpus_path = str(tmp_path / 'corpus.txt')
+    write_file(corpus_path, 'a b c\nb c d')
+    return corpus_path
+
+
+def test_unchanged_inputs_hit_the_cache(stage_cache, corpus_file, tmp_path):
+    output_path = str(tmp_path / 'embedding.txt')
+    key = stage_cache.key('train', [corpus_file], options={'vec_length': 4})
+    assert not stage_cache.restore('train', key, {'embedding': output_path})
+
+    write_file(output_path, 'trained')
+    assert stage_cache.store('train', key, {'embedding': output_path})
+    os.remove(output_path)
+
+    assert stage_cache.key('train', [corpus_file], options={'vec_length': 4}) == key
+    assert stage_cache.restore('train', key, {'embedding': output_path})
+    assert read_file(output_path) == 'trained'
+
+
+def test_content_changes_invalidate_the_key(stage_cache, corpus_file):
+    key = stage_cache.key('corpus', [corpus_file])
+    write_file(corpus_file, 'a b c\nb c e')
+    assert stage_cache.key('corpus', [corpus_file]) != key
+
+
+def test_modification_times_alone_do_not_invalidate_the_key(stage_cache, corpus_file):
+    key = stage_cache.key('corpus', [corpus_file])
+    file_stat = os.stat(corpus_file)
+    os.utime(corpus_file, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 10 ** 9))
+    assert stage_cache.key('corpus', [corpus_file]) == key
+    # The same content rewritten later also gives the same key
+    write_file(corpus_file, read_file(corpus_file))
+    assert stage_cache.key('corpus', [corpus_file]) == key
+
+
+def test_options_change_the_key(stage_cache, corpus_file):
+    assert stage_cache.key('train', [corpus_file], options={'vec_length': 4}) != \
+        stage_cache.key('train', [corpus_file], options={'vec_length': 8})
+
+
+def test_upstream_keys_are_chained(stage_cache, corpus_file, tmp_path):
+    corpus_key = stage_cache.key('corpus', [corpus_file])
+    train_key = stage_cache.key('train', options={'vec_length': 4}, upstream_key=corpus_key)
+    assert stage_cache.key('train', options={'vec_length': 4}, upstream_key=corpus_key) == train_key
+
+    write_file(corpus_file, 'a b c\nb c e')
+    changed_corpus_key = stage_cache.key('corpus', [corpus_file])
+    changed_train_key = stage_cache.key('train', options={'vec_length': 4}, upstream_key=changed_corpus_key)
+    assert changed_train_key != train_key
+    visualise_key = stage_cache.key('visualise', upstream_key=train_key)
+    assert stage_cache.key('visualise', upstream_key=changed_train_key) != visualise_key
+
+
+def test_stale_artifacts_are_not_cached(stage_cache, tmp_path):
+    output_path = str(tmp_path / 'embedding.txt')
+    write_file(output_path, 'previous run')
+    snapshot = stage_cache.snapshot({'embedding': output_path})
+    # The stage ran without writing its output
+    assert not stage_cache.store('train', 'key', {'embedding': output_path}, snapshot)
+    assert not stage_cache.restore('train', 'key', {'embedding': output_path})
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    # Room for two entries of 400 KB, but not three
+    stage_cache = StageCache(str(tmp_path / 'cache'), max_size_mb=1)
+    output_path = str(tmp_path / 'output.txt')
+    for key in ('first', 'second'):
+        write_file(output_path, key[0] * 400 * 1024)
+        assert stage_cache.store('stage', key, {'output': output_path})
+    manifest_time = os.path.getmtime(os.path.join(stage_cache.entry_dir('stage', 'first'), 'entry.json'))
+    os.utime(os.path.join(stage_cache.entry_dir('stage', 'second'), 'entry.json'), (manifest_time - 10, manifest_time - 10))
+    # Using the first entry makes the second the least recently used
+    assert stage_cache.restore('stage', 'first', {'output': output_path})
+
+    write_file(output_path, 't' * 400 * 1024)
+    assert stage_cache.store('stage', 'third', {'output': output_path})
+    assert os.path.exists(stage_cache.entry_dir('stage', 'first'))
+    assert not os.path.exists(stage_cache.entry_dir('stage', 'second'))
+    assert os.path.exists(stage_cache.entry_dir('stage', 'third'))
+
+
+def test_entries_larger_than_the_cache_are_not_kept(tmp_path):
+    stage_cache = StageCache(str(tmp_path / 'cache'), max_size_mb=0.1)
+    output_path = str(tmp_path / 'output.txt')
+    write_file(output_path, 'x' * 200 * 1024)
+    assert not stage_cache.store('stage', 'key', {'output': output_path})
+
+
+def train_key(stage_cache, corpus_file, tmp_path, *options):
+    args = parse_arguments([
+        'train', '--subword-corpus', corpus_file, '-u', corpus_file, '-e', str(tmp_path / 'embedding')
+    ] + list(options))
+    key = []
+    # Stop before training by failing on the first stage cache lookup
+    original_restore = stage_cache.restore
+
+    def record_key(stage, cache_key, artifacts):
+        key.append(cache_key)
+        raise StopIteration
+
+    stage_cache.restore = record_key
+    try:
+        with pytest.raises(StopIteration):
+            train_command(args, Profiler(enabled=False), stage_cache)
+    finally:
+        stage_cache.restore = original_restore
+    return key[0]
+
+
+def test_train_key_includes_the_word2vec_binary_and_binary_corpus(stage_cache, corpus_file, tmp_path):
+    first_binary = str(tmp_path / 'word2vec-a')
+    second_binary = str(tmp_path / 'word2vec-b')
+    write_file(first_binary, 'binary a')
+    write_file(second_binary, 'binary a')
+    first_key = train_key(stage_cache, corpus_file, tmp_path, '-w2v', first_binary)
+    assert train_key(stage_cache, corpus_file, tmp_path, '-w2v', first_binary) == first_key
+    assert train_key(stage_cache, corpus_file, tmp_path, '-w2v', second_binary) != first_key
+    # Rebuilding the binary in place also invalidates the embedding
+    write_file(first_binary, 'binary a, rebuilt')
+    assert train_key(stage_cache, corpus_file, tmp_path, '-w2v', first_binary) != first_key
+
+    binary_corpus = tmp_path / 'binary-corpus'
+    binary_corpus.mkdir()
+    write_file(str(binary_corpus / 'tokens.bin'), 'ids')
+    text_key = train_key(stage_cache, corpus_file, tmp_path, '-m', 'word2vec-numpy')
+    binary_key = train_key(
+        stage_cache, corpus_file, tmp_path, '-m', 'word2vec-numpy', '--binary-corpus', str(binary_corpus)
+    )
+    assert binary_key != text_key
+    write_file(str(binary_corpus / 'tokens.bin'), 'other ids')
+    assert train_key(
+        stage_cache, corpus_file, tmp_path, '-m', 'word2vec-numpy', '--binary-corpus', str(binary_corpus)
+    ) != binary_key
+
+
+def test_train_key_includes_the_threads_of_the_numpy_trainer(stage_cache, corpus_file, tmp_path):
+    # The word2vec-numpy workers each train their own chunks, so their number changes the embedding
+    numpy_keys = [
+        train_key(stage_cache, corpus_file, tmp_path, '-m', 'word2vec-numpy', '--threads', threads)
+        for threads in ('1', '4')
+    ]
+    assert numpy_keys[0] != numpy_keys[1]
+    word2vec_keys = [
+        train_key(stage_cache, corpus_file, tmp_path, '--threads', threads) for threads in ('1', '4')
+    ]
+    assert word2vec_keys[0] == word2vec_keys[1]
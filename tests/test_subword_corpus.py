@@ -0,0 +1,131 @@
+import json
+import os
+
+import pytest
+
+from subword_embedding.cli import parse_arguments
+from subword_embedding.pipeline import CorpusPipeline
+from subword_embedding.subword_corpus import LabelNormaliser, MLFDataset
+
+
+# (subword context width, position information) of the corpora compared below
+CORPUS_OPTIONS = [(1, False), (1, True), (3, True)]
+
+
+def read_bytes(path_name):
+    with open(path_name, 'rb') as corpus_file:
+        return corpus_file.read()
+
+
+def write_corpus(mlf_path, target_dir, name, subword_context_width, incl_posn_info, **dataset_options):
+    """ Write the corpus of an MLFDataset, returning its bytes and unique subwords """
+    dataset = MLFDataset(
+        mlf_path, subword_context_width, incl_posn_info, separate_apostrophe_embedding=False,
+        normaliser=LabelNormaliser(), **dataset_options
+    )
+    corpus_path = os.path.join(target_dir, '{}.txt'.format(name))
+    dataset.write_corpus(corpus_path)
+    return read_bytes(corpus_path), dataset.subwords
+
+
+@pytest.mark.parametrize('mlf_name', ['triphone_mlf', 'monophone_mlf'])
+@pytest.mark.parametrize('subword_context_width,incl_posn_info', CORPUS_OPTIONS)
+def test_corpus_is_identical_on_every_path(request, tmp_path, mlf_name, subword_context_width, incl_posn_info):
+    mlf_path = request.getfixturevalue(mlf_name)
+    options = (subword_context_width, incl_posn_info)
+    serial_corpus, serial_subwords = write_corpus(mlf_path, str(tmp_path), 'serial', *options)
+    assert serial_corpus
+
+    for name, dataset_options in [('streaming', {'streaming': True}), ('workers', {'workers': 3}),
+                                  ('compact', {'compact': True})]:
+        corpus, subwords = write_corpus(mlf_path, str(tmp_path), name, *options, **dataset_options)
+        assert corpus == serial_corpus, name
+        assert subwords == serial_subwords, name
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_pipeline_corpus_is_identical_to_serial(triphone_mlf, tmp_path, workers):
+    serial_corpus, serial_subwords = write_corpus(triphone_mlf, str(tmp_path), 'serial', 3, True)
+
+    dataset = MLFDataset(
+        triphone_mlf, 3, True, separate_apostrophe_embedding=False, streaming=True, workers=workers,
+        normaliser=LabelNormaliser()
+    )
+    corpus_path = str(tmp_path / 'pipeline.txt')
+    subwords = CorpusPipeline(corpus_path, queue_size=2).run(dataset.iter_sentence_batches(batch_size=7))
+    assert read_bytes(corpus_path) == serial_corpus
+    assert subwords == serial_subwords
+
+
+def test_corpus_is_identical_with_crlf_line_endings(triphone_mlf, tmp_path):
+    crlf_mlf = str(tmp_path / 'crlf.mlf')
+    with open(crlf_mlf, 'wb') as mlf_file:
+        mlf_file.write(read_bytes(triphone_mlf).replace(b'\n', b'\r\n'))
+    serial_corpus, _ = write_corpus(triphone_mlf, str(tmp_path), 'serial', 3, True)
+    for name, dataset_options in [('crlf-serial', {}), ('crlf-workers', {'workers': 2})]:
+        corpus, _ = write_corpus(crlf_mlf, str(tmp_path), name, 3, True, **dataset_options)
+        assert corpus == serial_corpus, name
+
+
+def test_unique_subwords_are_saved(triphone_mlf, tmp_path):
+    dataset = MLFDataset(triphone_mlf, 1, False, False, compact=True, normaliser=LabelNormaliser())
+    target_file = str(tmp_path / 'unique-subwords.json')
+    dataset.save_unique_subwords(target_file)
+    with open(target_file, 'r') as subword_file:
+        assert set(json.load(subword_file)) == dataset.subwords
+
+
+@pytest.mark.parametrize('dataset_options', [{'streaming': True}, {'workers': 2}])
+def test_compact_dataset_cannot_stream(triphone_mlf, dataset_options):
+    with pytest.raises(ValueError):
+        MLFDataset(triphone_mlf, 1, False, False, compact=True, **dataset_options)
+
+
+@pytest.mark.parametrize('streaming_option', [['--streaming'], ['--workers', '2']])
+def test_cli_rejects_compact_streaming(triphone_mlf, streaming_option):
+    with pytest.raises(SystemExit):
+        parse_arguments(['corpus', '-i', triphone_mlf, '--compact'] + streaming_option)
+
+
+@pytest.mark.parametrize('use_pipeline', [False, True])
+def test_workers_use_the_normalisation_cache_size(triphone_mlf, tmp_path, use_pipeline):
+    normaliser = LabelNormaliser(max_size=5)
+    dataset = MLFDataset(triphone_mlf, 3, True, False, workers=2, normaliser=normaliser)
+    corpus_path = str(tmp_path / 'corpus.txt')
+    if use_pipeline:
+        CorpusPipeline(corpus_path).run(dataset.iter_sentence_batches())
+    else:
+        dataset.write_corpus(corpus_path)
+    # The workers' caches are bounded like the dataset's, so they evict and report it
+    assert normaliser.evictions > 0
+    assert normaliser.hits + normaliser.misses > 0
+
+
+@pytest.mark.parametrize('dataset_options', [{}, {'streaming': True}, {'workers': 3}, {'binary_corpus': True}])
+def test_subword_counts_match_the_compact_counts(triphone_mlf, tmp_path, dataset_options):
+    compact_dataset = MLFDataset(triphone_mlf, 3, True, False, compact=True, normaliser=LabelNormaliser())
+    compact_dataset.save_subword_counts(str(tmp_path / 'compact-counts.json'))
+
+    dataset_options = dict(dataset_options)
+    binary_corpus = dataset_options.pop('binary_corpus', False)
+    dataset = MLFDataset(triphone_mlf, 3, True, False, normaliser=LabelNormaliser(), **dataset_options)
+    if binary_corpus:
+        dataset.save_binary_corpus(str(tmp_path / 'binary-corpus'))
+    else:
+        dataset.write_corpus(str(tmp_path / 'corpus.txt'))
+    dataset.save_subword_counts(str(tmp_path / 'counts.json'))
+
+    with open(str(tmp_path / 'compact-counts.json'), 'r') as counts_file:
+        compact_counts = json.load(counts_file)
+    with open(str(tmp_path / 'counts.json'), 'r') as counts_file:
+        assert json.load(counts_file) == compact_counts
+
+
+def test_pipeline_collects_subword_counts(triphone_mlf, tmp_path):
+    compact_dataset = MLFDataset(triphone_mlf, 1, True, False, compact=True, normaliser=LabelNormaliser())
+    compact_counts = compact_dataset.ref_list.token_counts()
+    expected = dict(zip(compact_dataset.ref_list.vocabulary.tokens, compact_counts.tolist()))
+
+    dataset = MLFDataset(triphone_mlf, 1, True, False, workers=2, normaliser=LabelNormaliser())
+    CorpusPipeline(str(tmp_path / 'corpus.txt')).run(dataset.iter_sentence_batches())
+    assert dict(dataset.subword_counts) == expected
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from subword_embedding.embedding_io import write_word2vec_text
+from subword_embedding.subword_corpus import MLF_ENCODING, TIME_SCALE_FACTOR
+from subword_embedding.subword_embedder import SubwordEmbedder
+
+
+TOKENS = ['sil', 'ა', 'ვ', 'ს']
+VECTORS = np.arange(8, dtype=np.float32).reshape(4, 2)
+MLF = '''#!MLF!#
+"*/utt0.lab"
+0 100000 sil -1.0
+100000 300000 ა -2.0
+300000 400000 sil -1.0
+.
+"*/utt1.lab"
+0 200000 ვ -1.5
+200000 300000 ს -0.5
+.
+"*/utt2.lab"
+0 100000 ს -0.5
+100000 200000 ხ -0.5
+.
+'''
+
+
+@pytest.fixture
+def embedder(tmp_path):
+    embedding_path = str(tmp_path / 'embedding.txt')
+    write_word2vec_text(embedding_path, ['</s>'] + TOKENS, np.vstack([np.ones((1, 2)), VECTORS]))
+    return SubwordEmbedder.load(
+        embedding_path, subword_context_width=1, incl_posn_info=False, separate_apostrophe_embedding=False
+    )
+
+
+def test_embed_mlf(embedder, tmp_path):
+    mlf_path = str(tmp_path / 'test.mlf')
+    with open(mlf_path, 'w', encoding=MLF_ENCODING) as mlf_file:
+        mlf_file.write(MLF)
+
+    batches = list(embedder.embed_mlf(mlf_path, batch_size=2))
+    assert len(batches) == 2
+    label_names, features, lengths, start_times, end_times = batches[0]
+    assert label_names == ['"*/utt0.lab"', '"*/utt1.lab"']
+    assert lengths.tolist() == [3, 2]
+    assert features.shape == (2, 3, 2)
+    assert np.array_equal(features[0], VECTORS[[0, 1, 0]])
+    assert np.array_equal(features[1], [VECTORS[2], VECTORS[3], [0, 0]])
+    assert np.allclose(start_times * TIME_SCALE_FACTOR, [[0, 100000, 300000], [0, 200000, 0]])
+    assert np.allclose(end_times * TIME_SCALE_FACTOR, [[100000, 300000, 400000], [200000, 300000, 0]])
+
+    # Units which are not in the embedding are given zero vectors
+    _, features, lengths, _, _ = batches[1]
+    assert np.array_equal(features[0], [VECTORS[3], [0, 0]])
+
+
+def test_unknown_units_can_raise(embedder):
+    assert np.array_equal(embedder.embed_label_sequences([['ს', 'sil']])[0][0], VECTORS[[3, 0]])
+    embedder.missing = 'raise'
+    with pytest.raises(KeyError):
+        embedder.embed_label_sequences([['ხ']])
@@ -0,0 +1,38 @@
+import pytest
+
+from subword_embedding.cli import parse_arguments
+from subword_embedding.sweep import expand_grid, sweep_jobs
+
+
+def sweep_arguments(*options):
+    return parse_arguments(['sweep', '-i', 'train.mlf', '-g', 'grid.json', '--sweep-dir', 'sweep'] + list(options))
+
+
+def test_grid_is_expanded():
+    grid_points = expand_grid([{'model': ['word2vec', 'fastText'], 'vec_length': [4, 8]}, {'window': 3}])
+    assert grid_points == [
+        {'model': 'word2vec', 'vec_length': 4}, {'model': 'word2vec', 'vec_length': 8},
+        {'model': 'fastText', 'vec_length': 4}, {'model': 'fastText', 'vec_length': 8}, {'window': 3},
+    ]
+    with pytest.raises(ValueError, match='Cannot sweep'):
+        expand_grid({'learning_rate': [0.1]})
+
+
+def test_cpu_budget_is_split_between_jobs():
+    jobs = sweep_jobs(sweep_arguments('-j', '2', '--cpu-budget', '8'), expand_grid({'vec_length': [4, 8, 16]}))
+    assert [job_args.threads for job_args in jobs] == [4, 4, 4]
+    assert [job_args.embedding for job_args in jobs] == ['sweep/word2vec-l4', 'sweep/word2vec-l8', 'sweep/word2vec-l16']
+
+
+def test_explicit_threads_are_kept():
+    jobs = sweep_jobs(
+        sweep_arguments('-j', '2', '--cpu-budget', '8', '--threads', '3'), expand_grid({'vec_length': [4, 8]})
+    )
+    assert [job_args.threads for job_args in jobs] == [3, 3]
+    jobs = sweep_jobs(sweep_arguments('-j', '2', '--cpu-budget', '8'), expand_grid({'threads': [1, 6]}))
+    assert [job_args.threads for job_args in jobs] == [1, 6]
+
+
+def test_repeated_grid_points_are_rejected():
+    with pytest.raises(ValueError, match='repeated'):
+        sweep_jobs(sweep_arguments(), expand_grid([{'vec_length': 4}, {'vec_length': 4}]))
@@ -0,0 +1,24 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from subword_embedding.cli import MIN_TSNE_ITERATIONS, parse_arguments
+from subword_embedding.visualise import project_embedding, tsne_parameters
+
+
+def test_tsne_iterations_are_validated():
+    assert parse_arguments(['visualise', '--tsne-iter', str(MIN_TSNE_ITERATIONS)]).tsne_iter == MIN_TSNE_ITERATIONS
+    with pytest.raises(SystemExit):
+        parse_arguments(['visualise', '--tsne-iter', str(MIN_TSNE_ITERATIONS - 1)])
+
+
+def test_projection_uses_the_supported_iteration_argument(tmp_path):
+    vectors = np.random.RandomState(0).randn(20, 4)
+    tsne_params = tsne_parameters(5, 200, fast=True, max_iter=MIN_TSNE_ITERATIONS)
+    with warnings.catch_warnings():
+        # The deprecated n_iter argument of newer scikit-learn versions would warn
+        warnings.simplefilter('error', FutureWarning)
+        emb_2d = project_embedding(vectors, tsne_params, cache_dir=str(tmp_path))
+    assert emb_2d.shape == (20, 2)
+    assert np.array_equal(project_embedding(vectors, tsne_params, cache_dir=str(tmp_path)), emb_2d)
@@ -0,0 +1,168 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+
+from subword_embedding.word2vec_runner import Word2VecError, Word2VecJob, run_budgeted_jobs, run_word2vec
+
+
+# Records its arguments and run time, prints word2vec-style progress and writes the -output file. The
+# environment variables FAKE_EXIT_CODE and FAKE_SLEEP make it fail or hang.
+FAKE_WORD2VEC = '''#!{python}
+import json
+import os
+import sys
+import time
+
+arguments = sys.argv[1:]
+output_path = arguments[arguments.index('-output') + 1]
+start_time = time.time()
+print('Starting training using file ' + arguments[arguments.index('-train') + 1])
+for progress in range(0, 101, 25):
+    sys.stdout.write('\\rAlpha: 0.025  Progress: {{:.2f}}%  '.format(progress))
+    sys.stdout.flush()
+time.sleep(float(os.environ.get('FAKE_SLEEP', 0)))
+print('')
+exit_code = int(os.environ.get('FAKE_EXIT_CODE', 0))
+if exit_code:
+    print('ERROR: training failed')
+    sys.exit(exit_code)
+with open(output_path, 'w') as output_file:
+    output_file.write('1 2\\na 0.5 0.5\\n')
+with open(output_path + '.run.json', 'w') as run_file:
+    json.dump({{'arguments': arguments, 'start': start_time, 'end': time.time()}}, run_file)
+'''
+
+
+@pytest.fixture
+def word2vec_path(tmp_path):
+    binary_path = str(tmp_path / 'word2vec')
+    with open(binary_path, 'w') as binary_file:
+        binary_file.write(FAKE_WORD2VEC.format(python=sys.executable))
+    os.chmod(binary_path, 0o755)
+    return binary_path
+
+
+@pytest.fixture
+def corpus_path(tmp_path):
+    corpus_path = str(tmp_path / 'corpus.txt')
+    with open(corpus_path, 'w') as corpus_file:
+        corpus_file.write('a b c\nb c d')
+    return corpus_path
+
+
+def read_run(target_dir):
+    with open(os.path.join(target_dir, 'embedding.txt.run.json'), 'r') as run_file:
+        return json.load(run_file)
+
+
+def test_command_passes_on_the_options(corpus_path, tmp_path):
+    target_dir = str(tmp_path / 'embedding')
+    job = Word2VecJob(corpus_path, 8, target_dir, str(tmp_path), training_options={
+        'cbow': False, 'threads': 3, 'window': 5, 'negative': None, 'iter': 2, 'min_count': 1
+    })
+    assert job.command() == [
+        os.path.join(str(tmp_path), 'word2vec'),
+        '-train', corpus_path,
+        '-output', os.path.join(target_dir, 'embedding.txt'),
+        '-size', '8',
+        '-binary', '0',
+        '-cbow', '0', '-threads', '3', '-window', '5', '-iter', '2', '-min-count', '1',
+    ]
+    assert job.threads == 3
+    assert Word2VecJob(corpus_path, 8, target_dir, str(tmp_path)).threads == 12
+    with pytest.raises(ValueError, match='Unknown word2vec options'):
+        Word2VecJob(corpus_path, 8, target_dir, str(tmp_path), training_options={'epochs': 2})
+
+
+def test_successful_run(word2vec_path, corpus_path, tmp_path):
+    target_dir = str(tmp_path / 'embedding')
+    job = Word2VecJob(corpus_path, 4, target_dir, word2vec_path, training_options={'cbow': True})
+    assert run_word2vec(job) >= 0
+    assert read_run(target_dir)['arguments'] == job.command()[1:]
+    with open(os.path.join(target_dir, 'embedding.log'), 'r') as log_file:
+        log = log_file.read()
+    assert 'Starting training' in log and 'Progress: 100.00%' in log
+
+
+def test_exit_code_raises(word2vec_path, corpus_path, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_EXIT_CODE', '3')
+    job = Word2VecJob(corpus_path, 4, str(tmp_path / 'embedding'), word2vec_path)
+    with pytest.raises(Word2VecError, match='exit code 3') as error:
+        run_word2vec(job)
+    # The end of the output is quoted, without the progress updates
+    assert 'ERROR: training failed' in str(error.value)
+    assert 'Progress' not in str(error.value)
+
+
+def test_timeout_kills_the_run(word2vec_path, corpus_path, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_SLEEP', '30')
+    job = Word2VecJob(corpus_path, 4, str(tmp_path / 'embedding'), word2vec_path)
+    start_time = time.time()
+    with pytest.raises(Word2VecError, match='timed out'):
+        run_word2vec(job, timeout=0.5)
+    assert time.time() - start_time < 10
+    assert not os.path.exists(os.path.join(str(tmp_path / 'embedding'), 'embedding.txt'))
+
+
+def test_missing_binary_raises(corpus_path, tmp_path):
+    job = Word2VecJob(corpus_path, 4, str(tmp_path / 'embedding'), str(tmp_path / 'missing' / 'word2vec'))
+    with pytest.raises(Word2VecError, match='Cannot run'):
+        run_word2vec(job)
+
+
+def test_jobs_share_the_cpu_budget(word2vec_path, corpus_path, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_SLEEP', '0.3')
+    jobs = [
+        Word2VecJob(corpus_path, 4, str(tmp_path / 'embedding{}'.format(i)), word2vec_path,
+                    training_options={'threads': 2})
+        for i in range(4)
+    ]
+    results = list(run_budgeted_jobs(jobs, run_word2vec, cpu_budget=4))
+    assert [job for job, _, _ in results] == jobs
+    assert all(error is None and train_time > 0 for _, train_time, error in results)
+
+    runs = [read_run(job.target_dir) for job in jobs]
+    for run in runs:
+        running = [other for other in runs if other['start'] < run['start'] < other['end']]
+        # The job itself and at most one other job of two threads fit in the budget
+        assert len(running) <= 1
+    assert any(other['start'] < runs[0]['end'] for other in runs[1:])
+
+
+def test_jobs_start_in_order(word2vec_path, corpus_path, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_SLEEP', '0.3')
+    jobs = [
+        Word2VecJob(corpus_path, 4, str(tmp_path / 'embedding{}'.format(i)), word2vec_path,
+                    training_options={'threads': threads})
+        for i, threads in enumerate([2, 4, 1])
+    ]
+    assert all(error is None for _, _, error in run_budgeted_jobs(jobs, run_word2vec, cpu_budget=4))
+    runs = [read_run(job.target_dir) for job in jobs]
+    # The last job would fit beside the first, but waits for the larger job ahead of it
+    assert runs[0]['start'] < runs[1]['start'] < runs[2]['start']
+    assert runs[2]['start'] >= runs[1]['end']
+
+
+def test_jobs_are_limited_to_max_jobs(word2vec_path, corpus_path, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_SLEEP', '0.3')
+    jobs = [
+        Word2VecJob(corpus_path, 4, str(tmp_path / 'embedding{}'.format(i)), word2vec_path,
+                    training_options={'threads': 1})
+        for i in range(3)
+    ]
+    assert all(error is None for _, _, error in run_budgeted_jobs(jobs, run_word2vec, cpu_budget=4, max_jobs=1))
+    runs = [read_run(job.target_dir) for job in jobs]
+    assert runs[0]['end'] <= runs[1]['start'] and runs[1]['end'] <= runs[2]['start']
+
+
+def test_failed_jobs_are_returned(word2vec_path, corpus_path, tmp_path):
+    jobs = [
+        Word2VecJob(corpus_path, 4, str(tmp_path / 'embedding'), word2vec_path),
+        Word2VecJob(corpus_path, 4, str(tmp_path / 'missing'), str(tmp_path / 'missing' / 'word2vec')),
+    ]
+    (_, train_time, error), (_, missing_time, missing_error) = run_budgeted_jobs(jobs, run_word2vec, cpu_budget=2)
+    assert train_time is not None and error is None
+    assert missing_time is None and isinstance(missing_error, Word2VecError)